@@ -0,0 +1,166 @@
+"""
+Inference backends behind one interface: ONNX Runtime on its default CPU provider,
+ONNX Runtime on an alternative CPU provider (XNNPACK, OpenVINO) when the installed
+onnxruntime build has it, and TorchScript when torch is installed. Every backend takes
+the NCHW float32 batch produced by preprocessing.ImagePreprocessor and returns logits.
+
+    python backends.py                      # benchmark what is available on this host
+    python backends.py --runs 50 --batch-size 8
+
+Prediction picks one with PREDICT_BACKEND; "auto" runs select_backend() at startup.
+"""
+import time
+import argparse
+import numpy as np
+import onnxruntime as ort
+from typing import Callable, Dict, Optional, Tuple
+from preprocessing import model_input_size
+
+# PREDICT_BACKEND name -> ONNX Runtime execution provider
+ORT_PROVIDERS = {
+    "xnnpack": "XnnpackExecutionProvider",
+    "openvino": "OpenVINOExecutionProvider",
+}
+BACKEND_NAMES = ("onnxruntime",) + tuple(ORT_PROVIDERS) + ("torchscript",)
+
+class BackendUnavailable(Exception):
+    """The backend's library, provider or model file isn't present on this host"""
+
+class InferenceBackend:
+    name = "base"
+    input_size: Optional[int] = None  # Square input the model expects, if it declares one
+
+    def run(self, batch: np.ndarray) -> np.ndarray:
+        """Logits for an NCHW float32 batch, one row per image"""
+        raise NotImplementedError
+
+    def describe(self) -> str:
+        return self.name
+
+    def close(self):
+        pass
+
+class OrtBackend(InferenceBackend):
+    """An onnxruntime.InferenceSession (default or alternative provider)"""
+    def __init__(self, session: ort.InferenceSession, name="onnxruntime"):
+        self.name = name
+        self.session = session
+        self.input_name = session.get_inputs()[0].name
+        self.input_size = model_input_size(session, None)
+
+    def run(self, batch: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: batch})[0]
+
+    def describe(self) -> str:
+        return f"{self.name} ({', '.join(self.session.get_providers())})"
+
+def ort_provider(name: str) -> str:
+    """Execution provider for a backend name, if this onnxruntime build has it"""
+    provider = ORT_PROVIDERS[name]
+    if provider not in ort.get_available_providers():
+        raise BackendUnavailable(f"{provider} is not in this onnxruntime build")
+    return provider
+
+class TorchScriptBackend(InferenceBackend):
+    """A TorchScript export of the CNN (python convert.py --torchscript)"""
+    name = "torchscript"
+
+    def __init__(self, model_path: str, threads: int):
+        try:
+            import torch
+        except ImportError:
+            raise BackendUnavailable("torch is not installed")
+        import os
+        if not os.path.exists(model_path):
+            raise BackendUnavailable(f"{model_path} not found (run 'python convert.py --torchscript')")
+
+        self.torch = torch
+        torch.set_num_threads(threads)
+        extra_files = {"input_size": ""}  # Written by convert.py next to the traced graph
+        self.model = torch.jit.load(model_path, map_location="cpu", _extra_files=extra_files).eval()
+        if extra_files["input_size"]:
+            self.input_size = int(extra_files["input_size"])
+        self.model = torch.jit.optimize_for_inference(torch.jit.freeze(self.model))
+        self.threads = threads
+
+    def run(self, batch: np.ndarray) -> np.ndarray:
+        with self.torch.inference_mode():
+            return self.model(self.torch.from_numpy(batch)).numpy()
+
+    def describe(self) -> str:
+        return f"torchscript (torch {self.torch.__version__}, {self.threads} threads)"
+
+def benchmark_backend(backend: InferenceBackend, batch: np.ndarray, runs=10) -> float:
+    """Median milliseconds per run of `batch` after two warm-up runs"""
+    for _ in range(2):
+        backend.run(batch)
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        backend.run(batch)
+        times.append((time.perf_counter() - started) * 1000)
+    return float(np.median(times))
+
+def select_backend(factories: Dict[str, Callable[[], InferenceBackend]], sample: np.ndarray,
+                   runs=10, atol=1e-2) -> Tuple[InferenceBackend, Dict[str, str]]:
+    """
+    Build each backend, time it on `sample` and return the fastest with a per-backend
+    report. The first factory is the reference: backends that fail to load or whose
+    logits disagree with it are skipped. Raises if the reference itself fails.
+    """
+    reference = None
+    best: Optional[Tuple[float, InferenceBackend]] = None
+    report = {}
+    for name, factory in factories.items():
+        try:
+            backend = factory()
+            logits = backend.run(sample)
+        except Exception as e:
+            if reference is None:
+                raise
+            report[name] = f"unavailable: {e}"
+            continue
+
+        if reference is None:
+            reference = logits
+        elif logits.shape != reference.shape or not np.allclose(logits, reference, atol=atol, rtol=1e-3):
+            report[name] = "skipped: logits differ from onnxruntime"
+            backend.close()
+            continue
+
+        ms = benchmark_backend(backend, sample, runs)
+        report[name] = f"{ms:.2f} ms"
+        if best is None or ms < best[0]:
+            if best is not None:
+                best[1].close()
+            best = (ms, backend)
+        else:
+            backend.close()
+    return best[1], report
+
+def main():
+    from predict import Prediction
+
+    parser = argparse.ArgumentParser(description="Compare inference backends on this host")
+    parser.add_argument("--model", help="ONNX model (default: the one Prediction would load)")
+    parser.add_argument("--backends", nargs="+", choices=BACKEND_NAMES, default=list(BACKEND_NAMES))
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    predictor = Prediction(onnx_path=args.model, backend="onnxruntime", thread_pool_size=0,
+                           inference_server=None, phash_index_path=None, persistent_cache_path=None)
+    sample = np.random.default_rng(0).standard_normal(
+        (args.batch_size, 3, predictor.preprocessor.size, predictor.preprocessor.size)
+    ).astype(np.float32)
+    factories = {name: (lambda name=name: predictor.create_backend(name)) for name in args.backends}
+    backend, report = select_backend(factories, sample, args.runs)
+
+    print(f"\nBatch of {args.batch_size}, median of {args.runs} runs:")
+    for name, outcome in report.items():
+        print(f"  {name:>12}: {outcome}")
+    print(f"Fastest: {backend.describe()} -> set PREDICT_BACKEND = \"{backend.name}\" (or \"auto\")")
+    predictor.close()
+
+if __name__ == "__main__":
+    main()
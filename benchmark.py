@@ -0,0 +1,240 @@
+"""
+Offline benchmark of the prediction path over the bundled sprites (no network).
+
+    python -m benchmark                                  # data/commands/pokemon/images
+    python -m benchmark --limit 500 --model model/pokemon_cnn_v2.int8.onnx
+    python -m benchmark --compare benchmarks/<earlier run>.json
+
+Each image is read from disk up front, then pushed through the same preprocessing and
+inference code Prediction uses, timing every stage. Reports throughput, p50/p95/p99 per
+stage, top-1/top-5 accuracy against the folder labels and peak RSS, and saves it all as
+JSON (by default under benchmarks/, named after the commit) for comparing runs.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import resource
+import argparse
+import subprocess
+import numpy as np
+import onnxruntime as ort
+from typing import Dict, List, Optional, Tuple
+from dataset import IMAGES_PATH, iter_labelled_images, is_lfs_pointer
+from preprocess_bench import synthetic_sprites
+from predict import Prediction, LABELS_PATH, PHASH_INDEX_PATH
+import config
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "benchmarks")
+STAGES = ("decode", "resize", "normalize", "phash", "inference_fast", "inference", "total")
+
+def load_images(class_names: List[str], roots: List[str], limit: int) -> List[Tuple[bytes, Optional[int]]]:
+    """(file bytes, class index) pairs; synthetic unlabelled sprites if the dataset isn't checked out"""
+    images = []
+    for path, idx in iter_labelled_images(class_names, roots):
+        if is_lfs_pointer(path):
+            continue
+        with open(path, "rb") as f:
+            images.append((f.read(), idx))
+        if len(images) >= limit:
+            break
+
+    if not images:
+        print("No readable sprites found (run 'git lfs pull'); timing synthetic sprites without accuracy")
+        images = [(data, None) for data in synthetic_sprites(min(limit, 200))]
+    return images
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.realpath(__file__))
+        ).stdout.strip()
+    except Exception:
+        return None
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def summarize(samples: List[float]) -> dict:
+    values = np.array(samples)
+    return {
+        "count": len(values),
+        "mean": round(float(values.mean()), 3),
+        "p50": round(float(np.percentile(values, 50)), 3),
+        "p95": round(float(np.percentile(values, 95)), 3),
+        "p99": round(float(np.percentile(values, 99)), 3),
+    }
+
+def run(predictor: Prediction, images: List[Tuple[bytes, Optional[int]]], repeat: int) -> dict:
+    """Time each stage per image, mirroring Prediction._prepare_image and the cascade"""
+    preprocessor = predictor.preprocessor
+    buffer = preprocessor.new_buffer()
+    timings: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+    top1 = top5 = labelled = top5_labelled = 0
+    sources: Dict[str, int] = {}
+
+    def lap(stage: str, since: float) -> float:
+        now = time.perf_counter()
+        timings[stage].append((now - since) * 1000)
+        return now
+
+    started = time.perf_counter()
+    for round_index in range(repeat):
+        for data, label in images:
+            t = t0 = time.perf_counter()
+            image = preprocessor.decode(data)
+            t = lap("decode", t)
+
+            class_index = None
+            source = "cnn"
+            if predictor.phash_index is not None:
+                match = predictor.phash_index.lookup(image)
+                t = lap("phash", t)
+                if match:
+                    class_index, source = match[0], "phash"
+                    logits = None
+
+            if class_index is None:
+                resized = preprocessor.resize(image)
+                t = lap("resize", t)
+                tensor = preprocessor.normalize(resized, buffer)
+                t = lap("normalize", t)
+
+                logits = None
+                if predictor.fast_session is not None:
+                    fast_logits = predictor.run_fast_batch(tensor)[0]
+                    elapsed = (time.perf_counter() - t) * 1000
+                    t = lap("inference_fast", t)
+                    if predictor._fast_stage_confident(fast_logits, elapsed):
+                        logits, source = fast_logits, "cascade"
+                if logits is None:
+                    logits = predictor.run_batch(tensor)[0]
+                    t = lap("inference", t)
+                k = min(5, logits.size)
+                if predictor.classifier == "embedding":
+                    # The model returns features, not logits: labels come from the nearest sprites
+                    top_k = [idx for idx, _ in predictor.embedding_index.classify(logits, k)]
+                    class_index, source = top_k[0], "embedding"
+                else:
+                    top_k = np.argpartition(logits, -k)[-k:]
+                    class_index = int(logits.argmax())
+            lap("total", t0)
+
+            sources[source] = sources.get(source, 0) + 1
+            if label is not None and round_index == 0:
+                labelled += 1
+                top1 += class_index == label
+                # A pHash match has no runners-up, so top-5 covers the model's answers only
+                if source != "phash":
+                    top5_labelled += 1
+                    top5 += label in top_k
+    elapsed = time.perf_counter() - started
+
+    processed = len(images) * repeat
+    return {
+        "images": len(images),
+        "repeat": repeat,
+        "throughput_images_per_s": round(processed / elapsed, 2),
+        "stages_ms": {stage: summarize(values) for stage, values in timings.items() if values},
+        "accuracy": {
+            "labelled": labelled,
+            "top1": round(top1 / labelled, 4) if labelled else None,
+            "top5": round(top5 / top5_labelled, 4) if top5_labelled else None,
+            "top5_labelled": top5_labelled,
+        },
+        "sources": sources,
+    }
+
+def print_report(results: dict, previous: Optional[dict] = None):
+    print(f"\n{results['images']} images x {results['repeat']} | "
+          f"{results['throughput_images_per_s']} images/s | peak RSS {results['peak_rss_mb']} MB")
+    accuracy = results["accuracy"]
+    if accuracy["labelled"]:
+        top5 = f"{accuracy['top5']:.2%}" if accuracy["top5"] is not None else "-"
+        print(f"top-1 {accuracy['top1']:.2%} ({accuracy['labelled']} labelled) | "
+              f"top-5 {top5} ({accuracy['top5_labelled']} not matched by pHash)")
+
+    header = f"{'stage (ms)':>14} | {'p50':>8} | {'p95':>8} | {'p99':>8} | {'mean':>8}"
+    if previous:
+        header += f" | {'p50 before':>10}"
+    print(header)
+    for stage, summary in results["stages_ms"].items():
+        line = f"{stage:>14} | {summary['p50']:>8} | {summary['p95']:>8} | {summary['p99']:>8} | {summary['mean']:>8}"
+        if previous:
+            before = previous.get("stages_ms", {}).get(stage, {}).get("p50", "-")
+            line += f" | {before:>10}"
+        print(line)
+
+    if previous:
+        print(f"before: {previous.get('throughput_images_per_s')} images/s, "
+              f"peak RSS {previous.get('peak_rss_mb')} MB, top-1 {previous.get('accuracy', {}).get('top1')} "
+              f"(commit {previous.get('meta', {}).get('commit')})")
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of preprocessing and inference")
+    parser.add_argument("--model", help="ONNX model (default: the one Prediction would load)")
+    parser.add_argument("--labels", default=LABELS_PATH)
+    parser.add_argument("--data-dir", action="append", help=f"sprite folders (default: {IMAGES_PATH})")
+    parser.add_argument("--limit", type=int, default=1000, help="maximum number of images")
+    parser.add_argument("--repeat", type=int, default=1, help="passes over the images (accuracy uses the first)")
+    parser.add_argument("--warmup", type=int, default=10, help="untimed images run first")
+    parser.add_argument("--phash", action="store_true", help="include the perceptual-hash fast path")
+    parser.add_argument("--output", help="JSON report path (default: benchmarks/<commit>-<time>.json)")
+    parser.add_argument("--compare", help="earlier JSON report to show alongside")
+    args = parser.parse_args()
+
+    predictor = Prediction(
+        onnx_path=args.model,
+        labels_path=args.labels,
+        thread_pool_size=0,
+        inference_server=None,
+        phash_index_path=PHASH_INDEX_PATH if args.phash else None,
+        persistent_cache_path=None,
+    )
+    images = load_images(predictor.class_names, args.data_dir or [IMAGES_PATH], args.limit)
+    print(f"Benchmarking {len(images)} images with {predictor.onnx_path}...")
+
+    if args.warmup:
+        run(predictor, images[:args.warmup], 1)
+        predictor.fast_runs = predictor.fast_answered = 0
+        predictor.fast_ms_total = 0.0
+
+    results = run(predictor, images, args.repeat)
+    results["peak_rss_mb"] = peak_rss_mb()
+    commit = git_commit()
+    results["meta"] = {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "model": os.path.relpath(predictor.onnx_path),
+        "cascade_model": predictor.fast_session is not None,
+        "cascade_threshold": predictor.cascade_threshold,
+        "resize_filter": config.PREDICT_RESIZE_FILTER,
+        "onnxruntime": ort.__version__,
+        "backend": predictor.backend.describe(),
+        "intra_op_threads": predictor.intra_op_threads,
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+
+    previous = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+    print_report(results, previous)
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{commit or 'local'}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to {output}")
+    predictor.close()
+
+if __name__ == "__main__":
+    main()
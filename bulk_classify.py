@@ -0,0 +1,219 @@
+"""
+Classify many images at once, for dataset audits and relabelling.
+
+    python bulk_classify.py data/commands/pokemon/images -o audit.csv
+    python bulk_classify.py "spawns/**/*.png" urls.txt -o results.ndjson --workers 4
+    python bulk_classify.py urls.txt -o results.ndjson --resume
+
+Inputs can be directories (searched recursively), glob patterns, image files, URLs, or
+text files with one path/URL per line. Work is split into batches over a process pool,
+and each worker has its own ONNX session and HTTP session. Rows are written as batches
+finish. The output format follows the extension (.csv or .ndjson) unless --format is given.
+With --resume, inputs that already have a successful row are skipped; failed ones are retried.
+"""
+import os
+import csv
+import sys
+import glob
+import json
+import time
+import argparse
+import multiprocessing
+from typing import Iterator, List, Optional, Set
+from dataset import IMAGE_EXTENSIONS
+from predict import Prediction
+
+CSV_FIELDS = ["input", "name", "confidence", "class_index", "top_k", "error"]
+
+def is_url(item: str) -> bool:
+    return item.startswith(("http://", "https://"))
+
+def expand_inputs(items: List[str]) -> Iterator[str]:
+    """Turn directories, globs and list files into individual image paths/URLs"""
+    for item in items:
+        if is_url(item):
+            yield item
+        elif os.path.isdir(item):
+            for dirpath, _, filenames in os.walk(item):
+                for filename in sorted(filenames):
+                    if filename.lower().endswith(IMAGE_EXTENSIONS):
+                        yield os.path.join(dirpath, filename)
+        elif os.path.isfile(item) and not item.lower().endswith(IMAGE_EXTENSIONS):
+            with open(item, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if line and not line.startswith("#"):
+                        yield line
+        elif os.path.isfile(item):
+            yield item
+        else:
+            matches = sorted(glob.glob(item, recursive=True))
+            if not matches:
+                print(f"Nothing matches {item}", file=sys.stderr)
+            for path in matches:
+                if os.path.isfile(path) and path.lower().endswith(IMAGE_EXTENSIONS):
+                    yield path
+
+def truncate_partial_line(path: str) -> int:
+    """Cut a row a killed run left half-written, so appending starts on a fresh line; returns bytes removed"""
+    with open(path, "rb+") as f:
+        data = f.read()
+        if not data or data.endswith(b"\n"):
+            return 0
+        end = data.rfind(b"\n") + 1
+        f.truncate(end)
+        return len(data) - end
+
+def completed_inputs(output_path: str, output_format: str) -> Set[str]:
+    """Inputs that already have a successful row in an earlier (partial) output file"""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    removed = truncate_partial_line(output_path)
+    if removed:
+        print(f"Dropped a partial last row ({removed} bytes) from {output_path}")
+    with open(output_path, "r", encoding="utf-8", newline="") as f:
+        if output_format == "csv":
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for row in rows:
+            if not row.get("error"):
+                done.add(row["input"])
+    return done
+
+# ===== WORKER PROCESS =====
+_predictor: Optional[Prediction] = None
+_init_error: Optional[str] = None
+_http = None
+
+def _init_worker(model_path: Optional[str], top_k: int, threads: int):
+    global _predictor, _init_error, _http
+    import requests
+
+    # Each worker owns one session; keep ORT from oversubscribing the cores between them
+    try:
+        _predictor = Prediction(
+            onnx_path=model_path, top_k=top_k, thread_pool_size=0, inference_server=None,
+            phash_index_path=None, persistent_cache_path=None, intra_op_threads=threads,
+        )
+    except Exception as e:
+        # Raising here would make the pool restart the worker forever; fail the first batch instead
+        _init_error = str(e)
+    _http = requests.Session()
+
+def _load(item: str) -> bytes:
+    if is_url(item):
+        return _predictor.fetcher.fetch_sync(item, _http)
+    with open(item, "rb") as f:
+        return f.read()
+
+def _classify_batch(items: List[str]) -> List[dict]:
+    """Load and preprocess a batch, run it through the model in one call, one row per input"""
+    if _predictor is None:
+        raise RuntimeError(f"Worker could not load the model: {_init_error}")
+    preprocessor = _predictor.preprocessor
+    batch = preprocessor.new_buffer(len(items))
+    rows = []
+    ok_rows = []
+    for item in items:
+        row = {"input": item, "name": None, "confidence": None, "class_index": None, "top_k": None, "error": None}
+        try:
+            preprocessor.preprocess_bytes(_load(item), batch[len(ok_rows):len(ok_rows) + 1])
+            ok_rows.append(row)
+        except Exception as e:
+            row["error"] = str(e)
+        rows.append(row)
+
+    if ok_rows:
+        try:
+            logits = _predictor.run_batch(batch[:len(ok_rows)])
+            for row, row_logits in zip(ok_rows, logits):
+                result = _predictor._build_result(row_logits)
+                row.update(
+                    name=result.name,
+                    confidence=round(result.confidence, 6),
+                    class_index=result.class_index,
+                    top_k=[[name, round(probability, 6)] for name, probability in result.candidates],
+                )
+        except Exception as e:
+            for row in ok_rows:
+                row["error"] = f"Inference failed: {e}"
+    return rows
+
+# ===== OUTPUT =====
+class ResultWriter:
+    """Appends rows to CSV or NDJSON and flushes after every batch"""
+    def __init__(self, path: str, output_format: str, append: bool):
+        exists = append and os.path.exists(path) and os.path.getsize(path) > 0
+        self.format = output_format
+        self.file = open(path, "a" if append else "w", encoding="utf-8", newline="")
+        self.csv = None
+        if output_format == "csv":
+            self.csv = csv.DictWriter(self.file, fieldnames=CSV_FIELDS)
+            if not exists:
+                self.csv.writeheader()
+
+    def write(self, rows: List[dict]):
+        for row in rows:
+            if self.csv is not None:
+                top_k = ";".join(f"{name}:{probability}" for name, probability in row["top_k"] or [])
+                self.csv.writerow(dict(row, top_k=top_k, error=row["error"] or ""))
+            else:
+                self.file.write(json.dumps(row) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+def chunked(items: List[str], size: int) -> Iterator[List[str]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def main():
+    parser = argparse.ArgumentParser(description="Classify many images with a process pool")
+    parser.add_argument("inputs", nargs="+", help="directories, globs, image files, URLs or files listing them")
+    parser.add_argument("-o", "--output", required=True, help="results file (.csv or .ndjson)")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="default: from the output extension")
+    parser.add_argument("--model", help="ONNX model (default: the one Prediction would load)")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 1) // 2))
+    parser.add_argument("--threads", type=int, default=2, help="ORT intra-op threads per worker")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--resume", action="store_true", help="skip inputs already classified in --output")
+    args = parser.parse_args()
+
+    output_format = args.format or ("csv" if args.output.lower().endswith(".csv") else "ndjson")
+    items = list(dict.fromkeys(expand_inputs(args.inputs)))  # De-duplicated, order kept
+    if args.resume:
+        done = completed_inputs(args.output, output_format)
+        items = [item for item in items if item not in done]
+        print(f"Resuming: {len(done)} already classified")
+    if not items:
+        print("Nothing to classify")
+        return
+    print(f"Classifying {len(items)} images with {args.workers} workers...")
+
+    writer = ResultWriter(args.output, output_format, append=args.resume)
+    started = time.perf_counter()
+    processed = failed = 0
+    try:
+        with multiprocessing.Pool(
+            args.workers, initializer=_init_worker, initargs=(args.model, args.top_k, args.threads)
+        ) as pool:
+            for rows in pool.imap_unordered(_classify_batch, chunked(items, args.batch_size)):
+                writer.write(rows)
+                processed += len(rows)
+                failed += sum(1 for row in rows if row["error"])
+                rate = processed / (time.perf_counter() - started)
+                print(f"\r{processed}/{len(items)} ({failed} failed, {rate:.1f} images/s)", end="", flush=True)
+    except KeyboardInterrupt:
+        print("\nInterrupted; rerun with --resume to continue")
+    except RuntimeError as e:
+        print(f"\n{e}")
+    finally:
+        writer.close()
+    print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Micro-benchmark: PredictionCache against the previous dict + timestamp implementation.
+
+    python cache_bench.py --sizes 1000 10000 100000
+"""
+import time
+import argparse
+from typing import Optional, Tuple
+from predict import PredictionCache
+
+class LegacyPredictionCache:
+    """The previous PredictionCache (full expiry scan on every get/set, min() to evict)"""
+    def __init__(self, max_size=1000, ttl_seconds=3600):
+        self.cache = {}
+        self.timestamps = {}
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+
+    def _cleanup_expired(self):
+        current_time = time.time()
+        expired_keys = [
+            key for key, timestamp in self.timestamps.items()
+            if current_time - timestamp > self.ttl_seconds
+        ]
+        for key in expired_keys:
+            self.cache.pop(key, None)
+            self.timestamps.pop(key, None)
+
+    def get(self, key: str) -> Optional[Tuple[str, str]]:
+        self._cleanup_expired()
+        if key in self.cache:
+            if time.time() - self.timestamps[key] <= self.ttl_seconds:
+                return self.cache[key]
+            self.cache.pop(key, None)
+            self.timestamps.pop(key, None)
+        return None
+
+    def set(self, key: str, value: Tuple[str, str]):
+        self._cleanup_expired()
+        if len(self.cache) >= self.max_size:
+            oldest_key = min(self.timestamps.keys(), key=lambda k: self.timestamps[k])
+            self.cache.pop(oldest_key, None)
+            self.timestamps.pop(oldest_key, None)
+        self.cache[key] = value
+        self.timestamps[key] = time.time()
+
+def bench(cache_cls, size: int, ops: int) -> Tuple[float, float]:
+    """Fill a cache to capacity, then time `ops` misses+sets (with eviction) and `ops` hits"""
+    cache = cache_cls(max_size=size)
+    value = ("Pikachu", "99.00%")
+    for i in range(size):
+        cache.set(f"warm{i}", value)
+
+    start = time.perf_counter()
+    for i in range(ops):
+        key = f"new{i}"
+        cache.get(key)
+        cache.set(key, value)
+    set_ns = (time.perf_counter() - start) / ops * 1e9
+
+    start = time.perf_counter()
+    for i in range(ops):
+        cache.get(f"new{i}")
+    get_ns = (time.perf_counter() - start) / ops * 1e9
+    return set_ns, get_ns
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PredictionCache")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--ops", type=int, default=20000, help="operations per run for the new cache")
+    parser.add_argument("--legacy-ops", type=int, default=200, help="operations per run for the legacy cache")
+    args = parser.parse_args()
+
+    print(f"{'entries':>8} | {'cache':>7} | {'miss+set ns/op':>15} | {'hit ns/op':>10}")
+    for size in args.sizes:
+        for name, cache_cls, ops in (
+            ("legacy", LegacyPredictionCache, min(args.legacy_ops, size)),
+            ("lru+ttl", PredictionCache, min(args.ops, size)),
+        ):
+            set_ns, get_ns = bench(cache_cls, size, ops)
+            print(f"{size:>8} | {name:>7} | {set_ns:>15,.0f} | {get_ns:>10,.0f}")
+
+if __name__ == "__main__":
+    main()
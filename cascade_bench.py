@@ -0,0 +1,91 @@
+"""
+Pick PREDICT_CASCADE_THRESHOLD: how often the first-stage model answers on its own at each
+threshold, how often the cascade then disagrees with the full CNN, and the average
+inference cost per spawn.
+
+    python cascade_bench.py --thresholds 0.5 0.7 0.8 0.9 0.95
+"""
+import time
+import argparse
+import numpy as np
+import onnxruntime as ort
+from typing import Tuple
+from dataset import SOURCE_IMAGE_PATH, IMAGES_PATH
+from preprocessing import ImagePreprocessor, model_input_size
+from preprocess_bench import synthetic_sprites
+from quantize_model import collect_samples, load_inputs
+from predict import ONNX_PATH, CASCADE_MODEL_PATH, LABELS_PATH, load_class_names
+
+def run_model(model_path: str, inputs: np.ndarray) -> Tuple[np.ndarray, float]:
+    """Softmax probabilities for every input and the mean single-image latency in ms"""
+    session = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+    input_name = session.get_inputs()[0].name
+    session.run(None, {input_name: inputs[:1]})  # Warm-up
+
+    rows = []
+    start = time.perf_counter()
+    for i in range(len(inputs)):
+        rows.append(session.run(None, {input_name: inputs[i:i + 1]})[0][0])
+    latency_ms = (time.perf_counter() - start) / len(inputs) * 1000
+
+    logits = np.stack(rows)
+    exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return exp / exp.sum(axis=1, keepdims=True), latency_ms
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep the cascade confidence threshold")
+    parser.add_argument("--model", default=ONNX_PATH)
+    parser.add_argument("--fast-model", default=CASCADE_MODEL_PATH)
+    parser.add_argument("--labels", default=LABELS_PATH)
+    parser.add_argument("--data-dir", action="append", help="sprite folders (default: the bundled dataset)")
+    parser.add_argument("--images", type=int, default=500)
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.99])
+    args = parser.parse_args()
+
+    # Both stages share one preprocessed tensor, so they must take the same input size
+    full_size = model_input_size(ort.InferenceSession(args.model, providers=["CPUExecutionProvider"]))
+    fast_size = model_input_size(ort.InferenceSession(args.fast_model, providers=["CPUExecutionProvider"]), full_size)
+    if fast_size != full_size:
+        raise SystemExit(f"{args.fast_model} takes {fast_size}px input but {args.model} {full_size}px; "
+                         f"retrain it with 'python train_fast_model.py --teacher {args.model}'")
+    preprocessor = ImagePreprocessor(full_size)
+    class_names = load_class_names(args.labels)
+    samples = collect_samples(class_names, args.data_dir or [SOURCE_IMAGE_PATH, IMAGES_PATH], args.images)
+    if samples:
+        inputs = load_inputs(samples, preprocessor)
+        labels = np.array([idx for _, idx in samples])
+    else:
+        print("No readable sprites found; using synthetic sprites (agreement only, no accuracy)")
+        sprites = synthetic_sprites(args.images)
+        inputs = preprocessor.new_buffer(len(sprites))
+        for i, data in enumerate(sprites):
+            preprocessor.preprocess_bytes(data, inputs[i:i + 1])
+        labels = None
+
+    full_probs, full_ms = run_model(args.model, inputs)
+    fast_probs, fast_ms = run_model(args.fast_model, inputs)
+    full_pred = full_probs.argmax(axis=1)
+    fast_pred = fast_probs.argmax(axis=1)
+    fast_conf = fast_probs.max(axis=1)
+
+    print(f"{len(inputs)} images | full CNN {full_ms:.2f} ms/image | first stage {fast_ms:.2f} ms/image")
+    if labels is not None:
+        print(f"top-1 accuracy: full {(full_pred == labels).mean():.2%}, first stage {(fast_pred == labels).mean():.2%}")
+
+    header = f"{'threshold':>9} | {'fast share':>10} | {'agreement':>9} | {'ms/spawn':>8} | {'saving':>6}"
+    if labels is not None:
+        header += f" | {'accuracy':>8}"
+    print(header)
+    for threshold in args.thresholds:
+        accepted = fast_conf >= threshold
+        cascade_pred = np.where(accepted, fast_pred, full_pred)
+        # Every image pays for the first stage; escalated ones pay for the full CNN too
+        cost_ms = fast_ms + (1 - accepted.mean()) * full_ms
+        line = (f"{threshold:>9.2f} | {accepted.mean():>10.1%} | {(cascade_pred == full_pred).mean():>9.2%} | "
+                f"{cost_ms:>8.2f} | {1 - cost_ms / full_ms:>6.0%}")
+        if labels is not None:
+            line += f" | {(cascade_pred == labels).mean():>8.2%}"
+        print(line)
+
+if __name__ == "__main__":
+    main()
@@ -148,7 +148,16 @@ class Collection(commands.Cog):
             print(f"Error getting shiny hunt AFK users: {e}")
             return []
 
-    async def get_collectors_for_pokemon(self, pokemon_name, guild_id):
+    def _normalized_base_form(self, pokemon_name, pokedex_entry=None):
+        """Normalized base form if the spawn is a variant (e.g. Mega Venusaur -> venusaur), else None"""
+        if pokedex_entry is not None:
+            return pokedex_entry.normalized_base
+        target_pokemon = find_pokemon_by_name(pokemon_name, load_pokemon_data())
+        if target_pokemon and target_pokemon.get('is_variant') and target_pokemon.get('variant_of'):
+            return normalize_pokemon_name(target_pokemon['variant_of']).lower()
+        return None
+
+    async def get_collectors_for_pokemon(self, pokemon_name, guild_id, pokedex_entry=None):
         """Get all users who have collected this Pokemon in the given guild (optimized with caching)"""
         cache_key = f"collectors_{guild_id}_{normalize_pokemon_name(pokemon_name).lower()}"
 
@@ -158,9 +167,9 @@ class Collection(commands.Cog):
         if self.db is None:
             return []
 
-        pokemon_data = load_pokemon_data()
         collectors = []
         normalized_spawn_name = normalize_pokemon_name(pokemon_name).lower()
+        normalized_base_form = self._normalized_base_form(pokemon_name, pokedex_entry)
 
         try:
             # Run queries in parallel for better performance
@@ -191,15 +200,11 @@ class Collection(commands.Cog):
                     continue
 
                 # Check for variant matching
-                target_pokemon = find_pokemon_by_name(pokemon_name, pokemon_data)
-                if target_pokemon and target_pokemon.get('is_variant'):
-                    base_form = target_pokemon.get('variant_of')
-                    if base_form:
-                        normalized_base_form = normalize_pokemon_name(base_form).lower()
-                        if any(normalize_pokemon_name(p).lower() == normalized_base_form 
-                               for p in user_pokemon):
-                            if user_id not in collectors:  # Avoid duplicates
-                                collectors.append(user_id)
+                if normalized_base_form:
+                    if any(normalize_pokemon_name(p).lower() == normalized_base_form 
+                           for p in user_pokemon):
+                        if user_id not in collectors:  # Avoid duplicates
+                            collectors.append(user_id)
 
             self._set_cache(self._collectors_cache, cache_key, collectors)
 
@@ -208,7 +213,7 @@ class Collection(commands.Cog):
 
         return collectors
 
-    async def get_shiny_hunters_for_pokemon(self, pokemon_name, guild_id):
+    async def get_shiny_hunters_for_pokemon(self, pokemon_name, guild_id, pokedex_entry=None):
         """Get all users hunting this Pokemon in the given guild (optimized with caching)"""
         cache_key = f"hunters_{guild_id}_{normalize_pokemon_name(pokemon_name).lower()}"
 
@@ -218,9 +223,9 @@ class Collection(commands.Cog):
         if self.db is None:
             return []
 
-        pokemon_data = load_pokemon_data()
         hunters = []
         normalized_spawn_name = normalize_pokemon_name(pokemon_name).lower()
+        normalized_base_form = self._normalized_base_form(pokemon_name, pokedex_entry)
 
         try:
             # Run queries in parallel
@@ -251,16 +256,11 @@ class Collection(commands.Cog):
                         continue
 
                     # Check for variant matching
-                    target_pokemon = find_pokemon_by_name(pokemon_name, pokemon_data)
-                    if target_pokemon and target_pokemon.get('is_variant'):
-                        base_form = target_pokemon.get('variant_of')
-                        if base_form:
-                            normalized_base_form = normalize_pokemon_name(base_form).lower()
-                            if normalized_hunting_name == normalized_base_form:
-                                if user_id in afk_users_set:
-                                    hunters.append(f"{user_id}(AFK)")
-                                else:
-                                    hunters.append(f"<@{user_id}>")
+                    if normalized_base_form and normalized_hunting_name == normalized_base_form:
+                        if user_id in afk_users_set:
+                            hunters.append(f"{user_id}(AFK)")
+                        else:
+                            hunters.append(f"<@{user_id}>")
 
             self._set_cache(self._hunters_cache, cache_key, hunters)
 
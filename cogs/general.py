@@ -6,9 +6,14 @@ from utils import (
     load_pokemon_data,
     find_pokemon_by_name,
     format_pokemon_prediction,
+    format_prediction_alternatives,
     get_image_url_from_message,
-    is_rare_pokemon
+    is_rare_pokemon,
+    snowflake_time
 )
+from config import PREDICT_SPAWN_DEADLINE_SECONDS, PREDICT_SHADOW_SAMPLE_RATE
+from predict import DeadlineExceeded
+from model_registry import RegistryError
 
 
 class AFKView(discord.ui.View):
@@ -212,24 +217,31 @@ class General(commands.Cog):
             print(f"Error setting regional role: {e}")
             return f"Database error: {str(e)[:100]}"
 
-    async def get_pokemon_ping_info(self, pokemon_name, guild_id):
+    async def get_pokemon_ping_info(self, pokemon_name, guild_id, pokedex_entry=None):
         """Get ping information for a Pokemon based on its rarity"""
         if self.db is None:
             return None
 
-        pokemon_data = load_pokemon_data()
-        pokemon = find_pokemon_by_name(pokemon_name, pokemon_data)
+        # Predictions carry their resolved Pokedex entry; only look the name up without one
+        if pokedex_entry is not None:
+            if pokedex_entry.record is None:
+                return None
+            is_rare, is_regional = pokedex_entry.is_rare, pokedex_entry.is_regional
+        else:
+            pokemon_data = load_pokemon_data()
+            pokemon = find_pokemon_by_name(pokemon_name, pokemon_data)
 
-        if not pokemon:
-            return None
+            if not pokemon:
+                return None
+            is_rare = is_rare_pokemon(pokemon)
+            is_regional = pokemon.get('rarity', '').lower() == "regional"
 
         rare_role_id, regional_role_id = await self.get_guild_ping_roles(guild_id)
 
-        if is_rare_pokemon(pokemon) and rare_role_id:
+        if is_rare and rare_role_id:
             return f"Rare Ping: <@&{rare_role_id}>"
 
-        rarity = pokemon.get('rarity', '').lower()
-        if rarity == "regional" and regional_role_id:
+        if is_regional and regional_role_id:
             return f"Regional Ping: <@&{regional_role_id}>"
 
         return None
@@ -244,20 +256,30 @@ class General(commands.Cog):
 
         try:
             # Use async prediction
-            name, confidence = await self.predictor.predict(image_url, self.http_session)
+            result = await self.predictor.predict_top_k(image_url, self.http_session)
+            name = result.name
 
-            if not name or not confidence:
+            if not name:
                 return "Could not predict Pokemon from the provided image."
 
-            formatted_output = format_pokemon_prediction(name, confidence)
+            entry = result.pokedex
+            if entry is not None:
+                formatted_output = entry.format_prediction(result.confidence_text)
+            else:
+                formatted_output = format_pokemon_prediction(name, result.confidence_text)
+
+            # Runner-up candidates come with the prediction at no extra cost
+            alternatives = format_prediction_alternatives(result.alternatives)
+            if alternatives:
+                formatted_output += f"\n{alternatives}"
 
             # Get ping information concurrently
             collection_cog = self.bot.get_cog('Collection')
             if collection_cog:
                 # Run database queries concurrently
-                hunters_task = collection_cog.get_shiny_hunters_for_pokemon(name, ctx.guild.id)
-                collectors_task = collection_cog.get_collectors_for_pokemon(name, ctx.guild.id)
-                ping_info_task = self.get_pokemon_ping_info(name, ctx.guild.id)
+                hunters_task = collection_cog.get_shiny_hunters_for_pokemon(name, ctx.guild.id, entry)
+                collectors_task = collection_cog.get_collectors_for_pokemon(name, ctx.guild.id, entry)
+                ping_info_task = self.get_pokemon_ping_info(name, ctx.guild.id, entry)
 
                 hunters, collectors, ping_info = await asyncio.gather(
                     hunters_task, collectors_task, ping_info_task,
@@ -341,6 +363,96 @@ class General(commands.Cog):
         result = await self._predict_pokemon(image_url, ctx)
         await ctx.reply(result)
 
+    @commands.command(name="predictstats")
+    @commands.is_owner()
+    async def predict_stats_command(self, ctx, action: str = None):
+        """Show prediction pipeline and event loop metrics (bot owner only)"""
+        loop_monitor = getattr(self.bot, 'loop_monitor', None)
+
+        if action and action.lower() == "reset":
+            if loop_monitor:
+                loop_monitor.reset()
+            await ctx.reply("Event loop lag counters reset.")
+            return
+
+        sections = {}
+        if self.predictor is not None:
+            sections.update(self.predictor.get_stats())
+        if loop_monitor:
+            sections["event_loop"] = loop_monitor.get_stats()
+
+        if not sections:
+            await ctx.reply("Predictor not initialized, please try again later.")
+            return
+
+        lines = []
+        for section, values in sections.items():
+            lines.append(f"[{section}]")
+            for key, value in values.items():
+                lines.append(f"  {key}: {value}")
+
+        body = "\n".join(lines)[:1900]
+        await ctx.reply(f"```ini\n{body}\n```")
+
+    @predict_stats_command.error
+    async def predict_stats_error(self, ctx, error):
+        if isinstance(error, commands.NotOwner):
+            await ctx.reply("Only the bot owner can use this command.")
+
+    @commands.command(name="model")
+    @commands.is_owner()
+    async def model_command(self, ctx, action: str = None, version: str = None, sample_rate: float = None):
+        """Show, hot-swap or shadow-test registry model versions (bot owner only)"""
+        if self.predictor is None:
+            await ctx.reply("Predictor not initialized, please try again later.")
+            return
+
+        action = (action or "status").lower()
+        try:
+            if action == "status":
+                stats = self.predictor.get_stats()
+                lines = []
+                registry = self.predictor.registry
+                if registry is not None:
+                    serving = stats.get("model", {}).get("version")
+                    for entry in registry.versions():
+                        lines.append(f"{'*' if entry.name == serving else ' '} {entry.describe()}")
+                for section in ("model_registry", "shadow"):
+                    if section in stats:
+                        lines.append(f"[{section}]")
+                        lines.extend(f"  {key}: {value}" for key, value in stats[section].items())
+                body = "\n".join(lines)[:1900] or "No model registry configured."
+                await ctx.reply(f"```ini\n{body}\n```")
+            elif action == "load" and version:
+                await ctx.reply(f"Loading model {version} in the background...")
+                await ctx.reply(f"Model swapped: {await self.predictor.swap_to(version)}")
+            elif action == "shadow" and version:
+                await ctx.reply(f"Loading model {version} for shadow mode...")
+                rate = sample_rate if sample_rate is not None else PREDICT_SHADOW_SAMPLE_RATE
+                await ctx.reply(await self.predictor.start_shadow(version, min(max(rate, 0.0), 1.0)))
+            elif action == "reload":
+                await ctx.reply("Reloading the serving model in the background...")
+                await ctx.reply(f"Model reloaded: {await self.predictor.reload()}")
+            elif action == "promote":
+                await ctx.reply(f"Model swapped: {await self.predictor.promote_shadow()}")
+            elif action == "stop":
+                stopped = self.predictor.stop_shadow()
+                await ctx.reply("Shadow mode stopped." if stopped else "No model is running in shadow mode.")
+            else:
+                await ctx.reply(
+                    "Usage: `m!model` (status), `m!model load <version>`, `m!model reload`, "
+                    "`m!model shadow <version> [sample rate]`, `m!model promote`, `m!model stop`"
+                )
+        except (RegistryError, RuntimeError) as e:
+            await ctx.reply(f"Model {action} failed: {e}")
+
+    @model_command.error
+    async def model_error(self, ctx, error):
+        if isinstance(error, commands.NotOwner):
+            await ctx.reply("Only the bot owner can use this command.")
+        elif isinstance(error, commands.BadArgument):
+            await ctx.reply("Sample rate must be a number between 0 and 1.")
+
     # ===== ADMIN COMMANDS =====
     @commands.command(name="rare-role")
     @commands.has_permissions(administrator=True)
@@ -396,66 +508,78 @@ class General(commands.Cog):
                         image_url = await get_image_url_from_message(message)
 
                         if image_url:
+                            # A spawn answered too late is worth little; under load, drop stale
+                            # ones at whatever stage they reach so fresh spawns stay fast
+                            deadline = None
+                            if PREDICT_SPAWN_DEADLINE_SECONDS is not None:
+                                deadline = snowflake_time(message.id) + PREDICT_SPAWN_DEADLINE_SECONDS
+
                             try:
                                 # Use async prediction
-                                name, confidence = await self.predictor.predict(image_url, self.http_session)
-
-                                if name and confidence:
-                                    # Parse confidence
-                                    confidence_str = str(confidence).rstrip('%')
-                                    try:
-                                        confidence_value = float(confidence_str)
-
-                                        # Handle high confidence predictions (>= 80%)
-                                        if confidence_value >= 50.0:
-                                            formatted_output = format_pokemon_prediction(name, confidence)
-
-                                            # Get all ping information concurrently
-                                            collection_cog = self.bot.get_cog('Collection')
-                                            if collection_cog:
-                                                tasks = [
-                                                    collection_cog.get_shiny_hunters_for_pokemon(name, message.guild.id),
-                                                    collection_cog.get_collectors_for_pokemon(name, message.guild.id),
-                                                    self.get_pokemon_ping_info(name, message.guild.id)
-                                                ]
-
-                                                results = await asyncio.gather(*tasks, return_exceptions=True)
-                                                hunters, collectors, ping_info = results
-
-                                                # Handle results safely
-                                                if isinstance(hunters, list) and hunters:
-                                                    formatted_output += f"\nShiny Hunters: {' '.join(hunters)}"
-
-                                                if isinstance(collectors, list) and collectors:
-                                                    collector_mentions = " ".join([f"<@{user_id}>" for user_id in collectors])
-                                                    formatted_output += f"\nCollectors: {collector_mentions}"
-
-                                                if isinstance(ping_info, str) and ping_info:
-                                                    formatted_output += f"\n{ping_info}"
-
-                                            await message.reply(formatted_output)
-
-                                        # Handle low confidence predictions (< 80%) - Event Pokemon
+                                result = await self.predictor.predict_top_k(
+                                    image_url, self.http_session, deadline=deadline
+                                )
+
+                                if result.name:
+                                    self.predictor.check_deadline(deadline, "lookups")
+
+                                    # Handle high confidence predictions (>= 50%)
+                                    if result.confidence >= 0.5:
+                                        name = result.name
+                                        entry = result.pokedex
+                                        if entry is not None:
+                                            formatted_output = entry.format_prediction(result.confidence_text)
                                         else:
-                                            formatted_output = f"Event Pokemon: {confidence}"
-
-                                            # Get collectors who added "event" to their collection
-                                            collection_cog = self.bot.get_cog('Collection')
-                                            if collection_cog:
-                                                try:
-                                                    event_collectors = await collection_cog.get_collectors_for_pokemon("event", message.guild.id)
-
-                                                    if isinstance(event_collectors, list) and event_collectors:
-                                                        collector_mentions = " ".join([f"<@{user_id}>" for user_id in event_collectors])
-                                                        formatted_output += f"\nCollectors: {collector_mentions}"
-                                                except Exception as e:
-                                                    print(f"Error getting event collectors: {e}")
-
-                                            await message.reply(formatted_output)
-                                            print(f"Low confidence prediction sent: Event Pokemon ({confidence})")
-
-                                    except ValueError:
-                                        print(f"Could not parse confidence value: {confidence}")
+                                            formatted_output = format_pokemon_prediction(name, result.confidence_text)
+
+                                        # Get all ping information concurrently
+                                        collection_cog = self.bot.get_cog('Collection')
+                                        if collection_cog:
+                                            tasks = [
+                                                collection_cog.get_shiny_hunters_for_pokemon(name, message.guild.id, entry),
+                                                collection_cog.get_collectors_for_pokemon(name, message.guild.id, entry),
+                                                self.get_pokemon_ping_info(name, message.guild.id, entry)
+                                            ]
+
+                                            results = await asyncio.gather(*tasks, return_exceptions=True)
+                                            hunters, collectors, ping_info = results
+
+                                            # Handle results safely
+                                            if isinstance(hunters, list) and hunters:
+                                                formatted_output += f"\nShiny Hunters: {' '.join(hunters)}"
+
+                                            if isinstance(collectors, list) and collectors:
+                                                collector_mentions = " ".join([f"<@{user_id}>" for user_id in collectors])
+                                                formatted_output += f"\nCollectors: {collector_mentions}"
+
+                                            if isinstance(ping_info, str) and ping_info:
+                                                formatted_output += f"\n{ping_info}"
+
+                                        # The lookups can be slow too; don't send a stale reply
+                                        self.predictor.check_deadline(deadline, "reply")
+                                        await message.reply(formatted_output)
+
+                                    # Handle low confidence predictions (< 50%) - Event Pokemon
+                                    else:
+                                        formatted_output = f"Event Pokemon: {result.confidence_text}"
+
+                                        # Get collectors who added "event" to their collection
+                                        collection_cog = self.bot.get_cog('Collection')
+                                        if collection_cog:
+                                            try:
+                                                event_collectors = await collection_cog.get_collectors_for_pokemon("event", message.guild.id)
+
+                                                if isinstance(event_collectors, list) and event_collectors:
+                                                    collector_mentions = " ".join([f"<@{user_id}>" for user_id in event_collectors])
+                                                    formatted_output += f"\nCollectors: {collector_mentions}"
+                                            except Exception as e:
+                                                print(f"Error getting event collectors: {e}")
+
+                                        self.predictor.check_deadline(deadline, "reply")
+                                        await message.reply(formatted_output)
+                                        print(f"Low confidence prediction sent: Event Pokemon ({result.confidence_text})")
+                            except DeadlineExceeded:
+                                pass  # Counted in the predictor's deadline stats
                             except Exception as e:
                                 print(f"Auto-detection error: {e}")
 
@@ -3,6 +3,7 @@ from discord import app_commands
 from discord.ext import commands
 import re
 from typing import Optional
+from utils import format_prediction_alternatives
 
 class MessageCommands(commands.Cog):
     """Message context menu commands for Pokemon identification"""
@@ -85,16 +86,19 @@ class MessageCommands(commands.Cog):
 
             # Make prediction
             try:
-                pokemon_name, confidence = await self.bot.predictor.predict(
+                result = await self.bot.predictor.predict_top_k(
                     image_url, 
                     self.bot.http_session
                 )
 
                 # Format pokemon name (capitalize each word)
-                formatted_name = pokemon_name.replace('_', ' ').title()
+                formatted_name = result.name.replace('_', ' ').title()
 
-                # Send simple text response
-                response = f"{formatted_name}: {confidence}"
+                # Send simple text response, with runner-up candidates if any are plausible
+                response = f"{formatted_name}: {result.confidence_text}"
+                alternatives = format_prediction_alternatives(result.alternatives)
+                if alternatives:
+                    response += f"\n{alternatives}"
                 await interaction.followup.send(response, ephemeral=True)
 
             except ValueError as e:
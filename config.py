@@ -4,6 +4,116 @@
 # Current: Soft golden/cream color (#f4e5ba)
 EMBED_COLOR = 0xf4e5ba
 
+# Prediction settings
+# Load the INT8 model (model/pokemon_cnn_v2.int8.onnx, made by quantize_model.py)
+# instead of FP32; smaller and faster on memory-starved containers
+PREDICT_QUANTIZED = False
+# Low-memory mode: load model/pokemon_cnn_v2.external.onnx, whose weights sit in a
+# separate .data file (`python convert.py --external-data`), memory-mapped, with
+# weight prepacking, the CPU arena and memory-pattern preallocation off; bot processes
+# on one host then share a single page-cache copy of the weights
+# (compare with `python memory_bench.py --processes 4`)
+PREDICT_LOW_MEMORY = False
+# Inference backend: "onnxruntime" (CPU provider), "xnnpack" / "openvino" (ONNX Runtime
+# builds with that provider), "torchscript" (needs torch and `python convert.py --torchscript`),
+# or "auto" to time every available one at startup and keep the fastest;
+# a missing backend falls back to "onnxruntime" (compare with `python backends.py`)
+PREDICT_BACKEND = "onnxruntime"
+# How long the inference queue waits for more spawns before running a batch
+PREDICT_BATCH_WINDOW_MS = 10
+# Maximum number of images run through the model in one batch
+PREDICT_MAX_BATCH_SIZE = 16
+# Worker threads for image decoding, preprocessing and inference
+# (0 runs them directly on the event loop, the pre-thread-pool behaviour)
+PREDICT_THREAD_POOL_SIZE = 2
+# Number of candidates kept with every prediction (shown as alternatives)
+PREDICT_TOP_K = 5
+# Resize filter for model input ("bilinear", "bicubic", "lanczos", ...). LANCZOS is
+# what the original pipeline used; switch to a cheaper filter only after checking its
+# top-1 accuracy with `python preprocess_bench.py --model model/pokemon_cnn_v2.onnx`
+PREDICT_RESIZE_FILTER = "lanczos"
+# Decode JPEGs at reduced scale and box-reduce large images before the resize filter.
+# Faster, but the model input changes slightly: turn it on only once `python benchmark.py`
+# (and `python preprocess_bench.py --model ...`) show top-1 unchanged
+PREDICT_REDUCED_DECODE = False
+# Also key the content cache on decoded pixels, so re-encoded copies of a sprite
+# skip inference (costs a decode on every content-cache miss)
+PREDICT_CACHE_PIXEL_HASH = False
+# Optional SQLite file that keeps URL/content predictions across restarts
+# (None disables it), its size bound, and how often queued writes are flushed.
+# Keys the in-memory caches miss are looked up in it before downloading/inferring.
+PREDICT_PERSISTENT_CACHE_PATH = None  # e.g. "cache/predictions.sqlite3"
+PREDICT_PERSISTENT_CACHE_MAX_ENTRIES = 200000
+PREDICT_PERSISTENT_CACHE_FLUSH_SECONDS = 2.0
+# Perceptual-hash fast path: clean sprites matching a reference within this many
+# bits (out of 128) are labelled without running the CNN
+# (build the index with `python phash_index.py`)
+PREDICT_PHASH_INDEX_PATH = "model/phash_index.npz"
+PREDICT_PHASH_MAX_DISTANCE = 6
+PREDICT_PHASH_MAX_COLOR_DIFF = 24
+# Optional two-stage cascade: a small first-stage model (made by train_fast_model.py,
+# used only if the file exists) answers when its top probability reaches the threshold,
+# otherwise the full CNN runs; tune with `python cascade_bench.py`
+PREDICT_CASCADE_MODEL_PATH = "model/pokemon_cnn_fast.onnx"
+PREDICT_CASCADE_THRESHOLD = 0.9
+# Address of a shared inference server (`python inference_server.py`), e.g.
+# "unix:/tmp/pokemon-inference.sock" or "127.0.0.1:8790"; None runs the model in-process
+PREDICT_INFERENCE_SERVER = None
+PREDICT_INFERENCE_TIMEOUT = 10
+# Shared secret sent with every inference server request and checked by the server.
+# The server refuses to listen on a non-loopback TCP address without one
+PREDICT_INFERENCE_TOKEN = None
+# Requests the server works on at once per connection; it stops reading a client's
+# frames past this, so one connection can't queue unbounded work
+PREDICT_INFERENCE_MAX_IN_FLIGHT = 64
+# Image downloads are streamed and abandoned once they pass this size; at most
+# this many run at once, which bounds download memory to roughly their product
+PREDICT_MAX_IMAGE_BYTES = 8 * 1024 * 1024
+PREDICT_MAX_CONCURRENT_DOWNLOADS = 8
+PREDICT_DOWNLOAD_CHUNK_BYTES = 64 * 1024
+# Failed image URLs (404, timeout, not an image, ...) fail immediately for this many
+# seconds instead of being downloaded again on retries and edits
+PREDICT_FAILED_URL_TTL = 60
+# After this many timeouts/5xx responses in a row from one host, downloads from it
+# fail immediately for the cooldown (in seconds), then a single trial is let through
+PREDICT_HOST_FAILURE_THRESHOLD = 5
+PREDICT_HOST_COOLDOWN_SECONDS = 30
+# Host-specific ONNX Runtime settings and pre-optimized model made by
+# `python ort_autotune.py`; used when present and made for this model and host
+# (None always uses the built-in session settings)
+PREDICT_ORT_PROFILE_PATH = "model/ort_profile.json"
+# Model load and warm-up happen off the event loop at startup; warm-up runs the
+# model at these batch sizes (None: powers of two up to PREDICT_MAX_BATCH_SIZE)
+PREDICT_WARMUP_BATCH_SIZES = None
+PREDICT_WARMUP_RUNS = 2
+# How long a spawn that arrives during warm-up waits for the model, in seconds
+PREDICT_READY_TIMEOUT = 60
+# "cnn" labels images with the CNN's classifier; "embedding" labels them with the
+# nearest bundled sprites in the CNN's 512-d feature space, so Pokemon added to
+# data/commands/pokemon/images need only `python embedding_index.py` (seconds), not
+# retraining (needs the feature extractor from `python convert.py --skip-export --embeddings`).
+# Its confidences are calibrated by embedding_index.py, so the 50% event-Pokemon cut
+# still applies; registry versions can only be loaded with "cnn"
+PREDICT_CLASSIFIER = "cnn"
+PREDICT_EMBEDDING_MODEL_PATH = "model/pokemon_cnn_v2.features.onnx"
+PREDICT_EMBEDDING_INDEX_PATH = "model/embedding_index.npz"
+# Versioned model/label pairs (`python model_registry.py add ...`); the owner's
+# m!model command hot-swaps between them and restarts load the active one
+PREDICT_MODEL_REGISTRY_PATH = "model/registry"
+# Share of uncached spawns a shadow candidate (m!model shadow) also classifies,
+# and at most this many shadow runs at once (extra samples are skipped)
+PREDICT_SHADOW_SAMPLE_RATE = 0.1
+PREDICT_SHADOW_MAX_PENDING = 2
+# After a swap the old model finishes its in-flight predictions for up to this many
+# seconds before it is closed
+PREDICT_SWAP_DRAIN_SECONDS = 30
+# Spawns older than this many seconds (from the message's snowflake timestamp) are
+# no longer worth answering: their download, inference, lookups and reply are skipped or
+# cancelled (None handles every spawn however late)
+PREDICT_SPAWN_DEADLINE_SECONDS = 15
+# How often the event loop lag monitor samples the loop, in seconds
+LOOP_LAG_CHECK_INTERVAL = 0.5
+
 # You can add other bot-wide configuration here as needed
 # For example:
 # BOT_VERSION = "1.0.0"
@@ -1,15 +1,32 @@
 # convert.py
+#   python convert.py                    # model/pokemon_cnn_v2.pt -> model/pokemon_cnn_v2.onnx
+#   python convert.py --external-data    # also write pokemon_cnn_v2.external.onnx + .data
+#   python convert.py --torchscript      # also write pokemon_cnn_v2.torchscript.pt (PREDICT_BACKEND)
+#   python convert.py --embeddings       # also write pokemon_cnn_v2.features.onnx (embedding_index.py)
+#   python convert.py --model model/pokemon_cnn_112.pt --output model/pokemon_cnn_112.onnx
+# The export uses the input size the model was trained at (main_tensor.py --input-size,
+# saved on the model; 224 if absent) and Prediction resizes to whatever the ONNX input
+# declares. The --external-data/--torchscript/--embeddings copies are named after --output.
+# The external-data copy keeps the weights in a separate file that ONNX Runtime can
+# memory-map (PREDICT_LOW_MEMORY); it needs the `onnx` package (pip install onnx).
 import torch
 import torch.nn as nn
 import os
+import argparse
+
+DEFAULT_INPUT_SIZE = 224
 
 MODEL_PATH = "model/pokemon_cnn_v2.pt"
 ONNX_PATH = "model/pokemon_cnn_v2.onnx"
+ONNX_EXTERNAL_PATH = "model/pokemon_cnn_v2.external.onnx"
+TORCHSCRIPT_PATH = "model/pokemon_cnn_v2.torchscript.pt"
+EMBEDDING_MODEL_PATH = "model/pokemon_cnn_v2.features.onnx"
 
 # Match your CNN model structure
 class CNN(nn.Module):
-    def __init__(self, num_classes):
+    def __init__(self, num_classes, input_size=DEFAULT_INPUT_SIZE):
         super(CNN, self).__init__()
+        self.input_size = input_size
         self.features = nn.Sequential(
             nn.Conv2d(3, 32, kernel_size=3, padding=1),
             nn.ReLU(inplace=True),
@@ -26,7 +43,7 @@ class CNN(nn.Module):
         )
         self.classifier = nn.Sequential(
             nn.Dropout(0.5),
-            nn.Linear(256 * 14 * 14, 512),
+            nn.Linear(256 * (input_size // 16) ** 2, 512),  # Four 2x poolings
             nn.ReLU(inplace=True),
             nn.Dropout(0.5),
             nn.Linear(512, num_classes)
@@ -37,17 +54,73 @@ class CNN(nn.Module):
         x = torch.flatten(x, 1)
         return self.classifier(x)
 
-def convert_model():
-    print(f"Loading model from {MODEL_PATH}...")
-    model = torch.load(MODEL_PATH, map_location='cpu', weights_only=False)
+def save_external_data(onnx_path=ONNX_PATH, output_path=ONNX_EXTERNAL_PATH):
+    """Copy an ONNX model with its weights moved to <output>.data, next to the graph file"""
+    import onnx
+
+    model = onnx.load(onnx_path)
+    location = os.path.basename(output_path) + ".data"
+    data_path = os.path.join(os.path.dirname(output_path), location)
+    if os.path.exists(data_path):
+        os.remove(data_path)  # onnx appends to an existing data file
+    onnx.save_model(
+        model, output_path,
+        save_as_external_data=True,
+        all_tensors_to_one_file=True,
+        location=location,
+        size_threshold=1024  # Small biases stay inline
+    )
+    print(f"External-data model saved to {output_path} (weights in {data_path})")
+
+def save_feature_extractor(onnx_path=ONNX_PATH, output_path=EMBEDDING_MODEL_PATH):
+    """Cut the exported model before its last layer, so it outputs the 512-d penultimate features"""
+    import onnx
+    from onnx.utils import extract_model
+
+    model = onnx.load(onnx_path, load_external_data=False)
+    producers = {output: node for node in model.graph.node for output in node.output}
+    last = producers[model.graph.output[0].name]
+    if last.op_type == "Add":
+        # MatMul + Add instead of a fused Gemm
+        last = next(producers[name] for name in last.input if name in producers and producers[name].op_type == "MatMul")
+    if last.op_type not in ("Gemm", "MatMul"):
+        raise ValueError(f"Expected the model to end in a Gemm/MatMul layer, found {last.op_type}")
+
+    extract_model(onnx_path, output_path, [model.graph.input[0].name], [last.input[0]])
+    print(f"Feature extractor saved to {output_path} (output {last.input[0]})")
+
+def derived_path(onnx_path: str, suffix: str) -> str:
+    """model/x.onnx -> model/x.<suffix>, so every variant keeps its own exports"""
+    return os.path.splitext(onnx_path)[0] + "." + suffix
+
+def load_model(model_path=MODEL_PATH, input_size=None):
+    """The trained model and its input size (the --input-size override, else the size it was trained at)"""
+    model = torch.load(model_path, map_location='cpu', weights_only=False)
     model.eval()
+    trained_size = getattr(model, "input_size", DEFAULT_INPUT_SIZE)
+    if input_size and input_size != trained_size:
+        print(f"Warning: {model_path} was trained at {trained_size}px, exporting at {input_size}px")
+    return model, input_size or trained_size
+
+def save_torchscript(model_path=MODEL_PATH, output_path=TORCHSCRIPT_PATH, input_size=None):
+    """Trace the model to TorchScript for backends.TorchScriptBackend"""
+    model, input_size = load_model(model_path, input_size)
+    with torch.no_grad():
+        traced = torch.jit.trace(model, torch.randn(1, 3, input_size, input_size))
+    # Unlike ONNX the traced graph doesn't declare its input shape, so store it alongside
+    torch.jit.save(traced, output_path, _extra_files={"input_size": str(input_size)})
+    print(f"TorchScript model saved to {output_path} ({input_size}px input)")
 
-    dummy_input = torch.randn(1, 3, 224, 224)
-    print("Converting to ONNX...")
+def convert_model(model_path=MODEL_PATH, onnx_path=ONNX_PATH, input_size=None):
+    print(f"Loading model from {model_path}...")
+    model, input_size = load_model(model_path, input_size)
+
+    dummy_input = torch.randn(1, 3, input_size, input_size)
+    print(f"Converting to ONNX ({input_size}x{input_size} input)...")
     torch.onnx.export(
         model,
         dummy_input,
-        ONNX_PATH,
+        onnx_path,
         export_params=True,
         opset_version=11,
         do_constant_folding=True,
@@ -55,7 +128,29 @@ def convert_model():
         output_names=['output'],
         dynamic_axes={'input': {0: 'batch_size'}, 'output': {0: 'batch_size'}}
     )
-    print(f"ONNX model saved to {ONNX_PATH}")
+    print(f"ONNX model saved to {onnx_path}")
 
 if __name__ == "__main__":
-    convert_model()
+    parser = argparse.ArgumentParser(description="Export the CNN to ONNX")
+    parser.add_argument("--model", default=MODEL_PATH, help="trained PyTorch model")
+    parser.add_argument("--output", default=ONNX_PATH, help="ONNX model to write")
+    parser.add_argument("--input-size", type=int,
+                        help="export at this resolution instead of the one the model was trained at")
+    parser.add_argument("--external-data", action="store_true",
+                        help=f"also write {ONNX_EXTERNAL_PATH} with memory-mappable weights")
+    parser.add_argument("--skip-export", action="store_true",
+                        help=f"reuse the existing {ONNX_PATH} instead of exporting from {MODEL_PATH}")
+    parser.add_argument("--embeddings", action="store_true",
+                        help=f"also write the feature extractor {EMBEDDING_MODEL_PATH} for the embedding index")
+    parser.add_argument("--torchscript", action="store_true",
+                        help=f"also write {TORCHSCRIPT_PATH} for the torchscript backend")
+    args = parser.parse_args()
+
+    if not args.skip_export:
+        convert_model(args.model, args.output, args.input_size)
+    if args.external_data:
+        save_external_data(args.output, derived_path(args.output, "external.onnx"))
+    if args.embeddings:
+        save_feature_extractor(args.output, derived_path(args.output, "features.onnx"))
+    if args.torchscript:
+        save_torchscript(args.model, derived_path(args.output, "torchscript.pt"), args.input_size)
@@ -0,0 +1,90 @@
+import os
+import re
+import unicodedata
+from typing import Dict, Iterator, List, Optional, Tuple
+
+SUBMODULE_PATH = os.path.dirname(os.path.realpath(__file__))
+SOURCE_IMAGE_PATH = os.path.join(SUBMODULE_PATH, "data/commands/pokemon/pokemon_images")
+IMAGES_PATH = os.path.join(SUBMODULE_PATH, "data/commands/pokemon/images")
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".gif")
+
+# Folder names use "<species>-<region>", model labels use "<Regional> <Species>"
+REGION_ALIASES = {
+    "alolan": "alola",
+    "galarian": "galar",
+    "hisuian": "hisui",
+    "paldean": "paldea",
+}
+# Folder names use "<species>-gmax", Pokedex names use "Gigantamax <Species>"
+TOKEN_ALIASES = dict(REGION_ALIASES, gigantamax="gmax")
+
+def label_key(name: str) -> Tuple[str, ...]:
+    """
+    Order-independent key for a Pokemon name, so dataset folder names like
+    "arcanine-hisui" and model labels like "Hisuian Arcanine" compare equal
+    """
+    normalized = unicodedata.normalize('NFD', name)
+    without_accents = ''.join(char for char in normalized if unicodedata.category(char) != 'Mn').lower()
+    cleaned = re.sub(r"[.':]", "", without_accents)
+    tokens = [TOKEN_ALIASES.get(token, token) for token in re.split(r"[\s\-_]+", cleaned) if token]
+    return tuple(sorted(tokens))
+
+def build_label_lookup(class_names: List[str]) -> Dict[Tuple[str, ...], int]:
+    """Map label keys to class indices, leaving out keys shared by several labels"""
+    lookup = {}
+    ambiguous = set()
+    for idx, name in enumerate(class_names):
+        key = label_key(name)
+        if key in lookup and class_names[lookup[key]] != name:
+            ambiguous.add(key)
+        lookup.setdefault(key, idx)
+    for key in ambiguous:
+        lookup.pop(key, None)
+    return lookup
+
+def resolve_label(name: str, lookup: Dict[Tuple[str, ...], int]) -> Optional[int]:
+    """Class index for a dataset folder/file name, or None if the model has no such label"""
+    return lookup.get(label_key(name))
+
+def iter_sprite_sets(roots=(SOURCE_IMAGE_PATH, IMAGES_PATH)) -> Iterator[Tuple[str, List[str]]]:
+    """
+    Yield (name, image paths) for every bundled sprite set, whether or not the model knows it.
+    Supports both layouts: flat "<name>.png" files and "<name>/<n>.png" folders.
+    """
+    for root in roots:
+        if not os.path.isdir(root):
+            continue
+        for entry in sorted(os.listdir(root)):
+            entry_path = os.path.join(root, entry)
+            if os.path.isdir(entry_path):
+                yield entry, [
+                    os.path.join(entry_path, f) for f in sorted(os.listdir(entry_path))
+                    if f.lower().endswith(IMAGE_EXTENSIONS)
+                ]
+            elif entry.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.splitext(entry)[0], [entry_path]
+
+def iter_labelled_images(class_names: List[str], roots=(SOURCE_IMAGE_PATH, IMAGES_PATH),
+                         stats: Optional[dict] = None) -> Iterator[Tuple[str, int]]:
+    """
+    Yield (image path, class index) for every bundled sprite whose name maps to a model label.
+    Unmatched names are counted in stats["unmatched"] when a dict is passed.
+    """
+    lookup = build_label_lookup(class_names)
+    if stats is not None:
+        stats.setdefault("unmatched", set())
+
+    for name, files in iter_sprite_sets(roots):
+        idx = resolve_label(name, lookup)
+        if idx is None:
+            if stats is not None:
+                stats["unmatched"].add(name)
+            continue
+
+        for path in files:
+            yield path, idx
+
+def is_lfs_pointer(path: str) -> bool:
+    """True if the file is a Git LFS pointer rather than real image data"""
+    with open(path, "rb") as f:
+        return f.read(24).startswith(b"version https://git-lfs")
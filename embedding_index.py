@@ -0,0 +1,262 @@
+"""
+Nearest-neighbour classifier over sprite embeddings (PREDICT_CLASSIFIER = "embedding").
+
+    python convert.py --skip-export --embeddings    # model/pokemon_cnn_v2.features.onnx
+    python embedding_index.py                       # embed new or changed sprites only
+    python embedding_index.py --rebuild             # embed every sprite again
+
+Every bundled sprite is run once through the CNN's penultimate 512-d layer and
+L2-normalised; an image is labelled with the Pokemon of its most similar sprites (one
+matrix-vector product). Cosine similarities of ReLU features are all fairly high, so the
+confidence is a softmax over each Pokemon's best similarity, with a temperature fitted
+on the index itself (every sprite classified by the others). Sprite folders the CNN has no label for are named from
+pokemondata.json, so adding a Pokemon means dropping its sprites into
+data/commands/pokemon/images/<name>/ and re-running this script, not retraining.
+"""
+import os
+import json
+import time
+import hashlib
+import argparse
+import numpy as np
+import onnxruntime as ort
+from typing import Dict, List, Optional, Tuple
+from dataset import SOURCE_IMAGE_PATH, IMAGES_PATH, iter_sprite_sets, build_label_lookup, resolve_label, is_lfs_pointer
+from model_registry import file_sha256
+from preprocessing import ImagePreprocessor, model_input_size
+
+SUBMODULE_PATH = os.path.dirname(os.path.realpath(__file__))
+# Softmax temperature for indexes built before calibration or too small to fit one
+DEFAULT_TEMPERATURE = 0.05
+TEMPERATURE_CANDIDATES = np.geomspace(1e-4, 1.0, 81)
+
+class EmbeddingIndex:
+    """L2-normalised sprite embeddings grouped by label, searched by cosine similarity"""
+    def __init__(self, embeddings: np.ndarray, labels: np.ndarray, label_names: List[str],
+                 paths: Optional[List[str]] = None, mtimes: Optional[np.ndarray] = None, extractor_sha256="",
+                 temperature=DEFAULT_TEMPERATURE):
+        # Entries sorted by label so the best match per label is one reduceat
+        order = np.argsort(labels, kind="stable")
+        self.embeddings = np.ascontiguousarray(embeddings[order], dtype=np.float32)
+        self.labels = np.asarray(labels, dtype=np.int32)[order]
+        self.label_names = list(label_names)
+        self.paths = [paths[i] for i in order] if paths is not None else [""] * len(order)
+        self.mtimes = np.asarray(mtimes, dtype=np.float64)[order] if mtimes is not None else np.zeros(len(order))
+        self.extractor_sha256 = extractor_sha256
+
+        self._present, self._starts = np.unique(self.labels, return_index=True)
+        self.lookups = 0
+        self.calibrate(temperature)
+
+    def calibrate(self, temperature: float):
+        """Set the softmax temperature; it changes every confidence, so it is part of the signature"""
+        self.temperature = float(temperature)
+        self.signature = hashlib.sha1(
+            self.embeddings.tobytes() + self.labels.tobytes() + repr(self.temperature).encode()
+        ).hexdigest()[:8]
+
+    def __len__(self):
+        return len(self.labels)
+
+    @classmethod
+    def load(cls, path: str) -> "EmbeddingIndex":
+        data = np.load(path, allow_pickle=False)
+        temperature = float(data["temperature"]) if "temperature" in data.files else DEFAULT_TEMPERATURE
+        return cls(
+            data["embeddings"], data["labels"], [str(name) for name in data["label_names"]],
+            [str(p) for p in data["paths"]], data["mtimes"], str(data["extractor_sha256"]), temperature
+        )
+
+    def save(self, path: str):
+        np.savez(
+            path,
+            embeddings=self.embeddings,
+            labels=self.labels,
+            label_names=np.array(self.label_names),
+            paths=np.array(self.paths),
+            mtimes=self.mtimes,
+            extractor_sha256=np.array(self.extractor_sha256),
+            temperature=np.array(self.temperature),
+        )
+
+    def classify(self, embedding: np.ndarray, k=5) -> List[Tuple[int, float]]:
+        """Top (label index, probability) pairs: softmax over each label's best cosine similarity"""
+        if not len(self.labels):
+            return []
+        query = embedding.reshape(-1).astype(np.float32)
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+        similarities = self.embeddings @ query
+        best = np.maximum.reduceat(similarities, self._starts)
+        probabilities = np.exp((best - best.max()) / self.temperature)
+        probabilities /= probabilities.sum()
+
+        k = min(k, len(best))
+        top = np.argpartition(best, -k)[-k:]
+        top = top[np.argsort(best[top])[::-1]]
+        self.lookups += 1
+        return [(int(self._present[i]), float(probabilities[i])) for i in top]
+
+    def get_stats(self) -> dict:
+        return {"entries": len(self), "labels": len(self._present), "temperature": self.temperature,
+                "lookups": self.lookups}
+
+def fit_temperature(index: EmbeddingIndex, candidates=TEMPERATURE_CANDIDATES, chunk_size=256) -> Optional[float]:
+    """
+    Temperature minimising the log loss of each sprite's label when it is classified by
+    the rest of the index (leave-one-out). Only sprites whose Pokemon has another sprite
+    take part; None if there are none.
+    """
+    counts = np.bincount(index.labels)
+    held_out = np.flatnonzero(counts[index.labels] >= 2)
+    if not len(held_out):
+        return None
+    losses = np.zeros(len(candidates))
+    for start in range(0, len(held_out), chunk_size):
+        rows = held_out[start:start + chunk_size]
+        similarities = index.embeddings[rows] @ index.embeddings.T
+        similarities[np.arange(len(rows)), rows] = -np.inf  # A sprite can't vote for itself
+        best = np.maximum.reduceat(similarities, index._starts, axis=1)
+        best -= best.max(axis=1, keepdims=True)
+        true_best = best[np.arange(len(rows)), np.searchsorted(index._present, index.labels[rows])]
+        for i, temperature in enumerate(candidates):
+            log_total = np.log(np.exp(best / temperature).sum(axis=1))
+            losses[i] += float((log_total - true_best / temperature).sum())
+    return float(candidates[int(np.argmin(losses))])
+
+def normalize_rows(embeddings: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+def resolve_sprite_labels(names: List[str], class_names: List[str], pokemon_data: List[dict]) -> Dict[str, str]:
+    """
+    Sprite set name -> label: the model's label if it has one, otherwise the
+    pokemondata.json name, otherwise the folder name itself
+    """
+    class_lookup = build_label_lookup(class_names)
+    pokedex_names = [pokemon["name"] for pokemon in pokemon_data if pokemon.get("name")]
+    pokedex_lookup = build_label_lookup(pokedex_names)
+    labels = {}
+    for name in names:
+        idx = resolve_label(name, class_lookup)
+        if idx is not None:
+            labels[name] = class_names[idx]
+            continue
+        idx = resolve_label(name, pokedex_lookup)
+        labels[name] = pokedex_names[idx] if idx is not None else name
+    return labels
+
+def embed_files(session: ort.InferenceSession, preprocessor: ImagePreprocessor, paths: List[str],
+                batch_size=32) -> np.ndarray:
+    """Normalised embeddings for image files, batch_size at a time"""
+    input_name = session.get_inputs()[0].name
+    rows = []
+    for start in range(0, len(paths), batch_size):
+        chunk = paths[start:start + batch_size]
+        batch = preprocessor.new_buffer(len(chunk))
+        for i, path in enumerate(chunk):
+            with open(path, "rb") as f:
+                preprocessor.preprocess_bytes(f.read(), batch[i:i + 1])
+        rows.append(session.run(None, {input_name: batch})[0])
+    return normalize_rows(np.concatenate(rows)) if rows else np.zeros((0, 0), dtype=np.float32)
+
+def update_index(previous: Optional[EmbeddingIndex], sprites: List[Tuple[str, str]], class_names: List[str],
+                 session: ort.InferenceSession, preprocessor: ImagePreprocessor,
+                 extractor_sha256: str) -> Tuple[EmbeddingIndex, int, int]:
+    """
+    Index (relative path, label) sprites, reusing `previous` embeddings of files that
+    haven't changed since. Returns (index, files embedded, entries dropped).
+    """
+    reusable = {}
+    if previous is not None and previous.extractor_sha256 == extractor_sha256:
+        for i, path in enumerate(previous.paths):
+            reusable[path] = (previous.mtimes[i], i)
+
+    # The CNN's labels keep their class indices; Pokemon it doesn't know come after them
+    known = set(class_names)
+    label_names = list(class_names) + sorted({label for _, label in sprites if label not in known})
+    label_ids = {label: idx for idx, label in enumerate(label_names)}
+    kept, to_embed = [], []
+    for path, label in sprites:
+        mtime = os.path.getmtime(os.path.join(SUBMODULE_PATH, path))
+        entry = reusable.pop(path, None)
+        if entry is not None and entry[0] == mtime:
+            kept.append((path, label, mtime, entry[1]))
+        else:
+            to_embed.append((path, label, mtime))
+
+    embedded = embed_files(session, preprocessor, [os.path.join(SUBMODULE_PATH, p) for p, _, _ in to_embed])
+    parts = []
+    if kept:
+        parts.append(previous.embeddings[[i for _, _, _, i in kept]])
+    if to_embed:
+        parts.append(embedded)
+    entries = [(p, label, mtime) for p, label, mtime, _ in kept] + to_embed
+    embeddings = np.concatenate(parts) if parts else np.zeros((0, 512), dtype=np.float32)
+
+    index = EmbeddingIndex(
+        embeddings,
+        np.array([label_ids[label] for _, label, _ in entries], dtype=np.int32),
+        label_names,
+        [p for p, _, _ in entries],
+        np.array([mtime for _, _, mtime in entries], dtype=np.float64),
+        extractor_sha256
+    )
+    return index, len(to_embed), len(reusable)
+
+def main():
+    from config import PREDICT_RESIZE_FILTER
+    from predict import EMBEDDING_MODEL_PATH, EMBEDDING_INDEX_PATH, LABELS_PATH, POKEDEX_PATH, load_class_names
+
+    parser = argparse.ArgumentParser(description="Build or update the sprite embedding index")
+    parser.add_argument("--model", default=EMBEDDING_MODEL_PATH, help="feature extractor (convert.py --embeddings)")
+    parser.add_argument("--output", default=EMBEDDING_INDEX_PATH)
+    parser.add_argument("--labels", default=LABELS_PATH)
+    parser.add_argument("--data-dir", nargs="+", default=[SOURCE_IMAGE_PATH, IMAGES_PATH])
+    parser.add_argument("--rebuild", action="store_true", help="ignore the existing index and embed everything")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    class_names = load_class_names(args.labels)
+    with open(POKEDEX_PATH, "r", encoding="utf-8") as f:
+        pokemon_data = json.load(f)
+
+    sprite_sets = list(iter_sprite_sets(args.data_dir))
+    labels = resolve_sprite_labels([name for name, _ in sprite_sets], class_names, pokemon_data)
+    sprites, skipped = [], 0
+    for name, files in sprite_sets:
+        for path in files:
+            if is_lfs_pointer(path):
+                skipped += 1
+                continue
+            sprites.append((os.path.relpath(path, SUBMODULE_PATH), labels[name]))
+    if skipped:
+        print(f"{skipped} files are Git LFS pointers and were skipped (run 'git lfs pull')")
+
+    previous = None
+    if not args.rebuild and os.path.exists(args.output):
+        previous = EmbeddingIndex.load(args.output)
+    extractor_sha256 = file_sha256(args.model)
+    if previous is not None and previous.extractor_sha256 != extractor_sha256:
+        print("Feature extractor changed since the index was built; embedding every sprite again")
+
+    session = ort.InferenceSession(args.model, providers=["CPUExecutionProvider"])
+    preprocessor = ImagePreprocessor(model_input_size(session), PREDICT_RESIZE_FILTER)
+    index, embedded, dropped = update_index(previous, sprites, class_names, session, preprocessor, extractor_sha256)
+    temperature = fit_temperature(index)
+    if temperature is None:
+        print(f"No Pokemon has two sprites to calibrate confidences on; using temperature {DEFAULT_TEMPERATURE}")
+    else:
+        index.calibrate(temperature)
+        print(f"Confidence temperature {temperature:.4f} (fitted leaving each sprite out)")
+    index.save(args.output)
+
+    new_labels = sorted(set(index.label_names) - set(class_names))
+    print(f"Indexed {len(index)} sprites of {index.get_stats()['labels']} Pokemon "
+          f"({embedded} embedded, {len(index) - embedded} reused, {dropped} removed) "
+          f"in {time.perf_counter() - started:.1f}s -> {args.output}")
+    if new_labels:
+        print(f"{len(new_labels)} not in the CNN's labels: {', '.join(new_labels[:10])}"
+              f"{', ...' if len(new_labels) > 10 else ''}")
+
+if __name__ == "__main__":
+    main()
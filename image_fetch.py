@@ -0,0 +1,281 @@
+import time
+import asyncio
+import aiohttp
+from collections import OrderedDict
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+# Leading bytes of the formats PIL can decode for us (WebP also needs "WEBP" at offset 8)
+IMAGE_SIGNATURES = (
+    b"\x89PNG\r\n\x1a\n",
+    b"\xff\xd8\xff",
+    b"GIF87a",
+    b"GIF89a",
+    b"BM",
+)
+SNIFF_BYTES = 12
+
+# Content types some hosts send for images; anything else that isn't image/* is refused
+GENERIC_CONTENT_TYPES = {"", "application/octet-stream", "binary/octet-stream"}
+
+def looks_like_image(head: bytes) -> bool:
+    """Check the first bytes of a body against known image signatures"""
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return True
+    return head.startswith(IMAGE_SIGNATURES)
+
+class ImageRejected(ValueError):
+    """The response isn't an image we accept (content type, signature or size)"""
+
+class ImageBuffer:
+    """
+    Accumulates a download into a single bytearray, sized up front from Content-Length
+    when the server sends one, and refuses to grow past `max_bytes`.
+    """
+    def __init__(self, max_bytes: int, expected_size: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self.data = bytearray(expected_size or 0)
+        self.size = 0
+        self.sniffed = False
+
+    def _sniff(self):
+        self.sniffed = True
+        if not looks_like_image(bytes(self.data[:min(self.size, SNIFF_BYTES)])):
+            raise ImageRejected("URL does not point to a supported image")
+
+    def append(self, chunk: bytes):
+        end = self.size + len(chunk)
+        if end > self.max_bytes:
+            raise ImageRejected(f"Image is larger than {self.max_bytes // 1024} KB")
+
+        if end <= len(self.data):
+            self.data[self.size:end] = chunk
+        else:
+            del self.data[self.size:]
+            self.data += chunk
+        self.size = end
+        # Checked once the signature has arrived (a first chunk can be shorter than it),
+        # before anything else is downloaded
+        if not self.sniffed and self.size >= SNIFF_BYTES:
+            self._sniff()
+
+    def getvalue(self) -> bytearray:
+        if self.size == 0:
+            raise ImageRejected("Image response was empty")
+        if not self.sniffed:
+            self._sniff()  # A body shorter than SNIFF_BYTES
+        # Trim if the server sent less than it announced
+        del self.data[self.size:]
+        return self.data
+
+class ImageHTTPError(ValueError):
+    """Non-200 response; 5xx and 429 count against the host, other codes only against the URL"""
+    def __init__(self, status: int):
+        super().__init__(f"HTTP {status} error fetching image")
+        self.status = status
+
+    @property
+    def host_failure(self) -> bool:
+        return self.status >= 500 or self.status == 429
+
+def check_response_headers(status: int, headers, max_bytes: int) -> Optional[int]:
+    """Reject a response from its headers alone; returns the announced size, if any"""
+    if status != 200:
+        raise ImageHTTPError(status)
+
+    content_type = headers.get("Content-Type", "").split(";")[0].strip().lower()
+    if not content_type.startswith("image/") and content_type not in GENERIC_CONTENT_TYPES:
+        raise ImageRejected(f"URL does not point to an image ({content_type})")
+
+    content_length = headers.get("Content-Length")
+    if content_length is None or not content_length.isdigit():
+        return None
+    content_length = int(content_length)
+    if content_length > max_bytes:
+        raise ImageRejected(f"Image is larger than {max_bytes // 1024} KB")
+    return content_length
+
+class FailedUrlCache:
+    """Recently failed URLs and their error, so retries and edits fail at once instead of re-downloading"""
+    def __init__(self, ttl_seconds=60, max_size=1000):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self.entries = OrderedDict()  # url -> (error message, expires_at), oldest first
+        self.hits = 0
+
+    def get(self, url: str) -> Optional[str]:
+        entry = self.entries.get(url)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del self.entries[url]
+            return None
+        self.hits += 1
+        return entry[0]
+
+    def add(self, url: str, message: str):
+        if self.ttl_seconds <= 0:
+            return
+        self.entries.pop(url, None)
+        self.entries[url] = (message, time.monotonic() + self.ttl_seconds)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+class HostCircuitBreaker:
+    """
+    Per-host breaker: after `failure_threshold` consecutive timeouts, connection
+    errors or 5xx responses the host is "open" and downloads from it fail immediately
+    for `cooldown` seconds. Then one trial download is let through ("half_open");
+    success closes the breaker, another failure opens it again. Successes reported
+    while open come from downloads started before it opened and are ignored.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, cooldown=30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.hosts: Dict[str, dict] = {}
+        self.fast_failed = 0
+        self.opened = 0
+
+    def _host(self, host: str) -> dict:
+        state = self.hosts.get(host)
+        if state is None:
+            state = self.hosts[host] = {"state": self.CLOSED, "failures": 0, "retry_at": 0.0}
+        return state
+
+    def check(self, host: str):
+        """Raise ValueError if downloads from `host` should not be attempted right now"""
+        state = self.hosts.get(host)
+        if state is None or state["state"] == self.CLOSED:
+            return
+        now = time.monotonic()
+        if now >= state["retry_at"]:
+            # This download is the trial; others keep failing fast until it reports back
+            # (or for another cooldown, in case it never does)
+            state.update(state=self.HALF_OPEN, retry_at=now + self.cooldown)
+            return
+        self.fast_failed += 1
+        raise ValueError(f"{host} is failing, retrying in {max(0.0, state['retry_at'] - now):.0f}s")
+
+    def record_success(self, host: str):
+        state = self.hosts.get(host)
+        if state is not None and state["state"] == self.OPEN:
+            return  # A late answer (e.g. a 404) doesn't show the host has recovered
+        self.hosts.pop(host, None)  # Only hosts with recent failures are tracked
+
+    def record_failure(self, host: str):
+        state = self._host(host)
+        state["failures"] += 1
+        if state["state"] == self.HALF_OPEN or state["failures"] >= self.failure_threshold:
+            if state["state"] != self.OPEN:
+                self.opened += 1
+                print(f"Image host {host} failing ({state['failures']} errors in a row); "
+                      f"failing fast for {self.cooldown:.0f}s")
+            state.update(state=self.OPEN, retry_at=time.monotonic() + self.cooldown)
+
+    def get_stats(self) -> dict:
+        """Host -> state for every host with recent failures"""
+        return {
+            host: f"{state['state']} ({state['failures']} failures in a row)"
+            for host, state in self.hosts.items()
+        }
+
+class ImageFetcher:
+    """
+    Streaming image downloader with a hard size cap.
+    Bodies are read chunk by chunk and abandoned as soon as they cross `max_bytes` or
+    the first chunk isn't an image, and at most `max_concurrent` downloads run at once,
+    so memory stays bounded by roughly max_concurrent * max_bytes.
+    Failed URLs are remembered for `failed_url_ttl` seconds and hosts that keep timing
+    out or erroring are skipped for a while, so dead links don't tie up download slots.
+    """
+    def __init__(self, max_bytes: int, chunk_size=64 * 1024, max_concurrent=8, timeout=5.0,
+                 failed_url_ttl=60, host_failure_threshold=5, host_cooldown=30.0):
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=2)
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.failed_urls = FailedUrlCache(failed_url_ttl)
+        self.breaker = HostCircuitBreaker(host_failure_threshold, host_cooldown)
+
+        self.downloads = 0
+        self.bytes_downloaded = 0
+        self.rejected = 0
+
+    def _before_fetch(self, url: str) -> str:
+        """Fail fast on a recently failed URL or a failing host; returns the host"""
+        message = self.failed_urls.get(url)
+        if message is not None:
+            raise ValueError(message)
+        host = urlsplit(url).hostname or ""
+        try:
+            self.breaker.check(host)
+        except ValueError as e:
+            raise ValueError(f"Failed to load image from URL: {e}")
+        return host
+
+    def _fetch_failed(self, url: str, host: str, error: Exception) -> ValueError:
+        """Record a failed download and build the error to raise"""
+        if isinstance(error, ImageRejected):
+            # Leaving the block early closes the connection instead of draining the body
+            self.rejected += 1
+        host_failure = not isinstance(error, ValueError) or getattr(error, "host_failure", False)
+        if host_failure:
+            self.breaker.record_failure(host)
+        else:
+            self.breaker.record_success(host)  # The host answered; only this URL is bad
+        message = f"Failed to load image from URL: {str(error) or type(error).__name__}"
+        self.failed_urls.add(url, message)
+        return ValueError(message)
+
+    async def fetch(self, url: str, session: aiohttp.ClientSession) -> bytearray:
+        host = self._before_fetch(url)
+        try:
+            async with self._semaphore:
+                async with session.get(url, timeout=self.timeout) as response:
+                    expected_size = check_response_headers(response.status, response.headers, self.max_bytes)
+                    buffer = ImageBuffer(self.max_bytes, expected_size)
+                    async for chunk in response.content.iter_chunked(self.chunk_size):
+                        buffer.append(chunk)
+                    image_data = buffer.getvalue()
+        except Exception as e:
+            raise self._fetch_failed(url, host, e)
+
+        self.breaker.record_success(host)
+        self.downloads += 1
+        self.bytes_downloaded += len(image_data)
+        return image_data
+
+    def fetch_sync(self, url: str, session=None) -> bytearray:
+        """Blocking version of fetch() using requests (pass a requests.Session to reuse connections)"""
+        import requests
+
+        host = self._before_fetch(url)
+        try:
+            with (session or requests).get(url, timeout=self.timeout.total, stream=True) as response:
+                expected_size = check_response_headers(response.status_code, response.headers, self.max_bytes)
+                buffer = ImageBuffer(self.max_bytes, expected_size)
+                for chunk in response.iter_content(self.chunk_size):
+                    buffer.append(chunk)
+                image_data = buffer.getvalue()
+        except Exception as e:
+            raise self._fetch_failed(url, host, e)
+
+        self.breaker.record_success(host)
+        self.downloads += 1
+        self.bytes_downloaded += len(image_data)
+        return image_data
+
+    def get_stats(self) -> dict:
+        return {
+            "downloads": self.downloads,
+            "kb_downloaded": self.bytes_downloaded // 1024,
+            "rejected": self.rejected,
+            "failed_urls_cached": len(self.failed_urls.entries),
+            "failed_url_hits": self.failed_urls.hits,
+            "host_fast_failures": self.breaker.fast_failed,
+            "host_breakers_opened": self.breaker.opened,
+        }
@@ -0,0 +1,370 @@
+"""
+Standalone inference service: one process owns the ONNX session(s) and batches requests
+from any number of bot processes, so a host keeps a single copy of the model in memory.
+
+    python inference_server.py --listen unix:/tmp/pokemon-inference.sock
+    python inference_server.py --listen 127.0.0.1:8790
+    python inference_server.py --listen 0.0.0.0:8790     # needs PREDICT_INFERENCE_TOKEN
+    python inference_server.py --stats unix:/tmp/pokemon-inference.sock
+
+Bots use it by setting PREDICT_INFERENCE_SERVER to the same address; Prediction then
+keeps downloading, caching and preprocessing locally and sends only the preprocessed
+tensor. Frames are two big-endian uint32 lengths, a JSON header, then a raw payload;
+with PREDICT_INFERENCE_TOKEN set, every request header carries it.
+"""
+import os
+import json
+import time
+import socket
+import hmac
+import struct
+import asyncio
+import argparse
+import ipaddress
+import numpy as np
+from typing import Dict, Optional, Tuple
+from config import PREDICT_INFERENCE_MAX_IN_FLIGHT, PREDICT_INFERENCE_TOKEN
+
+FRAME_PREFIX = struct.Struct("!II")
+MAX_HEADER_BYTES = 64 * 1024
+MAX_PAYLOAD_BYTES = 64 * 1024 * 1024
+
+def parse_address(address: str) -> Tuple[str, object]:
+    """("unix", path) for "unix:/path", else ("tcp", (host, port)) for "host:port" """
+    if address.startswith("unix:"):
+        return "unix", address[len("unix:"):]
+    host, _, port = address.rpartition(":")
+    if not host or not port.isdigit():
+        raise ValueError(f"Invalid inference server address: {address}")
+    return "tcp", (host, int(port))
+
+def is_loopback(host: str) -> bool:
+    """Whether a TCP listen host only accepts connections from this machine"""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host.strip("[]")).is_loopback
+    except ValueError:
+        return False  # Another hostname: assume it is reachable from outside
+
+def check_listen_address(address: str, token: Optional[str]):
+    """Refuse a TCP address other machines can reach unless requests need a token"""
+    kind, target = parse_address(address)
+    if kind == "tcp" and not is_loopback(target[0]) and not token:
+        # Anyone who can reach the port could run the model (and read its stats)
+        raise ValueError(f"Refusing to listen on {address} without PREDICT_INFERENCE_TOKEN; "
+                         "use a unix socket or a loopback address")
+
+def encode_frame_prefix(header: dict, payload_size: int) -> bytes:
+    header_bytes = json.dumps(header).encode()
+    return FRAME_PREFIX.pack(len(header_bytes), payload_size) + header_bytes
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[dict, bytes]:
+    header_size, payload_size = FRAME_PREFIX.unpack(await reader.readexactly(FRAME_PREFIX.size))
+    if header_size > MAX_HEADER_BYTES or payload_size > MAX_PAYLOAD_BYTES:
+        raise ConnectionError("Frame too large")
+    header = json.loads(await reader.readexactly(header_size))
+    payload = await reader.readexactly(payload_size) if payload_size else b""
+    return header, payload
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+    chunks = bytearray()
+    while len(chunks) < size:
+        chunk = sock.recv(size - len(chunks))
+        if not chunk:
+            raise ConnectionError("Inference server closed the connection")
+        chunks += chunk
+    return bytes(chunks)
+
+def _tensor_payload(image: np.ndarray) -> memoryview:
+    return memoryview(np.ascontiguousarray(image, dtype=np.float32)).cast("B")
+
+class RemoteInferenceClient:
+    """
+    Multiplexed connection to an inference server. Concurrent requests share one
+    connection and are matched to responses by id; a dropped connection fails the
+    requests in flight and is re-opened on the next request.
+    """
+    def __init__(self, address: str, timeout=10.0, token: Optional[str] = None):
+        self.address = address
+        self.kind, self.target = parse_address(address)
+        self.timeout = timeout
+        self.token = token
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task = None
+        self._connect_lock: Optional[asyncio.Lock] = None
+        self._write_lock: Optional[asyncio.Lock] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._next_id = 0
+
+        self.requests = 0
+        self.errors = 0
+        self.connections = 0
+        self.total_ms = 0.0
+
+    async def _ensure_connected(self):
+        if self._writer is not None and not self._writer.is_closing():
+            return
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+            self._write_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self._writer is not None and not self._writer.is_closing():
+                return
+            if self.kind == "unix":
+                reader, writer = await asyncio.open_unix_connection(self.target)
+            else:
+                reader, writer = await asyncio.open_connection(*self.target)
+            self._reader, self._writer = reader, writer
+            self._reader_task = asyncio.get_running_loop().create_task(self._read_responses(reader, writer))
+            self.connections += 1
+
+    async def _read_responses(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                header, payload = await read_frame(reader)
+                future = self._pending.pop(header.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result((header, payload))
+        except Exception as e:
+            error = ConnectionError(f"Inference server connection lost: {e}")
+        writer.close()
+        if self._writer is writer:
+            self._reader = self._writer = None
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+    def _header(self, header: dict, request_id: int) -> dict:
+        header = dict(header, id=request_id)
+        if self.token is not None:
+            header["token"] = self.token
+        return header
+
+    async def request(self, header: dict, payload=b"") -> Tuple[dict, bytes]:
+        started = time.perf_counter()
+        self.requests += 1
+        try:
+            try:
+                await self._ensure_connected()
+            except OSError as e:
+                raise ConnectionError(f"Inference server {self.address} unavailable: {e}")
+            request_id = self._next_id
+            self._next_id += 1
+            future = asyncio.get_running_loop().create_future()
+            self._pending[request_id] = future
+
+            try:
+                async with self._write_lock:
+                    self._writer.write(encode_frame_prefix(self._header(header, request_id), len(payload)))
+                    if payload:
+                        self._writer.write(payload)
+                    await self._writer.drain()
+                response, body = await asyncio.wait_for(future, self.timeout)
+            finally:
+                self._pending.pop(request_id, None)
+        except Exception:
+            self.errors += 1
+            raise
+
+        if not response.get("ok"):
+            self.errors += 1
+            raise RuntimeError(f"Inference server error: {response.get('error')}")
+        self.total_ms += (time.perf_counter() - started) * 1000
+        return response, body
+
+    async def infer(self, image: np.ndarray) -> Tuple[np.ndarray, str]:
+        """Logits for one preprocessed 1xCxHxW image and the stage that produced them"""
+        payload = _tensor_payload(image)
+        response, body = await self.request({"op": "infer", "shape": list(image.shape)}, payload)
+        return np.frombuffer(body, dtype=np.float32).reshape(response["shape"]), response.get("source", "cnn")
+
+    def request_sync(self, header: dict, payload=b"") -> Tuple[dict, bytes]:
+        """One request over a short-lived blocking socket (for predict_sync and tools)"""
+        family = socket.AF_UNIX if self.kind == "unix" else socket.AF_INET
+        with socket.socket(family, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.target)
+            sock.sendall(encode_frame_prefix(self._header(header, 0), len(payload)))
+            if payload:
+                sock.sendall(payload)
+            header_size, payload_size = FRAME_PREFIX.unpack(_recv_exactly(sock, FRAME_PREFIX.size))
+            response = json.loads(_recv_exactly(sock, header_size))
+            body = _recv_exactly(sock, payload_size) if payload_size else b""
+
+        if not response.get("ok"):
+            raise RuntimeError(f"Inference server error: {response.get('error')}")
+        return response, body
+
+    def infer_sync(self, image: np.ndarray) -> Tuple[np.ndarray, str]:
+        response, body = self.request_sync({"op": "infer", "shape": list(image.shape)}, _tensor_payload(image))
+        return np.frombuffer(body, dtype=np.float32).reshape(response["shape"]), response.get("source", "cnn")
+
+    def info_sync(self) -> dict:
+        return self.request_sync({"op": "info"})[0]
+
+    def get_stats(self) -> dict:
+        completed = self.requests - self.errors
+        return {
+            "address": self.address,
+            "connected": self._writer is not None and not self._writer.is_closing(),
+            "requests": self.requests,
+            "errors": self.errors,
+            "connections": self.connections,
+            "avg_ms": round(self.total_ms / completed, 2) if completed > 0 else 0.0,
+        }
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._reader = self._writer = None
+
+class InferenceServer:
+    """
+    Serves a local Prediction's batched inference to clients over a socket.
+    With a `token`, requests must carry it; a connection that sends a wrong one is closed.
+    """
+    def __init__(self, predictor, address: str, token: Optional[str] = None,
+                 max_in_flight=PREDICT_INFERENCE_MAX_IN_FLIGHT):
+        self.predictor = predictor
+        self.address = address
+        self.kind, self.target = parse_address(address)
+        self.token = token
+        self.max_in_flight = max(1, max_in_flight)
+        self._server = None
+        self.clients = 0
+        self.requests = 0
+        self.refused = 0
+
+    async def start(self):
+        check_listen_address(self.address, self.token)
+        if self.kind == "unix":
+            if os.path.exists(self.target):
+                os.unlink(self.target)  # Stale socket from a previous run
+            self._server = await asyncio.start_unix_server(self._handle_client, self.target)
+        else:
+            self._server = await asyncio.start_server(self._handle_client, *self.target)
+        print(f"Inference server listening on {self.address}")
+
+    async def serve_forever(self):
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.clients += 1
+        write_lock = asyncio.Lock()
+        in_flight = asyncio.Semaphore(self.max_in_flight)
+        tasks = set()
+        try:
+            while True:
+                # Past max_in_flight, stop reading so the client's writes back up instead
+                await in_flight.acquire()
+                header, payload = await read_frame(reader)
+                if not self._authorized(header):
+                    self.refused += 1
+                    await self._respond(writer, write_lock, {"id": header.get("id"), "ok": False,
+                                                             "error": "invalid token"})
+                    break
+                # Each request runs concurrently so they can share batches with other clients'
+                task = asyncio.get_running_loop().create_task(self._handle_request(header, payload, writer, write_lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                task.add_done_callback(lambda _: in_flight.release())
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            print(f"Inference client error: {e}")
+        finally:
+            self.clients -= 1
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    def _authorized(self, header: dict) -> bool:
+        if not self.token:
+            return True
+        token = header.get("token")
+        return isinstance(token, str) and hmac.compare_digest(token.encode(), self.token.encode())
+
+    async def _respond(self, writer: asyncio.StreamWriter, write_lock: asyncio.Lock, response: dict, body=b""):
+        try:
+            async with write_lock:
+                writer.write(encode_frame_prefix(response, len(body)))
+                if body:
+                    writer.write(body)
+                await writer.drain()
+        except ConnectionError:
+            pass
+
+    async def _handle_request(self, header: dict, payload: bytes, writer: asyncio.StreamWriter,
+                              write_lock: asyncio.Lock):
+        self.requests += 1
+        response = {"id": header.get("id"), "ok": True}
+        body = b""
+        try:
+            op = header.get("op")
+            if op == "infer":
+                image = np.frombuffer(payload, dtype=np.float32).reshape(header["shape"])
+                logits, source = await self.predictor.infer(image)
+                logits = np.ascontiguousarray(logits, dtype=np.float32)
+                response.update(shape=list(logits.shape), source=source)
+                body = memoryview(logits).cast("B")
+            elif op == "info":
+                response.update(
+                    classes=len(self.predictor.class_names),
+                    model=os.path.basename(self.predictor.onnx_path),
+                    input_size=self.predictor.input_size,
+                    cascade=self.predictor.fast_session is not None,
+                )
+            elif op == "stats":
+                stats = self.predictor.get_stats()
+                response["stats"] = {
+                    section: stats[section] for section in ("batching", "cascade") if section in stats
+                }
+                response["stats"]["server"] = {"clients": self.clients, "requests": self.requests,
+                                               "refused": self.refused}
+            else:
+                raise ValueError(f"Unknown op {op!r}")
+        except Exception as e:
+            response = {"id": header.get("id"), "ok": False, "error": str(e)}
+            body = b""
+
+        await self._respond(writer, write_lock, response, body)
+
+def main():
+    from predict import Prediction
+
+    parser = argparse.ArgumentParser(description="Run the shared Pokemon inference server")
+    parser.add_argument("--listen", default="unix:/tmp/pokemon-inference.sock",
+                        help='"unix:/path/to.sock" or "host:port" (other hosts than localhost need PREDICT_INFERENCE_TOKEN)')
+    parser.add_argument("--model", help="ONNX model (default: the one Prediction would load)")
+    parser.add_argument("--stats", metavar="ADDRESS", help="print a running server's stats and exit")
+    args = parser.parse_args()
+
+    if args.stats:
+        response, _ = RemoteInferenceClient(args.stats, token=PREDICT_INFERENCE_TOKEN).request_sync({"op": "stats"})
+        print(json.dumps(response["stats"], indent=2))
+        return
+    try:
+        check_listen_address(args.listen, PREDICT_INFERENCE_TOKEN)
+    except ValueError as e:
+        parser.error(str(e))
+
+    # The server always runs the model itself, whatever PREDICT_INFERENCE_SERVER says, and
+    # always the CNN: clients turn embedding mode off and read its outputs as class logits
+    predictor = Prediction(onnx_path=args.model, inference_server=None, classifier="cnn",
+                           phash_index_path=None, persistent_cache_path=None)
+    print(f"Model warmed up in {predictor.warm_up():.0f} ms")
+    server = InferenceServer(predictor, args.listen, token=PREDICT_INFERENCE_TOKEN)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        predictor.close()
+
+if __name__ == "__main__":
+    main()
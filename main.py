@@ -4,7 +4,9 @@ import asyncio
 import aiohttp
 from discord.ext import commands
 from motor.motor_asyncio import AsyncIOMotorClient
-from predict import Prediction
+from predict import PredictorLoader
+from utils import EventLoopLagMonitor
+from config import LOOP_LAG_CHECK_INTERVAL
 
 TOKEN = os.getenv("DISCORD_TOKEN")
 MONGODB_URI = os.getenv("MONGODB_URI")
@@ -38,13 +40,16 @@ db_client = None
 db = None
 predictor = None
 http_session = None
+loop_monitor = EventLoopLagMonitor(LOOP_LAG_CHECK_INTERVAL)
 
 async def initialize_predictor():
-    """Initialize the predictor asynchronously"""
+    """Start loading and warming up the predictor on a worker thread"""
     global predictor
     try:
-        predictor = Prediction()
-        print("Predictor initialized successfully")
+        # Returns immediately; spawns seen before the model is warm wait for it
+        predictor = PredictorLoader()
+        predictor.start()
+        print("Predictor loading in the background")
     except Exception as e:
         print(f"Failed to initialize predictor: {e}")
 
@@ -156,6 +161,9 @@ async def keep_alive():
 async def on_ready():
     print(f"Logged in as {bot.user}")
 
+    # Track how long the event loop gets blocked (shown by m!predictstats)
+    loop_monitor.start()
+
     # Initialize components in parallel where possible
     await initialize_http_session()
 
@@ -169,6 +177,7 @@ async def on_ready():
     # CRITICAL: Make predictor and http_session accessible to cogs
     bot.predictor = predictor
     bot.http_session = http_session
+    bot.loop_monitor = loop_monitor
 
     # Load cogs
     try:
@@ -209,9 +218,14 @@ async def cleanup():
     """Clean up resources on shutdown"""
     global http_session, db_client
 
+    loop_monitor.stop()
+
     if http_session:
         await http_session.close()
 
+    if predictor:
+        predictor.close()
+
     if db_client:
         db_client.close()
 
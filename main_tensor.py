@@ -1,26 +1,28 @@
 import os
 import cv2
+import argparse
 import torch
-import numpy as np
 import torch.nn as nn
 import torchvision.transforms as T
 import torchvision.models as models
 from torchvision.datasets import ImageFolder
 from torch.utils.data import DataLoader
-from PIL import Image
 import requests
 from tqdm import tqdm
+from preprocessing import DEFAULT_INPUT_SIZE, ImagePreprocessor
 
 SOURCE_IMAGE_PATH = "data/commands/pokemon/pokemon_images"
 SAVE_PATH = "data/commands/pokemon/images"
 MODEL_PATH = "model/pokemon_cnn.pt"
+GENERATED_SIZE = 128  # generate_images() output, so --input-size 128 trains without resampling
 
 os.makedirs(SAVE_PATH, exist_ok=True)
 
 # Define the CNN class that matches the original model structure
 class CNN(nn.Module):
-    def __init__(self, num_classes):
+    def __init__(self, num_classes, input_size=DEFAULT_INPUT_SIZE):
         super(CNN, self).__init__()
+        self.input_size = input_size
         # Feature extraction layers
         self.features = nn.Sequential(
             nn.Conv2d(3, 32, kernel_size=3, padding=1),
@@ -43,7 +45,7 @@ class CNN(nn.Module):
         # Classification layers
         self.classifier = nn.Sequential(
             nn.Dropout(0.5),
-            nn.Linear(256 * 14 * 14, 512),
+            nn.Linear(256 * (input_size // 16) ** 2, 512),  # Four 2x poolings
             nn.ReLU(inplace=True),
             nn.Dropout(0.5),
             nn.Linear(512, num_classes)
@@ -68,7 +70,7 @@ def generate_images():
             img_path = os.path.join(label_path, img_file)
             img = cv2.imread(img_path)
             if img is None: continue
-            img = cv2.resize(img, (128, 128))
+            img = cv2.resize(img, (GENERATED_SIZE, GENERATED_SIZE))
             base = os.path.splitext(img_file)[0]
             cv2.imwrite(os.path.join(output_dir, f"{base}_0.png"), img)
             cv2.imwrite(os.path.join(output_dir, f"{base}_1.png"), cv2.flip(img, 1))
@@ -76,15 +78,18 @@ def generate_images():
     print(f"Generated {count} augmented images")
 
 class PokeNet:
-    def __init__(self, folder=SAVE_PATH, model_path=MODEL_PATH):
+    def __init__(self, folder=SAVE_PATH, model_path=MODEL_PATH, input_size=DEFAULT_INPUT_SIZE):
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         print(f"Using device: {self.device}")
         self.model_path = model_path
+        self.input_size = input_size
         self.transform = T.Compose([
-            T.Resize((224, 224)), 
+            T.Resize((input_size, input_size)), 
             T.ToTensor(), 
             T.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
         ])
+        # Inference uses the same preprocessing as the bot's ONNX/TorchScript backends
+        self.preprocessor = ImagePreprocessor(size=input_size)
         
         # First, get the label map from the dataset
         try:
@@ -119,6 +124,11 @@ class PokeNet:
 
         # Make sure model is in eval mode for inference
         self.model.eval()
+        trained_size = getattr(self.model, "input_size", DEFAULT_INPUT_SIZE)
+        if trained_size != self.input_size:
+            print(f"Model was trained at {trained_size}px; using that instead of {self.input_size}px")
+            self.input_size = trained_size
+            self.preprocessor = ImagePreprocessor(size=trained_size)
 
     def _train(self, folder):
         """Train a new model on the dataset"""
@@ -189,7 +199,8 @@ class PokeNet:
             accuracy = 100 * correct / total if total > 0 else 0
             print(f"Epoch {epoch+1}/{total_epochs} - Loss: {total_loss/len(loader):.4f} - Accuracy: {accuracy:.2f}%")
 
-        # Save the model
+        # Save the model; convert.py exports at the size recorded here
+        model.input_size = self.input_size
         print(f"Training complete. Saving model to {self.model_path}")
         torch.save(model, self.model_path)
             
@@ -200,19 +211,13 @@ class PokeNet:
         try:
             print(f"Fetching image from URL...")
             r = requests.get(url, timeout=10)
-            img_arr = np.frombuffer(r.content, np.uint8)
-            img = cv2.imdecode(img_arr, cv2.IMREAD_COLOR)
-            
-            if img is None:
-                print("Failed to decode image")
+            try:
+                batch = self.preprocessor.preprocess_bytes(r.content)
+            except ValueError as e:
+                print(f"Failed to decode image: {e}")
                 return None, 0.0
-                
-            print(f"Image loaded: {img.shape}")
-            
-            # Convert BGR to RGB and process image
-            img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            pil_img = Image.fromarray(img_rgb)
-            inputs = self.transform(pil_img).unsqueeze(0).to(self.device)
+
+            inputs = torch.from_numpy(batch).to(self.device)
 
             # Get prediction
             with torch.no_grad():
@@ -243,6 +248,15 @@ class PokeNet:
             return None, 0.0
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train or load the classifier and label image URLs")
+    parser.add_argument("--input-size", type=int, default=DEFAULT_INPUT_SIZE,
+                        help=f"training/inference resolution, e.g. 112 or {GENERATED_SIZE} for a faster CPU model")
+    parser.add_argument("--model", help="model file (default: model/pokemon_cnn.pt, or "
+                        "model/pokemon_cnn_<size>.pt for other sizes)")
+    args = parser.parse_args()
+    model_path = args.model or (MODEL_PATH if args.input_size == DEFAULT_INPUT_SIZE
+                                else f"model/pokemon_cnn_{args.input_size}.pt")
+
     print("Pokemon CNN Classifier")
     print("=" * 40)
     
@@ -261,7 +275,7 @@ if __name__ == "__main__":
     
     print("\nInitializing model...")
     try:
-        net = PokeNet()
+        net = PokeNet(model_path=model_path, input_size=args.input_size)
         print("\nModel ready! Enter image URLs to classify Pokemon.")
         
         while True:
@@ -0,0 +1,91 @@
+"""
+Measure predictor memory per process and for several processes on one host (Linux).
+
+    python memory_bench.py                       # 1 and 4 processes, normal vs low-memory mode
+    python memory_bench.py --processes 8 --modes low_memory
+
+Each process loads its own Prediction and runs a few warm-up batches, then the parent
+reads /proc/<pid>/smaps_rollup. RSS counts shared pages in every process; PSS splits
+them between the processes sharing them, so the PSS total is what the host pays.
+"anon" is memory only that process can use (heap, and any private copy of the weights).
+Low-memory mode needs the external-data model (python convert.py --external-data).
+"""
+import os
+import sys
+import argparse
+import multiprocessing
+from typing import Dict, List
+
+def read_memory(pid: int) -> Dict[str, float]:
+    """Rss, Pss and Anonymous of a process in MB"""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+        for line in f:
+            parts = line.split()
+            key = parts[0].rstrip(":")
+            if key in ("Rss", "Pss", "Anonymous"):
+                values[key] = int(parts[1]) / 1024
+    return values
+
+def _worker(model_path: str, low_memory: bool, ready, done):
+    from predict import Prediction
+
+    predictor = Prediction(
+        onnx_path=model_path, low_memory=low_memory, thread_pool_size=0, inference_server=None,
+        phash_index_path=None, persistent_cache_path=None, ort_profile_path=None
+    )
+    predictor.warm_up([1, 4], runs=2)
+    ready.set()
+    done.wait()
+    predictor.close()
+
+def measure(model_path: str, low_memory: bool, processes: int) -> List[Dict[str, float]]:
+    # Spawned, not forked, so nothing is shared with this process by accident
+    context = multiprocessing.get_context("spawn")
+    done = context.Event()
+    workers = []
+    for _ in range(processes):
+        ready = context.Event()
+        process = context.Process(target=_worker, args=(model_path, low_memory, ready, done))
+        process.start()
+        workers.append((process, ready))
+    try:
+        for process, ready in workers:
+            while not ready.wait(1):
+                if not process.is_alive():
+                    raise RuntimeError(f"Worker exited with code {process.exitcode}")
+        return [read_memory(process.pid) for process, _ in workers]
+    finally:
+        done.set()
+        for process, _ in workers:
+            process.join(30)
+
+def main():
+    from predict import ONNX_PATH, ONNX_EXTERNAL_PATH
+
+    parser = argparse.ArgumentParser(description="Predictor memory per process and per host")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--modes", nargs="+", choices=["normal", "low_memory"], default=["normal", "low_memory"])
+    parser.add_argument("--model", default=ONNX_PATH, help="model for normal mode")
+    parser.add_argument("--external-model", default=ONNX_EXTERNAL_PATH, help="external-data model for low-memory mode")
+    args = parser.parse_args()
+
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        sys.exit("Needs Linux /proc/<pid>/smaps_rollup")
+
+    print(f"{'mode':>10} | {'procs':>5} | {'RSS/proc':>8} | {'PSS/proc':>8} | {'anon/proc':>9} | "
+          f"{'PSS total':>9}  (MB)")
+    for mode in args.modes:
+        low_memory = mode == "low_memory"
+        model_path = args.external_model if low_memory else args.model
+        if not os.path.exists(model_path):
+            print(f"{model_path} not found; skipping {mode}")
+            continue
+        for processes in sorted({1, args.processes}):
+            samples = measure(model_path, low_memory, processes)
+            average = {key: sum(s[key] for s in samples) / len(samples) for key in samples[0]}
+            print(f"{mode:>10} | {processes:>5} | {average['Rss']:>8.1f} | {average['Pss']:>8.1f} | "
+                  f"{average['Anonymous']:>9.1f} | {sum(s['Pss'] for s in samples):>9.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Versioned model/label pairs with checksums, so a retrained model can be swapped in
+without a restart (m!model load <version>, bot owner only).
+
+    python model_registry.py add v3 --model model/pokemon_cnn_v3.onnx --labels model/labels_v3.json
+    python model_registry.py add v3 ... --cascade-model model/pokemon_cnn_fast_v3.onnx
+    python model_registry.py list
+    python model_registry.py verify v3
+    python model_registry.py activate v3          # loaded on the next start
+
+Layout: <registry>/<version>/ holds the model (plus its external-data file, if any),
+the labels, optionally a cascade first-stage model trained on those labels, and
+manifest.json with a SHA-256 per file; registry.json names the active version. A version
+without its own cascade model runs without a cascade. "bundled" is
+model/pokemon_cnn_v2.onnx with model/labels_v2.json (and the bundled cascade model).
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import argparse
+from typing import Dict, List, Optional
+
+BUNDLED_VERSION = "bundled"
+MANIFEST_NAME = "manifest.json"
+STATE_NAME = "registry.json"
+
+class RegistryError(Exception):
+    """Unknown version, missing file or checksum mismatch"""
+
+def file_sha256(path: str, chunk_size=1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ModelVersion:
+    """One registry entry; the paths are None for the bundled model"""
+    def __init__(self, name: str, directory: Optional[str] = None, manifest: Optional[dict] = None):
+        manifest = manifest or {}
+        self.name = name
+        self.directory = directory
+        self.files: Dict[str, str] = manifest.get("files", {})  # file name -> sha256
+        self.model_path = os.path.join(directory, manifest["model"]) if directory else None
+        self.labels_path = os.path.join(directory, manifest["labels"]) if directory else None
+        cascade_model = manifest.get("cascade_model")
+        self.cascade_model_path = os.path.join(directory, cascade_model) if directory and cascade_model else None
+        self.created_at = manifest.get("created_at")
+        self.notes = manifest.get("notes", "")
+
+    @property
+    def is_bundled(self) -> bool:
+        return self.directory is None
+
+    def describe(self) -> str:
+        if self.is_bundled:
+            return f"{self.name} (model/ directory)"
+        created = time.strftime("%Y-%m-%d %H:%M", time.gmtime(self.created_at)) if self.created_at else "?"
+        return f"{self.name} ({os.path.basename(self.model_path)}, added {created}){' - ' + self.notes if self.notes else ''}"
+
+    def __repr__(self):
+        return f"ModelVersion({self.name!r})"
+
+class ModelRegistry:
+    def __init__(self, path: str):
+        self.path = path
+
+    def _version_dir(self, name: str) -> str:
+        if not name or os.sep in name or name.startswith(".") or name == BUNDLED_VERSION:
+            raise RegistryError(f"Invalid version name {name!r}")
+        return os.path.join(self.path, name)
+
+    def versions(self) -> List[ModelVersion]:
+        """Bundled first, then registered versions oldest first"""
+        found = []
+        if os.path.isdir(self.path):
+            for name in os.listdir(self.path):
+                if os.path.exists(os.path.join(self.path, name, MANIFEST_NAME)):
+                    found.append(self.get(name))
+        found.sort(key=lambda version: version.created_at or 0)
+        return [ModelVersion(BUNDLED_VERSION)] + found
+
+    def get(self, name: str) -> ModelVersion:
+        if name == BUNDLED_VERSION:
+            return ModelVersion(BUNDLED_VERSION)
+        manifest_path = os.path.join(self._version_dir(name), MANIFEST_NAME)
+        if not os.path.exists(manifest_path):
+            raise RegistryError(f"Unknown model version {name!r} (see 'python model_registry.py list')")
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return ModelVersion(name, os.path.dirname(manifest_path), json.load(f))
+
+    def verify(self, version: ModelVersion):
+        """Re-hash every file of a version against its manifest"""
+        for file_name, expected in version.files.items():
+            path = os.path.join(version.directory, file_name)
+            if not os.path.exists(path):
+                raise RegistryError(f"{version.name}: {file_name} is missing")
+            if file_sha256(path) != expected:
+                raise RegistryError(f"{version.name}: {file_name} does not match its checksum")
+
+    def add(self, name: str, model_path: str, labels_path: str, notes="",
+            cascade_model_path: Optional[str] = None) -> ModelVersion:
+        """Copy a model (and its external-data file), labels and optional cascade model into a new version"""
+        directory = self._version_dir(name)
+        if os.path.exists(directory):
+            raise RegistryError(f"Version {name!r} already exists")
+        sources = [model_path, labels_path]
+        if os.path.exists(model_path + ".data"):
+            sources.append(model_path + ".data")  # External-data weights keep their relative name
+        if cascade_model_path:
+            sources.append(cascade_model_path)
+        names = [os.path.basename(source) for source in sources]
+        if len(set(names)) != len(names):
+            raise RegistryError("The model, labels and cascade model need different file names")
+
+        os.makedirs(directory)
+        files = {}
+        for source in sources:
+            file_name = os.path.basename(source)
+            shutil.copyfile(source, os.path.join(directory, file_name))
+            files[file_name] = file_sha256(os.path.join(directory, file_name))
+        manifest = {
+            "model": os.path.basename(model_path),
+            "labels": os.path.basename(labels_path),
+            "cascade_model": os.path.basename(cascade_model_path) if cascade_model_path else None,
+            "files": files,
+            "created_at": time.time(),
+            "notes": notes,
+        }
+        with open(os.path.join(directory, MANIFEST_NAME), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        return ModelVersion(name, directory, manifest)
+
+    def active(self) -> str:
+        """Version to load at startup"""
+        try:
+            with open(os.path.join(self.path, STATE_NAME), "r", encoding="utf-8") as f:
+                return json.load(f).get("active") or BUNDLED_VERSION
+        except FileNotFoundError:
+            return BUNDLED_VERSION
+
+    def set_active(self, name: str):
+        os.makedirs(self.path, exist_ok=True)
+        state_path = os.path.join(self.path, STATE_NAME)
+        # Write-then-rename so a crash never leaves a half-written state file
+        with open(state_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"active": name, "updated_at": time.time()}, f)
+        os.replace(state_path + ".tmp", state_path)
+
+def main():
+    from config import PREDICT_MODEL_REGISTRY_PATH
+
+    parser = argparse.ArgumentParser(description="Manage versioned models for hot swapping")
+    parser.add_argument("--registry", default=PREDICT_MODEL_REGISTRY_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="register a model/labels pair as a new version")
+    add.add_argument("version")
+    add.add_argument("--model", required=True)
+    add.add_argument("--labels", required=True)
+    add.add_argument("--cascade-model", help="first-stage model trained on these labels (train_fast_model.py)")
+    add.add_argument("--notes", default="")
+    commands.add_parser("list", help="show registered versions")
+    verify = commands.add_parser("verify", help="check a version's files against their checksums")
+    verify.add_argument("version")
+    activate = commands.add_parser("activate", help="load this version on the next start")
+    activate.add_argument("version")
+    args = parser.parse_args()
+
+    try:
+        run_command(ModelRegistry(args.registry), args)
+    except RegistryError as e:
+        raise SystemExit(f"Error: {e}")
+
+def run_command(registry: ModelRegistry, args):
+    if args.command == "add":
+        version = registry.add(args.version, args.model, args.labels, args.notes, args.cascade_model)
+        print(f"Added {version.describe()}")
+    elif args.command == "list":
+        active = registry.active()
+        for version in registry.versions():
+            print(f"{'*' if version.name == active else ' '} {version.describe()}")
+    elif args.command == "verify":
+        registry.verify(registry.get(args.version))
+        print(f"{args.version}: all files match")
+    elif args.command == "activate":
+        registry.get(args.version)
+        registry.set_active(args.version)
+        print(f"{args.version} will be loaded on the next start")
+
+if __name__ == "__main__":
+    main()
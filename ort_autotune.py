@@ -0,0 +1,230 @@
+"""
+Tune ONNX Runtime session settings for this host and save a pre-optimized model.
+
+    python ort_autotune.py                     # tune model/pokemon_cnn_v2.onnx
+    python ort_autotune.py --model model/pokemon_cnn_v2.int8.onnx --batch-sizes 1 4 8 16 32
+
+Searches in stages (thread count and execution mode, then memory arena and memory
+pattern, then batch size), keeping the best single-image p50 at each stage. The
+winning settings go to model/ort_profile.json together with the graph already
+optimized by ORT (<model>.optimized.ort), which Prediction then loads directly
+instead of re-optimizing on every start. The profile is ignored if the model file,
+ORT version or CPU differ from when it was made; re-run this after deploying to a
+new machine size.
+"""
+import os
+import json
+import time
+import platform
+import argparse
+import numpy as np
+import onnxruntime as ort
+from typing import List, Optional
+
+EXECUTION_MODES = {
+    "sequential": ort.ExecutionMode.ORT_SEQUENTIAL,
+    "parallel": ort.ExecutionMode.ORT_PARALLEL,
+}
+
+def cpu_name() -> str:
+    try:
+        with open("/proc/cpuinfo", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor()
+
+def host_signature() -> dict:
+    """What an optimized graph depends on: layout transforms are specific to CPU and ORT build"""
+    return {
+        "machine": platform.machine(),
+        "cpu": cpu_name(),
+        "cpu_count": os.cpu_count(),
+        "onnxruntime": ort.__version__,
+    }
+
+def model_signature(model_path: str) -> dict:
+    stat = os.stat(model_path)
+    return {"file": os.path.basename(model_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def session_options(settings: dict, optimized_model_path: Optional[str] = None,
+                    preoptimized=False) -> ort.SessionOptions:
+    """SessionOptions from a profile's "session" settings"""
+    sess_opts = ort.SessionOptions()
+    sess_opts.intra_op_num_threads = settings["intra_op_num_threads"]
+    sess_opts.inter_op_num_threads = settings.get("inter_op_num_threads", 1)
+    sess_opts.execution_mode = EXECUTION_MODES[settings.get("execution_mode", "sequential")]
+    sess_opts.enable_cpu_mem_arena = settings.get("enable_cpu_mem_arena", True)
+    sess_opts.enable_mem_pattern = settings.get("enable_mem_pattern", True)
+    if settings.get("disable_prepacking"):
+        sess_opts.add_session_config_entry("session.disable_prepacking", "1")
+    if preoptimized:
+        # Already optimized when it was saved; skip the work at startup
+        sess_opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+    else:
+        sess_opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if optimized_model_path:
+        sess_opts.optimized_model_filepath = optimized_model_path
+        if optimized_model_path.endswith(".ort"):
+            sess_opts.add_session_config_entry("session.save_model_format", "ORT")
+    return sess_opts
+
+def load_profile(profile_path: str, model_path: str) -> Optional[dict]:
+    """The saved profile for `model_path`, or None if missing or made for another model/host"""
+    if not profile_path or not os.path.exists(profile_path):
+        return None
+    try:
+        with open(profile_path, "r", encoding="utf-8") as f:
+            profile = json.load(f)
+        if profile.get("model") != model_signature(model_path):
+            print(f"ORT profile {profile_path} was made for a different model file; ignoring it")
+            return None
+        if profile.get("host") != host_signature():
+            print(f"ORT profile {profile_path} was made on a different host or ORT version; ignoring it")
+            return None
+    except Exception as e:
+        print(f"Could not read ORT profile {profile_path}: {e}")
+        return None
+
+    optimized = profile.get("optimized_model")
+    if optimized:
+        optimized = os.path.join(os.path.dirname(profile_path), optimized)
+        profile["optimized_model_path"] = optimized if os.path.exists(optimized) else None
+    return profile
+
+# ===== TUNING =====
+def measure(model_path: str, settings: dict, batch_sizes: List[int], runs: int) -> dict:
+    """Session load time, single-image p50/p95, and per-image ms at each batch size"""
+    started = time.perf_counter()
+    session = ort.InferenceSession(model_path, sess_options=session_options(settings),
+                                   providers=["CPUExecutionProvider"])
+    load_ms = (time.perf_counter() - started) * 1000
+    input_meta = session.get_inputs()[0]
+    shape = [dim if isinstance(dim, int) else 1 for dim in input_meta.shape]
+    rng = np.random.default_rng(0)
+
+    per_image_ms = {}
+    single = []
+    for batch_size in batch_sizes:
+        batch = rng.standard_normal([batch_size] + shape[1:]).astype(np.float32)
+        for _ in range(2):  # Warm-up at this shape
+            session.run(None, {input_meta.name: batch})
+        times = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            session.run(None, {input_meta.name: batch})
+            times.append((time.perf_counter() - started) * 1000)
+        if batch_size == 1:
+            single = times
+        per_image_ms[batch_size] = round(float(np.median(times)) / batch_size, 3)
+
+    return {
+        "settings": dict(settings),
+        "load_ms": round(load_ms, 1),
+        "p50_ms": round(float(np.percentile(single, 50)), 3) if single else None,
+        "p95_ms": round(float(np.percentile(single, 95)), 3) if single else None,
+        "per_image_ms": per_image_ms,
+    }
+
+def thread_candidates(cpu_count: int) -> List[int]:
+    return sorted({1, 2, 4, max(1, cpu_count // 2), cpu_count} & set(range(1, cpu_count + 1)))
+
+def autotune(model_path: str, batch_sizes: List[int], runs: int) -> dict:
+    results = []
+
+    def trial(settings: dict) -> dict:
+        result = measure(model_path, settings, [1], runs)
+        results.append(result)
+        print(f"  {settings} -> p50 {result['p50_ms']} ms")
+        return result
+
+    print("Stage 1: threads and execution mode")
+    candidates = []
+    for threads in thread_candidates(os.cpu_count() or 1):
+        candidates.append({"intra_op_num_threads": threads, "inter_op_num_threads": 1,
+                           "execution_mode": "sequential"})
+        if threads > 1:
+            candidates.append({"intra_op_num_threads": threads, "inter_op_num_threads": 2,
+                               "execution_mode": "parallel"})
+    best = min((trial(settings) for settings in candidates), key=lambda r: r["p50_ms"])
+
+    print("Stage 2: memory arena and memory pattern")
+    for arena, pattern in ((True, False), (False, True), (False, False)):
+        settings = dict(best["settings"], enable_cpu_mem_arena=arena, enable_mem_pattern=pattern)
+        result = trial(settings)
+        if result["p50_ms"] < best["p50_ms"] * 0.98:  # Ignore differences within noise
+            best = result
+
+    print("Stage 3: batch sizes")
+    batched = measure(model_path, best["settings"], batch_sizes, runs)
+    for batch_size, ms in batched["per_image_ms"].items():
+        print(f"  batch {batch_size}: {ms} ms/image")
+    # Largest batch still within 5% of the best per-image cost: bigger batches only add wait
+    best_per_image = min(batched["per_image_ms"].values())
+    max_batch_size = max(
+        size for size, ms in batched["per_image_ms"].items() if ms <= best_per_image * 1.05
+    )
+
+    baseline = {"intra_op_num_threads": min(4, os.cpu_count() or 1), "inter_op_num_threads": 1,
+                "execution_mode": "sequential"}
+    return {
+        "session": best["settings"],
+        "max_batch_size": max_batch_size,
+        "best": best,
+        "baseline": next((r for r in results if r["settings"] == baseline), None),
+        "batching": batched["per_image_ms"],
+        "trials": results,
+    }
+
+def save_optimized_model(model_path: str, settings: dict, output_path: str) -> float:
+    """Run ORT's graph optimizations once and save the result; returns the load time saved in ms"""
+    started = time.perf_counter()
+    ort.InferenceSession(model_path, sess_options=session_options(settings, output_path),
+                         providers=["CPUExecutionProvider"])
+    original_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    ort.InferenceSession(output_path, sess_options=session_options(settings, preoptimized=True),
+                         providers=["CPUExecutionProvider"])
+    optimized_ms = (time.perf_counter() - started) * 1000
+    print(f"Session load: {original_ms:.0f} ms from the original model, "
+          f"{optimized_ms:.0f} ms from {os.path.basename(output_path)}")
+    return original_ms - optimized_ms
+
+def main():
+    from predict import ONNX_PATH, ORT_PROFILE_PATH
+
+    parser = argparse.ArgumentParser(description="Autotune ONNX Runtime settings for this host")
+    parser.add_argument("--model", default=ONNX_PATH)
+    parser.add_argument("--profile", default=ORT_PROFILE_PATH, help="where to save the winning profile")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--runs", type=int, default=20, help="timed runs per setting")
+    args = parser.parse_args()
+
+    print(f"Tuning {args.model} on {host_signature()}")
+    tuned = autotune(args.model, sorted(set(args.batch_sizes) | {1}), args.runs)
+
+    optimized_name = os.path.splitext(os.path.basename(args.model))[0] + ".optimized.ort"
+    optimized_path = os.path.join(os.path.dirname(args.profile) or ".", optimized_name)
+    tuned["load_ms_saved"] = round(save_optimized_model(args.model, tuned["session"], optimized_path), 1)
+
+    profile = {
+        "model": model_signature(args.model),
+        "host": host_signature(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "optimized_model": optimized_name,
+        **tuned,
+    }
+    with open(args.profile, "w", encoding="utf-8") as f:
+        json.dump(profile, f, indent=2)
+
+    baseline = tuned["baseline"]
+    print(f"\nBest: {tuned['session']} -> p50 {tuned['best']['p50_ms']} ms"
+          + (f" (default settings: {baseline['p50_ms']} ms)" if baseline else ""))
+    print(f"Suggested max batch size: {tuned['max_batch_size']}")
+    print(f"Profile saved to {args.profile}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Once over max_entries, trim the file to this fraction of it, so the exact row count and
+# the delete run once per that many writes rather than on every flush
+EVICT_TO_FRACTION = 0.9
+
+class PersistentPredictionCache:
+    """
+    SQLite-backed prediction cache that survives restarts.
+    All disk access happens on a dedicated thread: writes are queued in memory and
+    flushed in the background, the most recent entries are loaded into the in-memory
+    caches after startup, and a key the in-memory caches miss is looked up by primary
+    key, so the event loop never waits on disk.
+    Every row records the model version that produced it; only the serving version's
+    rows are read, and a hot swap deletes the old version's.
+    """
+    def __init__(self, path: str, max_entries=200000, flush_interval=2.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        # SQLite connections belong to the thread that created them
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prediction-db")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pending: List[Tuple[str, str, str, float, str]] = []
+        self._writer_task = None
+        self._load_task = None
+        self._row_count = 0  # Upper bound: replaced keys are counted as new rows
+
+        self.loaded = 0
+        self.lookups = 0
+        self.lookup_hits = 0
+        self.read_errors = 0
+        self.written = 0
+        self.evicted = 0
+        self.write_errors = 0
+        self.invalidated = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS prediction_results ("
+                "tier TEXT NOT NULL, key TEXT NOT NULL, result TEXT NOT NULL, "
+                "updated_at REAL NOT NULL, PRIMARY KEY (tier, key))"
+            )
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(prediction_results)")]
+            if "model_version" not in columns:
+                # Rows from before versioning were all made by the bundled model
+                self._conn.execute(
+                    "ALTER TABLE prediction_results ADD COLUMN model_version TEXT NOT NULL DEFAULT 'bundled'"
+                )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS prediction_results_updated_at ON prediction_results (updated_at)"
+            )
+            self._conn.commit()
+            self._row_count = self._conn.execute("SELECT COUNT(*) FROM prediction_results").fetchone()[0]
+        return self._conn
+
+    # ===== LOADING =====
+    def _read_recent(self, tier: str, limit: int, model_version: str) -> List[Tuple[str, str]]:
+        conn = self._connect()
+        rows = conn.execute(
+            "SELECT key, result FROM prediction_results WHERE tier = ? AND model_version = ? "
+            "ORDER BY updated_at DESC LIMIT ?",
+            (tier, model_version, limit)
+        ).fetchall()
+        # Oldest first, so the most recent entries end up most recently used
+        return rows[::-1]
+
+    async def load_into(self, caches: Dict[str, object], decode: Callable[[dict], object], model_version: str):
+        """Fill the in-memory caches with the most recently saved predictions (decoded by `decode`)"""
+        loop = asyncio.get_running_loop()
+        for tier, cache in caches.items():
+            try:
+                rows = await loop.run_in_executor(
+                    self._executor, self._read_recent, tier, cache.max_size, model_version
+                )
+            except Exception as e:
+                print(f"Failed to load persistent {tier} cache: {e}")
+                continue
+            for key, payload in rows:
+                # Anything predicted since startup is fresher than the saved entry
+                if key in cache:
+                    continue
+                try:
+                    cache.set(key, decode(json.loads(payload)))
+                    self.loaded += 1
+                except Exception as e:
+                    print(f"Skipping unreadable saved prediction: {e}")
+        print(f"Loaded {self.loaded} saved predictions from {self.path}")
+
+    def start_loading(self, caches: Dict[str, object], decode: Callable[[dict], object], model_version: str):
+        """Load saved predictions in the background (needs a running event loop)"""
+        if self._load_task is None:
+            self._load_task = asyncio.get_running_loop().create_task(
+                self.load_into(caches, decode, model_version)
+            )
+
+    # ===== LOOKUP =====
+    def _read_one(self, tier: str, key: str, model_version: str) -> Optional[str]:
+        row = self._connect().execute(
+            "SELECT result FROM prediction_results WHERE tier = ? AND key = ? AND model_version = ?",
+            (tier, key, model_version)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _decode(self, payload: Optional[str]) -> Optional[dict]:
+        self.lookups += 1
+        if payload is None:
+            return None
+        self.lookup_hits += 1
+        return json.loads(payload)
+
+    async def lookup(self, tier: str, key: str, model_version: str) -> Optional[dict]:
+        """A saved prediction (as recorded) that the in-memory caches no longer hold, or None"""
+        loop = asyncio.get_running_loop()
+        try:
+            payload = await loop.run_in_executor(self._executor, self._read_one, tier, key, model_version)
+            return self._decode(payload)
+        except Exception as e:
+            self.read_errors += 1
+            print(f"Failed to read persistent prediction cache: {e}")
+            return None
+
+    def lookup_sync(self, tier: str, key: str, model_version: str) -> Optional[dict]:
+        """Blocking version of lookup()"""
+        try:
+            payload = self._executor.submit(self._read_one, tier, key, model_version).result()
+            return self._decode(payload)
+        except Exception as e:
+            self.read_errors += 1
+            print(f"Failed to read persistent prediction cache: {e}")
+            return None
+
+    # ===== WRITING =====
+    def record(self, tier: str, key: str, payload: dict, model_version: str):
+        """Queue a JSON-serializable prediction to be written on the next background flush"""
+        self._pending.append((tier, key, json.dumps(payload), time.time(), model_version))
+        if self._writer_task is None:
+            try:
+                self._writer_task = asyncio.get_running_loop().create_task(self._writer())
+            except RuntimeError:
+                # No event loop (predict_sync); write straight away
+                self.flush_sync()
+
+    def _write(self, rows: List[Tuple[str, str, str, float, str]]):
+        conn = self._connect()
+        conn.executemany(
+            "INSERT OR REPLACE INTO prediction_results (tier, key, result, updated_at, model_version) "
+            "VALUES (?, ?, ?, ?, ?)",
+            rows
+        )
+        self.written += len(rows)
+        self._row_count += len(rows)
+
+        # Keep the file bounded by dropping the least recently written entries; the
+        # (full scan) count only runs once the running upper bound crosses the limit
+        if self._row_count > self.max_entries:
+            count = conn.execute("SELECT COUNT(*) FROM prediction_results").fetchone()[0]
+            if count > self.max_entries:
+                excess = count - int(self.max_entries * EVICT_TO_FRACTION)
+                conn.execute(
+                    "DELETE FROM prediction_results WHERE rowid IN "
+                    "(SELECT rowid FROM prediction_results ORDER BY updated_at LIMIT ?)",
+                    (excess,)
+                )
+                self.evicted += excess
+                count -= excess
+            self._row_count = count
+        conn.commit()
+
+    async def _writer(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if not self._pending:
+                continue
+            rows, self._pending = self._pending, []
+            try:
+                await loop.run_in_executor(self._executor, self._write, rows)
+            except Exception as e:
+                self.write_errors += 1
+                print(f"Failed to write persistent prediction cache: {e}")
+
+    def _delete_version(self, model_version: str) -> int:
+        conn = self._connect()
+        deleted = conn.execute(
+            "DELETE FROM prediction_results WHERE model_version = ?", (model_version,)
+        ).rowcount
+        conn.commit()
+        self._row_count -= deleted
+        return deleted
+
+    async def invalidate_version(self, model_version: str) -> int:
+        """Drop every saved (and still queued) prediction made by `model_version`"""
+        queued = len(self._pending)
+        self._pending = [row for row in self._pending if row[4] != model_version]
+        deleted = queued - len(self._pending)
+        loop = asyncio.get_running_loop()
+        deleted += await loop.run_in_executor(self._executor, self._delete_version, model_version)
+        self.invalidated += deleted
+        return deleted
+
+    def flush_sync(self):
+        """Write any queued predictions and wait for it"""
+        rows, self._pending = self._pending, []
+        if rows:
+            self._executor.submit(self._write, rows).result()
+
+    def close(self):
+        """Flush queued writes and close the database"""
+        if self._writer_task is not None:
+            self._writer_task.cancel()
+            self._writer_task = None
+        try:
+            self.flush_sync()
+        except Exception as e:
+            print(f"Failed to flush persistent prediction cache: {e}")
+        if self._conn is not None:
+            self._executor.submit(self._conn.close).result()
+            self._conn = None
+        self._executor.shutdown(wait=True)
+
+    def get_stats(self) -> dict:
+        return {
+            "loaded": self.loaded,
+            "lookups": self.lookups,
+            "lookup_hits": self.lookup_hits,
+            "read_errors": self.read_errors,
+            "written": self.written,
+            "pending": len(self._pending),
+            "evicted": self.evicted,
+            "write_errors": self.write_errors,
+            "invalidated": self.invalidated,
+        }
@@ -0,0 +1,155 @@
+import os
+import time
+import argparse
+import numpy as np
+from PIL import Image
+from typing import List, Optional, Tuple
+from dataset import iter_labelled_images, is_lfs_pointer
+
+SUBMODULE_PATH = os.path.dirname(os.path.realpath(__file__))
+INDEX_PATH = os.path.join(SUBMODULE_PATH, "model/phash_index.npz")
+LABELS_PATH = os.path.join(SUBMODULE_PATH, "model/labels_v2.json")
+
+HASH_BITS = 128  # 64-bit pHash + 64-bit dHash
+
+# Orthonormal DCT-II basis for the 32x32 pHash transform
+_DCT_SIZE = 32
+_DCT_MATRIX = np.array([
+    [np.sqrt((1 if k == 0 else 2) / _DCT_SIZE) * np.cos(np.pi * (2 * n + 1) * k / (2 * _DCT_SIZE))
+     for n in range(_DCT_SIZE)]
+    for k in range(_DCT_SIZE)
+], dtype=np.float32)
+
+# Number of set bits in every byte value, for vectorized Hamming distance
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+def compute_hash(image: Image.Image) -> Tuple[np.ndarray, np.ndarray]:
+    """Return ([pHash, dHash] as two uint64, mean RGB colour as three uint8) for an RGB image"""
+    gray = image.convert("L")
+
+    # pHash: sign of the low-frequency DCT coefficients against their median
+    pixels = np.asarray(gray.resize((_DCT_SIZE, _DCT_SIZE), Image.BILINEAR), dtype=np.float32)
+    dct = (_DCT_MATRIX @ pixels @ _DCT_MATRIX.T)[:8, :8].flatten()
+    phash_bits = dct > np.median(dct[1:])
+
+    # dHash: horizontal gradient direction on a 9x8 thumbnail
+    small = np.asarray(gray.resize((9, 8), Image.BILINEAR), dtype=np.int16)
+    dhash_bits = (small[:, 1:] > small[:, :-1]).flatten()
+
+    hashes = np.packbits(np.concatenate([phash_bits, dhash_bits])).view(np.uint64)
+    color = np.asarray(image.resize((8, 8), Image.BOX), dtype=np.float32).reshape(-1, 3).mean(axis=0)
+    return hashes, color.round().astype(np.uint8)
+
+class PerceptualHashIndex:
+    """Nearest-neighbour lookup of sprite hashes by Hamming distance"""
+    HASH_BITS = HASH_BITS
+
+    def __init__(self, hashes: np.ndarray, colors: np.ndarray, labels: np.ndarray,
+                 max_distance=6, max_color_diff=24):
+        self.hashes = np.ascontiguousarray(hashes, dtype=np.uint64).reshape(-1, 2)
+        self.colors = np.ascontiguousarray(colors, dtype=np.int16).reshape(-1, 3)
+        self.labels = np.asarray(labels, dtype=np.int32)
+        self.max_distance = max_distance
+        self.max_color_diff = max_color_diff
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.labels)
+
+    @classmethod
+    def load(cls, path: str, class_names: List[str], **kwargs) -> "PerceptualHashIndex":
+        """Load an index and map its stored label names onto the current class indices"""
+        data = np.load(path, allow_pickle=False)
+        name_to_idx = {name: idx for idx, name in enumerate(class_names)}
+        stored_idx = np.array([name_to_idx.get(name, -1) for name in data["label_names"]], dtype=np.int32)
+        labels = stored_idx[data["labels"]]
+
+        # Drop entries whose label no longer exists in the model
+        keep = labels >= 0
+        return cls(data["hashes"][keep], data["colors"][keep], labels[keep], **kwargs)
+
+    def save(self, path: str, class_names: List[str]):
+        np.savez_compressed(
+            path,
+            hashes=self.hashes,
+            colors=self.colors.astype(np.uint8),
+            labels=self.labels,
+            label_names=np.array(class_names),
+        )
+
+    def distances(self, hashes: np.ndarray) -> np.ndarray:
+        """Hamming distance from one [pHash, dHash] pair to every entry"""
+        xor = np.bitwise_xor(self.hashes, hashes.reshape(1, 2))
+        return _POPCOUNT[xor.view(np.uint8)].sum(axis=1, dtype=np.int32)
+
+    def lookup(self, image: Image.Image) -> Optional[Tuple[int, int]]:
+        """Return (class index, distance) if exactly one label is within the distance threshold"""
+        if not len(self.labels):
+            return None
+
+        hashes, color = compute_hash(image)
+        dist = self.distances(hashes)
+        color_ok = np.abs(self.colors - color.astype(np.int16)).max(axis=1) <= self.max_color_diff
+        close = (dist <= self.max_distance) & color_ok
+
+        candidates = np.unique(self.labels[close])
+        if len(candidates) != 1:
+            # No match, or several different Pokemon look alike: leave it to the CNN
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return int(candidates[0]), int(dist[close].min())
+
+    def get_stats(self) -> dict:
+        return {"entries": len(self.labels), "hits": self.hits, "misses": self.misses}
+
+def build_index(class_names: List[str]) -> PerceptualHashIndex:
+    """Hash every bundled sprite that maps to a model label"""
+    hashes, colors, labels = [], [], []
+    stats = {}
+    skipped = 0
+    for path, idx in iter_labelled_images(class_names, stats=stats):
+        if is_lfs_pointer(path):
+            skipped += 1
+            continue
+        try:
+            with Image.open(path) as image:
+                image_hashes, color = compute_hash(image.convert("RGB"))
+        except Exception as e:
+            print(f"Skipping {path}: {e}")
+            skipped += 1
+            continue
+        hashes.append(image_hashes)
+        colors.append(color)
+        labels.append(idx)
+
+    if stats["unmatched"]:
+        print(f"{len(stats['unmatched'])} sprite names have no model label and were skipped")
+    if skipped:
+        print(f"{skipped} files could not be read (run 'git lfs pull' if they are LFS pointers)")
+
+    return PerceptualHashIndex(
+        np.array(hashes, dtype=np.uint64).reshape(-1, 2),
+        np.array(colors, dtype=np.uint8).reshape(-1, 3),
+        np.array(labels, dtype=np.int32),
+    )
+
+def main():
+    """Build model/phash_index.npz from the bundled sprites"""
+    from predict import load_class_names
+
+    parser = argparse.ArgumentParser(description="Build the perceptual-hash sprite index")
+    parser.add_argument("--labels", default=LABELS_PATH)
+    parser.add_argument("--output", default=INDEX_PATH)
+    args = parser.parse_args()
+
+    class_names = load_class_names(args.labels)
+    start = time.perf_counter()
+    index = build_index(class_names)
+    index.save(args.output, class_names)
+    print(f"Indexed {len(index)} sprites in {time.perf_counter() - start:.1f}s -> {args.output}")
+
+if __name__ == "__main__":
+    main()
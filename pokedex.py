@@ -0,0 +1,96 @@
+"""
+Class index -> Pokedex record table, built once when the predictor loads.
+
+The model's labels never change at runtime, so each one is resolved against
+pokemondata.json up front (same matching as utils.find_pokemon_by_name, falling back
+to accent/gender-insensitive matching) and predictions carry the resolved entry.
+"""
+import json
+from typing import Dict, List, Optional
+from utils import normalize_pokemon_name, is_rare_pokemon
+
+class PokedexEntry:
+    """Everything the spawn path needs to know about one model label"""
+    def __init__(self, class_index: int, label: str, record: Optional[dict]):
+        self.class_index = class_index
+        self.label = label
+        self.record = record  # pokemondata.json entry, None if the label matched nothing
+
+        # Gendered labels ("Pyroar-Female") are shown as the base name plus a gender line
+        self.gender = None
+        self.display_name = label
+        for gender in ("Male", "Female"):
+            if label.endswith(f"-{gender}"):
+                self.gender = gender
+                self.display_name = label[:-len(gender) - 1]
+        self.normalized = normalize_pokemon_name(label).lower()
+
+        record = record or {}
+        self.dex_number = record.get("dex_number")
+        self.is_variant = bool(record.get("is_variant"))
+        self.base_form = record.get("variant_of") if self.is_variant else None
+        self.normalized_base = normalize_pokemon_name(self.base_form).lower() if self.base_form else None
+        self.rarity = (record.get("rarity") or "").lower()
+        self.is_rare = is_rare_pokemon(record)
+        self.is_regional = self.rarity == "regional"
+
+    def format_prediction(self, confidence_text: str) -> str:
+        """Same output as utils.format_pokemon_prediction, without re-parsing the label"""
+        if self.gender:
+            return f"{self.display_name}: {confidence_text}\nGender: {self.gender}"
+        return f"{self.label}: {confidence_text}"
+
+    def __repr__(self):
+        return f"PokedexEntry({self.class_index}, {self.label!r}, rarity={self.rarity!r})"
+
+def _index_names(pokemon_data: List[dict], key) -> Dict[str, dict]:
+    """Name -> first record with that main or other-language name, in file order"""
+    index = {}
+    for pokemon in pokemon_data:
+        names = [pokemon.get("name", "")]
+        other_names = pokemon.get("other_names")
+        if isinstance(other_names, dict):
+            for lang_name_data in other_names.values():
+                if isinstance(lang_name_data, str):
+                    names.append(lang_name_data)
+                elif isinstance(lang_name_data, list):
+                    names.extend(name for name in lang_name_data if isinstance(name, str))
+        for name in names:
+            if name:
+                index.setdefault(key(name), pokemon)
+    return index
+
+class PokedexTable:
+    """Entries indexed by class id; labels without a record still get an entry (record None)"""
+    def __init__(self, class_names: List[str], pokemon_data: List[dict]):
+        exact = _index_names(pokemon_data, lambda name: name.lower().strip())
+        flexible = _index_names(pokemon_data, lambda name: normalize_pokemon_name(name).lower())
+
+        self.entries: List[PokedexEntry] = []
+        self.unmatched: List[str] = []
+        for class_index, label in enumerate(class_names):
+            record = exact.get(label.lower().strip()) or flexible.get(normalize_pokemon_name(label).lower())
+            if record is None:
+                self.unmatched.append(label)
+            self.entries.append(PokedexEntry(class_index, label, record))
+
+    @classmethod
+    def load(cls, path: str, class_names: List[str]) -> "PokedexTable":
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                pokemon_data = json.load(f)
+        except Exception as e:
+            print(f"Failed to load {path}: {e}")
+            pokemon_data = []
+        return cls(class_names, pokemon_data)
+
+    def get(self, class_index: int) -> Optional[PokedexEntry]:
+        if 0 <= class_index < len(self.entries):
+            return self.entries[class_index]
+        return None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get_stats(self) -> dict:
+        return {"classes": len(self.entries), "unmatched": len(self.unmatched)}
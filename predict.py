@@ -2,158 +2,1017 @@ import onnxruntime as ort
 import numpy as np
 import aiohttp
 from PIL import Image
-import io
+import asyncio
+import threading
 import os
 import json
 import time
+import random
 import hashlib
-from typing import Optional, Tuple
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from config import (
+    PREDICT_BATCH_WINDOW_MS,
+    PREDICT_MAX_BATCH_SIZE,
+    PREDICT_THREAD_POOL_SIZE,
+    PREDICT_CACHE_PIXEL_HASH,
+    PREDICT_PHASH_INDEX_PATH,
+    PREDICT_PHASH_MAX_DISTANCE,
+    PREDICT_PHASH_MAX_COLOR_DIFF,
+    PREDICT_PERSISTENT_CACHE_PATH,
+    PREDICT_PERSISTENT_CACHE_MAX_ENTRIES,
+    PREDICT_PERSISTENT_CACHE_FLUSH_SECONDS,
+    PREDICT_RESIZE_FILTER,
+    PREDICT_QUANTIZED,
+    PREDICT_LOW_MEMORY,
+    PREDICT_TOP_K,
+    PREDICT_WARMUP_BATCH_SIZES,
+    PREDICT_WARMUP_RUNS,
+    PREDICT_READY_TIMEOUT,
+    PREDICT_MAX_IMAGE_BYTES,
+    PREDICT_MAX_CONCURRENT_DOWNLOADS,
+    PREDICT_DOWNLOAD_CHUNK_BYTES,
+    PREDICT_FAILED_URL_TTL,
+    PREDICT_HOST_FAILURE_THRESHOLD,
+    PREDICT_HOST_COOLDOWN_SECONDS,
+    PREDICT_CASCADE_MODEL_PATH,
+    PREDICT_CASCADE_THRESHOLD,
+    PREDICT_INFERENCE_SERVER,
+    PREDICT_INFERENCE_TIMEOUT,
+    PREDICT_INFERENCE_TOKEN,
+    PREDICT_ORT_PROFILE_PATH,
+    PREDICT_BACKEND,
+    PREDICT_MODEL_REGISTRY_PATH,
+    PREDICT_SHADOW_SAMPLE_RATE,
+    PREDICT_SHADOW_MAX_PENDING,
+    PREDICT_SWAP_DRAIN_SECONDS,
+    PREDICT_CLASSIFIER,
+    PREDICT_EMBEDDING_MODEL_PATH,
+    PREDICT_EMBEDDING_INDEX_PATH
+)
+from phash_index import PerceptualHashIndex
+from preprocessing import DEFAULT_INPUT_SIZE, ImagePreprocessor, model_input_size
+from persistent_cache import PersistentPredictionCache
+from image_fetch import ImageFetcher
+from inference_server import RemoteInferenceClient
+from ort_autotune import load_profile, session_options
+from pokedex import PokedexEntry, PokedexTable
+from model_registry import BUNDLED_VERSION, ModelRegistry, ModelVersion, RegistryError, file_sha256
+from embedding_index import EmbeddingIndex
+from backends import (
+    BACKEND_NAMES, ORT_PROVIDERS, BackendUnavailable, InferenceBackend, OrtBackend,
+    TorchScriptBackend, ort_provider, select_backend
+)
 
 SUBMODULE_PATH = os.path.dirname(os.path.realpath(__file__))  
 ONNX_PATH = os.path.join(SUBMODULE_PATH, "model/pokemon_cnn_v2.onnx")
+ONNX_INT8_PATH = os.path.join(SUBMODULE_PATH, "model/pokemon_cnn_v2.int8.onnx")
+ONNX_EXTERNAL_PATH = os.path.join(SUBMODULE_PATH, "model/pokemon_cnn_v2.external.onnx")
+TORCHSCRIPT_PATH = os.path.join(SUBMODULE_PATH, "model/pokemon_cnn_v2.torchscript.pt")
 LABELS_PATH = os.path.join(SUBMODULE_PATH, "model/labels_v2.json")
+POKEDEX_PATH = os.path.join(SUBMODULE_PATH, "pokemondata.json")
+PHASH_INDEX_PATH = os.path.join(SUBMODULE_PATH, PREDICT_PHASH_INDEX_PATH)
+EMBEDDING_MODEL_PATH = os.path.join(SUBMODULE_PATH, PREDICT_EMBEDDING_MODEL_PATH)
+EMBEDDING_INDEX_PATH = os.path.join(SUBMODULE_PATH, PREDICT_EMBEDDING_INDEX_PATH)
+CASCADE_MODEL_PATH = os.path.join(SUBMODULE_PATH, PREDICT_CASCADE_MODEL_PATH)
+MODEL_REGISTRY_PATH = os.path.join(SUBMODULE_PATH, PREDICT_MODEL_REGISTRY_PATH) if PREDICT_MODEL_REGISTRY_PATH else None
+ORT_PROFILE_PATH = os.path.join(SUBMODULE_PATH, PREDICT_ORT_PROFILE_PATH) if PREDICT_ORT_PROFILE_PATH else None
+PERSISTENT_CACHE_PATH = (
+    os.path.join(SUBMODULE_PATH, PREDICT_PERSISTENT_CACHE_PATH) if PREDICT_PERSISTENT_CACHE_PATH else None
+)
+
+def load_class_names(labels_path=LABELS_PATH):
+    """Load class names from labels_v2.json"""
+    if not os.path.exists(labels_path):
+        raise FileNotFoundError(
+            f"Labels file not found: {labels_path}\n"
+            "Please ensure model/labels_v2.json exists in your project."
+        )
+
+    with open(labels_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+        if isinstance(data, dict):
+            # Sort by numeric keys and extract Pokemon names
+            sorted_keys = sorted(data.keys(), key=lambda x: int(x))
+            return [data[k].strip('"') for k in sorted_keys]  # Remove quotes if present
+        if isinstance(data, list):
+            return [name.strip('"') for name in data]  # Remove quotes if present
+        raise ValueError("labels_v2.json must be a list or dict")
+
+class PredictionResult:
+    """Structured prediction: best label, top-k candidates with probabilities, and stage timings"""
+    def __init__(self, name: str, confidence: float, class_index: int,
+                 candidates: Optional[List[Tuple[str, float]]] = None,
+                 timings: Optional[Dict[str, float]] = None, source="cnn",
+                 pokedex: Optional[PokedexEntry] = None, model_version: Optional[str] = None):
+        self.name = name
+        self.confidence = confidence  # Probability in [0, 1]
+        self.class_index = class_index
+        self.candidates = candidates or [(name, confidence)]  # (name, probability), best first
+        self.timings = timings or {}  # Stage -> milliseconds
+        self.source = source  # "cnn", "cascade" (first stage), "phash", "cache" or "coalesced"
+        self.pokedex = pokedex  # Resolved pokemondata.json entry for class_index
+        self.model_version = model_version  # Version tag of the model (and embedding index) that made it
+
+    @property
+    def confidence_text(self) -> str:
+        return f"{self.confidence * 100:.2f}%"
+
+    @property
+    def alternatives(self) -> List[Tuple[str, float]]:
+        """Candidates other than the best one"""
+        return self.candidates[1:]
+
+    def as_tuple(self) -> Tuple[str, str]:
+        """The legacy (name, "97.31%") form"""
+        return self.name, self.confidence_text
+
+    def from_cache(self, elapsed_ms: float, source="cache") -> "PredictionResult":
+        """Copy of a cached (or shared in-flight) result with its own timing"""
+        return PredictionResult(
+            self.name, self.confidence, self.class_index, self.candidates,
+            {"total": elapsed_ms}, source, self.pokedex, self.model_version
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "confidence": self.confidence,
+            "class_index": self.class_index,
+            "candidates": self.candidates,
+            "source": self.source,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict, pokedex: Optional[PokedexTable] = None,
+                  model_version: Optional[str] = None) -> "PredictionResult":
+        return cls(
+            data["name"], data["confidence"], data["class_index"],
+            [tuple(candidate) for candidate in data.get("candidates", [])],
+            source=data.get("source", "cnn"),
+            pokedex=pokedex.get(data["class_index"]) if pokedex is not None else None,
+            model_version=model_version
+        )
+
+    def __repr__(self):
+        return f"PredictionResult({self.name!r}, {self.confidence_text}, source={self.source!r})"
+
+class DeadlineExceeded(Exception):
+    """The caller's deadline passed; `stage` is the work that was skipped or cancelled"""
+    def __init__(self, stage: str):
+        super().__init__(f"Prediction deadline passed (dropped at {stage})")
+        self.stage = stage
+
+class SharedDeadline:
+    """
+    Deadline of an in-flight prediction: the latest one among the callers sharing it
+    (None if any caller has no deadline), plus the stage the work is in.
+    """
+    def __init__(self, at: Optional[float]):
+        self.at = at  # time.time() timestamp
+        self.stage = "download"
+
+    def extend(self, at: Optional[float]):
+        self.at = None if at is None or self.at is None else max(self.at, at)
+
+    def passed(self) -> bool:
+        return self.at is not None and time.time() >= self.at
 
 class PredictionCache:
-    """Simple in-memory cache for predictions"""
-    def __init__(self, max_size=1000, ttl_seconds=3600):  # 1 hour TTL
-        self.cache = {}
-        self.timestamps = {}
+    """
+    In-memory LRU cache for predictions with a per-entry TTL.
+    get/set/evict are O(1); expired entries are dropped lazily on access and by
+    a periodic sweep from the least recently used end.
+    """
+    def __init__(self, max_size=1000, ttl_seconds=3600, sweep_interval=60):  # 1 hour TTL
+        self.cache = OrderedDict()  # key -> (value, expires_at), least recently used first
         self.max_size = max_size
         self.ttl_seconds = ttl_seconds
+        self.sweep_interval = sweep_interval
+        self._next_sweep = time.monotonic() + sweep_interval
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self.cache)
 
-    def _cleanup_expired(self):
-        """Remove expired entries"""
-        current_time = time.time()
-        expired_keys = [
-            key for key, timestamp in self.timestamps.items()
-            if current_time - timestamp > self.ttl_seconds
-        ]
-        for key in expired_keys:
-            self.cache.pop(key, None)
-            self.timestamps.pop(key, None)
-
-    def get(self, key: str) -> Optional[Tuple[str, str]]:
+    def __contains__(self, key: str) -> bool:
+        return key in self.cache
+
+    def _sweep_expired(self, now: float):
+        """Drop expired entries from the least recently used end until a live one is found"""
+        self._next_sweep = now + self.sweep_interval
+        while self.cache:
+            key, (_, expires_at) = next(iter(self.cache.items()))
+            if expires_at > now:
+                break
+            del self.cache[key]
+            self.expirations += 1
+
+    def get(self, key: str) -> Optional[PredictionResult]:
         """Get cached prediction if valid"""
-        self._cleanup_expired()
-        if key in self.cache:
-            current_time = time.time()
-            if current_time - self.timestamps[key] <= self.ttl_seconds:
-                return self.cache[key]
-            else:
-                # Remove expired entry
-                self.cache.pop(key, None)
-                self.timestamps.pop(key, None)
+        entry = self.cache.get(key)
+        if entry is not None:
+            if entry[1] > time.monotonic():
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            # Remove expired entry
+            del self.cache[key]
+            self.expirations += 1
+        self.misses += 1
         return None
 
-    def set(self, key: str, value: Tuple[str, str]):
+    def set(self, key: str, value: PredictionResult):
         """Cache a prediction"""
-        self._cleanup_expired()
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self._sweep_expired(now)
+
+        self.cache[key] = (value, now + self.ttl_seconds)
+        self.cache.move_to_end(key)
+
+        # Evict least recently used entries if cache is full
+        while len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+            self.evictions += 1
 
-        # Remove oldest entries if cache is full
-        if len(self.cache) >= self.max_size:
-            oldest_key = min(self.timestamps.keys(), key=lambda k: self.timestamps[k])
-            self.cache.pop(oldest_key, None)
-            self.timestamps.pop(oldest_key, None)
+    def remove_where(self, predicate: Callable[[PredictionResult], bool]) -> int:
+        """Drop every entry whose prediction matches `predicate`; returns how many"""
+        stale = [key for key, (value, _) in self.cache.items() if predicate(value)]
+        for key in stale:
+            del self.cache[key]
+        return len(stale)
 
-        self.cache[key] = value
-        self.timestamps[key] = time.time()
+    def get_stats(self) -> dict:
+        """Hit/miss/eviction counters and current size"""
+        return {
+            "size": len(self.cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+class InferenceBatcher:
+    """Collects concurrent inference requests and runs them as one NCHW batch"""
+    def __init__(self, run_batch: Callable[[np.ndarray], np.ndarray],
+                 max_batch_size=PREDICT_MAX_BATCH_SIZE, window_ms=PREDICT_BATCH_WINDOW_MS,
+                 executor: Optional[ThreadPoolExecutor] = None):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.window_seconds = max(0, window_ms) / 1000
+        self.executor = executor
+        self._pending: List[Tuple[np.ndarray, asyncio.Future]] = []
+        self._flush_handle = None
+        self._running = set()  # Keep references to in-flight batch tasks
+        self._local = threading.local()  # Per-thread reusable batch buffer
+
+        # Counters for monitoring batch efficiency
+        self.batches_run = 0
+        self.images_run = 0
+
+    async def submit(self, image: np.ndarray) -> np.ndarray:
+        """Queue a single preprocessed image (1xCxHxW) and wait for its logits"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((image, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window_seconds, self._flush)
+
+        return await future
+
+    def _flush(self):
+        """Hand every queued image to a batch run"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        pending = self._pending[:self.max_batch_size]
+        self._pending = self._pending[self.max_batch_size:]
+        loop = asyncio.get_running_loop()
+        if self._pending:
+            # More requests than one batch holds; run the rest on the next loop iteration
+            self._flush_handle = loop.call_soon(self._flush)
+        if not pending:
+            return
+
+        task = loop.create_task(self._run(pending))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    def _run_sync(self, images: List[np.ndarray]) -> np.ndarray:
+        """Stack the images into one batch and run it (called on a worker thread)"""
+        if len(images) == 1:
+            return self.run_batch(images[0])
+
+        # Stack into this thread's preallocated buffer instead of a fresh array per batch
+        shape = (self.max_batch_size,) + images[0].shape[1:]
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None or buffer.shape != shape:
+            buffer = self._local.buffer = np.empty(shape, dtype=np.float32)
+        batch = buffer[:len(images)]
+        np.concatenate(images, axis=0, out=batch)
+        return self.run_batch(batch)
+
+    async def _run(self, pending: List[Tuple[np.ndarray, asyncio.Future]]):
+        """Run one batch off the event loop and send each caller its row"""
+        # Callers cancelled while queued (e.g. past their deadline) don't need a row
+        pending = [(image, future) for image, future in pending if not future.cancelled()]
+        if not pending:
+            return
+        images = [image for image, _ in pending]
+        try:
+            if self.executor is not None:
+                loop = asyncio.get_running_loop()
+                logits = await loop.run_in_executor(self.executor, self._run_sync, images)
+            else:
+                logits = self._run_sync(images)
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches_run += 1
+        self.images_run += len(pending)
+        for i, (_, future) in enumerate(pending):
+            if not future.done():
+                future.set_result(logits[i])
 
 class Prediction:
-    def __init__(self, onnx_path=ONNX_PATH, labels_path=LABELS_PATH):
-        self.onnx_path = onnx_path
+    def __init__(self, onnx_path=None, labels_path=LABELS_PATH, quantized=PREDICT_QUANTIZED,
+                 max_batch_size=None, batch_window_ms=PREDICT_BATCH_WINDOW_MS,
+                 thread_pool_size=PREDICT_THREAD_POOL_SIZE, hash_pixels=PREDICT_CACHE_PIXEL_HASH,
+                 phash_index_path=PHASH_INDEX_PATH, persistent_cache_path=PERSISTENT_CACHE_PATH,
+                 top_k=PREDICT_TOP_K, cascade_model_path=CASCADE_MODEL_PATH,
+                 cascade_threshold=PREDICT_CASCADE_THRESHOLD, inference_server=PREDICT_INFERENCE_SERVER,
+                 intra_op_threads=None, ort_profile_path=ORT_PROFILE_PATH, pokedex_path=POKEDEX_PATH,
+                 low_memory=PREDICT_LOW_MEMORY, backend=PREDICT_BACKEND, model_version=None,
+                 classifier=PREDICT_CLASSIFIER, embedding_model_path=EMBEDDING_MODEL_PATH,
+                 embedding_index_path=EMBEDDING_INDEX_PATH):
+        self.model_version = model_version or BUNDLED_VERSION
+        self.quantized = quantized
+        self.low_memory = low_memory
+        if onnx_path is None and low_memory and not quantized:
+            if os.path.exists(ONNX_EXTERNAL_PATH):
+                onnx_path = ONNX_EXTERNAL_PATH
+            else:
+                print(f"{ONNX_EXTERNAL_PATH} not found (run 'python convert.py --external-data'); "
+                      "low-memory mode will keep a private copy of the weights")
+        self.onnx_path = onnx_path or (ONNX_INT8_PATH if quantized else ONNX_PATH)
+
+        # Embedding mode: the backend runs the feature extractor and labels come from the
+        # nearest indexed sprites, which can include Pokemon the CNN was never trained on
+        self.embedding_index = None
+        if classifier == "embedding":
+            if inference_server:
+                print("Embedding classifier needs the model in-process; using the inference server's CNN")
+            else:
+                self.embedding_index = self._load_embedding_index(embedding_model_path, embedding_index_path)
+        self.classifier = "embedding" if self.embedding_index is not None else "cnn"
+        if self.embedding_index is not None:
+            self.onnx_path = embedding_model_path
+        # Tag for cached results: embedding-mode answers depend on the index as well
+        self.result_version = self.model_version
+        if self.embedding_index is not None:
+            self.result_version = f"{self.model_version}+embeddings-{self.embedding_index.signature}"
+
+        # Tuned session settings for this host, if ort_autotune.py has been run;
+        # an explicit intra_op_threads still wins over the tuned thread count
+        self.ort_profile = None
+        if ort_profile_path and not inference_server:
+            self.ort_profile = load_profile(ort_profile_path, self.onnx_path)
+        if self.ort_profile is not None and not intra_op_threads:
+            intra_op_threads = self.ort_profile["session"]["intra_op_num_threads"]
+        self.intra_op_threads = intra_op_threads or min(4, os.cpu_count())  # Limit threads for Railway
+        if max_batch_size is None:
+            max_batch_size = (self.ort_profile or {}).get("max_batch_size") or PREDICT_MAX_BATCH_SIZE
         self.labels_path = labels_path
         self.class_names = self.load_class_names()
+        if self.embedding_index is not None:
+            # The CNN's labels in their order, then any Pokemon only the index knows
+            self.embedding_only_labels = len(set(self.embedding_index.label_names) - set(self.class_names))
+            self.class_names = self.embedding_index.label_names
+        self.pokedex = PokedexTable.load(pokedex_path, self.class_names)
+        if self.pokedex.unmatched:
+            print(f"{len(self.pokedex.unmatched)} labels have no pokemondata.json record: "
+                  f"{', '.join(self.pokedex.unmatched[:10])}"
+                  f"{', ...' if len(self.pokedex.unmatched) > 10 else ''}")
+        self.top_k = max(1, top_k)
+        self.fetcher = ImageFetcher(
+            PREDICT_MAX_IMAGE_BYTES,
+            chunk_size=PREDICT_DOWNLOAD_CHUNK_BYTES,
+            max_concurrent=PREDICT_MAX_CONCURRENT_DOWNLOADS,
+            failed_url_ttl=PREDICT_FAILED_URL_TTL,
+            host_failure_threshold=PREDICT_HOST_FAILURE_THRESHOLD,
+            host_cooldown=PREDICT_HOST_COOLDOWN_SECONDS
+        )
+
+        # Cache tiers: by URL, then by downloaded content so the same sprite behind a
+        # different attachment/proxy URL skips decode and inference, then (optionally) by pixels
         self.cache = PredictionCache()
+        self.content_cache = PredictionCache()
+        self.hash_pixels = hash_pixels
+        self.pixel_cache = PredictionCache() if hash_pixels else None
 
+        # Optional disk tier behind the URL and content caches, loaded on first use
+        self.persistent_cache = None
+        if persistent_cache_path:
+            self.persistent_cache = PersistentPredictionCache(
+                persistent_cache_path,
+                max_entries=PREDICT_PERSISTENT_CACHE_MAX_ENTRIES,
+                flush_interval=PREDICT_PERSISTENT_CACHE_FLUSH_SECONDS
+            )
+
+        # Reference sprite hashes checked before the CNN (optional)
+        self.phash_index = None
+        if phash_index_path and os.path.exists(phash_index_path):
+            self.phash_index = PerceptualHashIndex.load(
+                phash_index_path, self.class_names,
+                max_distance=PREDICT_PHASH_MAX_DISTANCE,
+                max_color_diff=PREDICT_PHASH_MAX_COLOR_DIFF
+            )
+            print(f"Perceptual-hash index loaded with {len(self.phash_index)} sprites")
+
+        # Bounded pool for CPU-bound work; ONNX Runtime and PIL release the GIL
+        self.thread_pool_size = max(0, thread_pool_size)
+        self.executor = None
+        if self.thread_pool_size > 0:
+            self.executor = ThreadPoolExecutor(max_workers=self.thread_pool_size, thread_name_prefix="predict")
+
+        # With an inference server another process owns the model; this one only
+        # downloads, caches and preprocesses, then sends the tensor over
+        self.remote = None
+        self.backend: Optional[InferenceBackend] = None
+        self.backend_report: Dict[str, str] = {}
+        self.cascade_threshold = cascade_threshold
+        self.fast_session = None
+        self.fast_input_name = None
+        self.input_size = DEFAULT_INPUT_SIZE  # An inference server's is adopted in warm_up()
+        if inference_server:
+            self.remote = RemoteInferenceClient(inference_server, timeout=PREDICT_INFERENCE_TIMEOUT,
+                                                token=PREDICT_INFERENCE_TOKEN)
+        else:
+            self.backend = self._load_backend(backend)
+            if self.backend.input_size:
+                self.input_size = self.backend.input_size
+
+            # Optional cheap first stage; only images it is unsure about reach the full CNN
+            if self.embedding_index is not None:
+                cascade_model_path = None  # Its outputs are CNN classes, not embeddings
+            if cascade_model_path and os.path.exists(cascade_model_path):
+                fast_session = self._create_session(cascade_model_path)
+                num_outputs = fast_session.get_outputs()[0].shape[-1]
+                fast_input_size = model_input_size(fast_session, self.input_size)
+                if isinstance(num_outputs, int) and num_outputs != len(self.class_names):
+                    print(f"Cascade model {cascade_model_path} has {num_outputs} classes, "
+                          f"expected {len(self.class_names)}; cascade disabled")
+                elif fast_input_size != self.input_size:
+                    # Both stages share one preprocessed tensor
+                    print(f"Cascade model {cascade_model_path} takes {fast_input_size}px input, "
+                          f"the model {self.input_size}px; cascade disabled")
+                else:
+                    self.fast_session = fast_session
+                    self.fast_input_name = fast_session.get_inputs()[0].name
+                    print(f"Cascade model loaded (threshold {cascade_threshold:.2f})")
+
+        # Images are resized to the model's own input size (224 for the bundled CNN)
+        self.preprocessor = ImagePreprocessor(self.input_size, PREDICT_RESIZE_FILTER)
+        # Model inputs whose inference has finished, reused instead of allocating one per image
+        self._spare_inputs: List[np.ndarray] = []
+        self._spare_inputs_lock = threading.Lock()
+        self.max_spare_inputs = max_batch_size * 2
+
+        # Per-stage counters and latency totals for tuning the cascade threshold
+        self.fast_runs = 0
+        self.fast_answered = 0
+        self.fast_ms_total = 0.0
+        self.full_runs = 0
+        self.full_ms_total = 0.0
+
+        # URL cache key -> task for a prediction in progress, shared by duplicate callers
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._inflight_deadlines: Dict[str, SharedDeadline] = {}
+        self.coalesced = 0
+        self.deadline_drops: Dict[str, int] = {}  # Stage -> predictions dropped there
+        self._sync_session = None  # requests.Session for predict_sync, created on first use
+        self.shadow: Optional["ShadowEvaluator"] = None  # Candidate model fed a sample of traffic
+
+        # Concurrent predict() calls share batched session runs
+        self.max_batch_size = max_batch_size
+        self.batcher = None
+        self.fast_batcher = None
+        if self.remote is None:
+            self.batcher = InferenceBatcher(self.run_batch, max_batch_size, batch_window_ms, self.executor)
+            if self.fast_session is not None:
+                self.fast_batcher = InferenceBatcher(self.run_fast_batch, max_batch_size, batch_window_ms, self.executor)
+
+        if self.remote is not None:
+            print(f"Using inference server at {inference_server}")
+        else:
+            print(f"Inference backend initialized: {self.backend.describe()} "
+                  f"(model {self.model_version}, {'INT8' if self.quantized else 'FP32'}, {self.input_size}px"
+                  f"{', embedding index of ' + str(len(self.embedding_index)) + ' sprites' if self.embedding_index else ''}"
+                  f"{', tuned profile' if self.ort_profile else ''}"
+                  f"{', low-memory mode' if self.low_memory else ''})")
+
+    def _load_embedding_index(self, model_path: str, index_path: str) -> Optional[EmbeddingIndex]:
+        """The sprite embedding index, if it exists and was built with this feature extractor"""
+        for path, hint in ((model_path, "python convert.py --skip-export --embeddings"),
+                           (index_path, "python embedding_index.py")):
+            if not os.path.exists(path):
+                print(f"{path} not found (run '{hint}'); using the CNN classifier")
+                return None
+        index = EmbeddingIndex.load(index_path)
+        if index.extractor_sha256 != file_sha256(model_path):
+            print(f"{index_path} was built with a different feature extractor "
+                  "(run 'python embedding_index.py'); using the CNN classifier")
+            return None
+        if not len(index):
+            print(f"{index_path} is empty; using the CNN classifier")
+            return None
+        return index
+
+    def create_backend(self, name: str) -> InferenceBackend:
+        """Build an inference backend for the main model; raises BackendUnavailable if it can't run here"""
+        if name == "onnxruntime":
+            return OrtBackend(self._create_session(self.onnx_path, self.ort_profile))
+        if name in ORT_PROVIDERS:
+            # Unsupported ops fall back to the CPU provider; the tuned profile is CPU-provider only
+            providers = [ort_provider(name), "CPUExecutionProvider"]
+            return OrtBackend(self._create_session(self.onnx_path, providers=providers), name)
+        if name == "torchscript":
+            if self.embedding_index is not None:
+                raise BackendUnavailable("the TorchScript export has no feature-extractor variant")
+            return TorchScriptBackend(TORCHSCRIPT_PATH, self.intra_op_threads)
+        raise ValueError(f"Unknown inference backend {name!r} (expected \"auto\" or one of {', '.join(BACKEND_NAMES)})")
+
+    def _load_backend(self, name: str) -> InferenceBackend:
+        if name == "auto":
+            # Time every backend this host can run on the same input and keep the fastest;
+            # the onnxruntime reference is built first so the sample matches the model's input
+            reference = self.create_backend("onnxruntime")
+            size = reference.input_size or DEFAULT_INPUT_SIZE
+            sample = np.random.default_rng(0).standard_normal((1, 3, size, size)).astype(np.float32)
+            factories = {backend: (lambda backend=backend: self.create_backend(backend)) for backend in BACKEND_NAMES}
+            factories["onnxruntime"] = lambda: reference
+            selected, self.backend_report = select_backend(factories, sample)
+            if selected.input_size is None:
+                selected.input_size = size  # It agreed with the reference on this input
+            print(f"Inference backends: {self.backend_report}; using {selected.name}")
+            return selected
+
+        try:
+            return self.create_backend(name)
+        except BackendUnavailable as e:
+            print(f"Inference backend {name} unavailable ({e}); falling back to onnxruntime")
+            self.backend_report = {name: f"unavailable: {e}"}
+            return self.create_backend("onnxruntime")
+
+    def _create_session(self, model_path: str, profile: Optional[dict] = None,
+                        providers: Optional[List[str]] = None) -> ort.InferenceSession:
         # Enhanced ONNX session setup with performance optimizations
-        sess_opts = ort.SessionOptions()
-        sess_opts.intra_op_num_threads = min(4, os.cpu_count())  # Limit threads for Railway
-        sess_opts.inter_op_num_threads = 1
-        sess_opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
-        sess_opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
-
-        # Use only CPU provider for Railway free tier
-        providers = ["CPUExecutionProvider"]
-
-        self.ort_session = ort.InferenceSession(
-            self.onnx_path, 
-            sess_options=sess_opts, 
+        settings = {"intra_op_num_threads": self.intra_op_threads, "inter_op_num_threads": 1,
+                    "execution_mode": "sequential"}
+        optimized_path = None
+        if profile is not None:
+            settings = dict(profile["session"], intra_op_num_threads=self.intra_op_threads)
+            optimized_path = profile.get("optimized_model_path")
+        if self.low_memory:
+            # External-data weights stay memory-mapped (one page-cache copy shared by every
+            # process on the host) only if ORT doesn't repack them into private buffers
+            settings.update(enable_cpu_mem_arena=False, enable_mem_pattern=False, disable_prepacking=True)
+            optimized_path = None  # The .ort file carries its own copy of the weights
+
+        # Use only CPU provider for Railway free tier (unless a provider backend asks otherwise)
+        if providers is None:
+            providers = ["CPUExecutionProvider"]
+        else:
+            optimized_path = None  # Optimized for the CPU provider's kernels
+
+        if optimized_path:
+            # Graph was optimized once by ort_autotune.py; load it as-is
+            try:
+                return ort.InferenceSession(
+                    optimized_path, sess_options=session_options(settings, preoptimized=True), providers=providers
+                )
+            except Exception as e:
+                print(f"Could not load optimized model {optimized_path}, using {model_path}: {e}")
+        return ort.InferenceSession(
+            model_path,
+            sess_options=session_options(settings),
             providers=providers
         )
 
-        print(f"ONNX session initialized with providers: {self.ort_session.get_providers()}")
-
     def load_class_names(self):
         """Load class names from labels_v2.json"""
-        if not os.path.exists(self.labels_path):
-            raise FileNotFoundError(
-                f"Labels file not found: {self.labels_path}\n"
-                "Please ensure model/labels_v2.json exists in your project."
-            )
-
-        with open(self.labels_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            if isinstance(data, dict):
-                # Sort by numeric keys and extract Pokemon names
-                sorted_keys = sorted(data.keys(), key=lambda x: int(x))
-                return [data[k].strip('"') for k in sorted_keys]  # Remove quotes if present
-            if isinstance(data, list):
-                return [name.strip('"') for name in data]  # Remove quotes if present
-            raise ValueError("labels_v2.json must be a list or dict")
+        return load_class_names(self.labels_path)
 
     def _generate_cache_key(self, url: str) -> str:
         """Generate cache key from URL"""
         return hashlib.md5(url.encode()).hexdigest()
 
+    def _generate_content_key(self, data: bytes) -> str:
+        """Generate cache key from downloaded image bytes"""
+        return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+    def _generate_pixel_key(self, image: np.ndarray) -> str:
+        """Generate cache key from decoded pixels, so re-encoded copies match"""
+        return hashlib.blake2b(np.ascontiguousarray(image).data, digest_size=16).hexdigest()
+
     async def preprocess_image_from_url(self, url: str, session: aiohttp.ClientSession):
         """Async image preprocessing with optimized settings"""
-        try:
-            # Use the shared HTTP session from main module
-            timeout = aiohttp.ClientTimeout(total=5, connect=2)
-            async with session.get(url, timeout=timeout) as response:
-                if response.status != 200:
-                    raise ValueError(f"HTTP {response.status} error fetching image")
+        image_data = await self.fetch_image_bytes(url, session)
+        return await self._run_cpu(self.preprocess_image_bytes, image_data)
 
-                image_data = await response.read()
+    async def fetch_image_bytes(self, url: str, session: aiohttp.ClientSession) -> bytearray:
+        """Download the raw image bytes (size-capped, must look like an image)"""
+        return await self.fetcher.fetch(url, session)
 
-        except Exception as e:
-            raise ValueError(f"Failed to load image from URL: {e}")
+    def preprocess_image_bytes(self, image_data: bytes) -> np.ndarray:
+        """Decode and normalise raw image bytes into a 1x3xSxS float32 array (S = the model's input size)"""
+        return self.preprocess_image(self._decode_image(image_data))
 
-        try:
-            # Process image
-            image = Image.open(io.BytesIO(image_data)).convert("RGB")
-        except Exception as e:
-            raise ValueError(f"Failed to process image: {e}")
+    def _decode_image(self, image_data: bytes) -> Image.Image:
+        """Decode raw image bytes into an RGB PIL image"""
+        return self.preprocessor.decode(image_data)
+
+    def preprocess_image(self, image: Image.Image) -> np.ndarray:
+        """Resize and normalise an RGB image into a 1x3xSxS float32 array (S = the model's input size)"""
+        return self.preprocessor.preprocess(image, self._take_input_buffer())
 
-        # Resize with high quality resampling
-        image = image.resize((224, 224), Image.LANCZOS)
+    def _take_input_buffer(self) -> np.ndarray:
+        """A spare 1x3xSxS model input if one is free, else a new one (called on worker threads)"""
+        with self._spare_inputs_lock:
+            while self._spare_inputs:
+                buffer = self._spare_inputs.pop()
+                if buffer.shape[-1] == self.input_size:
+                    return buffer
+        return self.preprocessor.new_buffer()
 
-        # Convert to numpy array and normalize
-        image = np.array(image, dtype=np.float32) / 255.0
+    def _release_input_buffer(self, image: np.ndarray):
+        """Hand back a model input once its inference has returned"""
+        with self._spare_inputs_lock:
+            if len(self._spare_inputs) < self.max_spare_inputs:
+                self._spare_inputs.append(image)
 
-        # ImageNet normalization
-        mean = np.array([0.485, 0.456, 0.406], dtype=np.float32)
-        std = np.array([0.229, 0.224, 0.225], dtype=np.float32)
-        image = (image - mean) / std
+    def _prepare_image(self, image_data: bytes) -> Tuple[Optional[PredictionResult], Optional[np.ndarray]]:
+        """
+        Decode once, then try the perceptual-hash fast path.
+        Returns (result, None) on a reference sprite match, otherwise (None, model input).
+        """
+        image = self._decode_image(image_data)
+        if self.phash_index is not None:
+            match = self.phash_index.lookup(image)
+            if match is not None:
+                return self._format_phash_match(*match), None
+        return None, self.preprocess_image(image)
 
-        # Convert to CHW format and add batch dimension
-        image = np.transpose(image, (2, 0, 1))  # CHW
-        image = np.expand_dims(image, axis=0).astype(np.float32)  # NCHW
+    def _format_phash_match(self, pred_idx: int, distance: int) -> PredictionResult:
+        """Turn a reference sprite match into a result; confidence reflects the hash distance"""
+        confidence = 1 - distance / PerceptualHashIndex.HASH_BITS
+        return PredictionResult(self._class_name(pred_idx), confidence, pred_idx, source="phash",
+                                pokedex=self.pokedex.get(pred_idx), model_version=self.result_version)
 
-        return image
+    async def _run_cpu(self, func, *args):
+        """Run CPU-bound work on the prediction thread pool so the event loop only awaits it"""
+        if self.executor is None:
+            return func(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
 
     def softmax(self, x):
         """Vectorized softmax computation"""
         exp_x = np.exp(x - np.max(x))
         return exp_x / np.sum(exp_x)
 
-    async def predict(self, url: str, session: aiohttp.ClientSession = None) -> Tuple[str, str]:
-        """Async prediction with caching"""
+    def run_batch(self, batch: np.ndarray) -> np.ndarray:
+        """Run the inference backend on an NCHW batch and return one row of logits per image"""
+        return self.backend.run(batch)
+
+    def run_fast_batch(self, batch: np.ndarray) -> np.ndarray:
+        """Run the first-stage cascade model on an NCHW batch"""
+        outputs = self.fast_session.run(None, {self.fast_input_name: batch})
+        return outputs[0]
+
+    def _fast_stage_confident(self, logits: np.ndarray, elapsed_ms: float) -> bool:
+        """Whether the first-stage answer is confident enough to skip the full CNN"""
+        self.fast_runs += 1
+        self.fast_ms_total += elapsed_ms
+        if float(self.softmax(logits).max()) < self.cascade_threshold:
+            return False
+        self.fast_answered += 1
+        return True
+
+    async def infer(self, image: np.ndarray, timings: Optional[Dict[str, float]] = None) -> Tuple[np.ndarray, str]:
+        """
+        Logits for one preprocessed image and the stage that produced them ("cnn" or
+        "cascade"), batched with concurrent requests or sent to the inference server
+        """
+        timings = {} if timings is None else timings
+        stage_started = time.perf_counter()
+        if self.remote is not None:
+            logits, source = await self.remote.infer(image)
+            timings["inference_remote"] = self._elapsed_ms(stage_started)
+            return self._remote_logits(logits), source
+
+        if self.fast_batcher is not None:
+            logits = await self.fast_batcher.submit(image)
+            timings["inference_fast"] = self._elapsed_ms(stage_started)
+            if self._fast_stage_confident(logits, timings["inference_fast"]):
+                return logits, "cascade"
+            stage_started = time.perf_counter()
+
+        logits = await self.batcher.submit(image)
+        timings["inference"] = self._elapsed_ms(stage_started)
+        self._record_full_run(timings["inference"])
+        return logits, self.classifier
+
+    def infer_sync(self, image: np.ndarray) -> Tuple[np.ndarray, str]:
+        """Blocking version of infer() without batching"""
+        if self.remote is not None:
+            logits, source = self.remote.infer_sync(image)
+            return self._remote_logits(logits), source
+
+        if self.fast_session is not None:
+            stage_started = time.perf_counter()
+            logits = self.run_fast_batch(image)[0]
+            if self._fast_stage_confident(logits, self._elapsed_ms(stage_started)):
+                return logits, "cascade"
+
+        stage_started = time.perf_counter()
+        logits = self.run_batch(image)[0]
+        self._record_full_run(self._elapsed_ms(stage_started))
+        return logits, self.classifier
+
+    def _remote_logits(self, logits: np.ndarray) -> np.ndarray:
+        """The server's row of logits, refused unless it has one value per label of ours"""
+        row = logits[0] if logits.ndim > 1 else logits
+        if row.shape[-1] != len(self.class_names):
+            raise ValueError(f"Inference server returned {row.shape[-1]} outputs for {len(self.class_names)} labels")
+        return row
+
+    def _record_full_run(self, elapsed_ms: float):
+        self.full_runs += 1
+        self.full_ms_total += elapsed_ms
+
+    def _class_name(self, pred_idx: int) -> str:
+        return self.class_names[pred_idx] if pred_idx < len(self.class_names) else f"unknown_{pred_idx}"
+
+    def _build_result(self, logits: np.ndarray) -> PredictionResult:
+        """Turn a single row of logits into a result with the top-k candidates"""
+        if self.embedding_index is not None:
+            return self._build_embedding_result(logits)
+        k = min(self.top_k, len(logits))
+        # Partial sort: only the k best logits get ordered
+        top_idx = np.argpartition(logits, -k)[-k:]
+        top_idx = top_idx[np.argsort(logits[top_idx])[::-1]]
+        probabilities = self.softmax(logits)
+
+        candidates = [(self._class_name(int(idx)), float(probabilities[idx])) for idx in top_idx]
+        pred_idx = int(top_idx[0])
+        return PredictionResult(candidates[0][0], candidates[0][1], pred_idx, candidates,
+                                pokedex=self.pokedex.get(pred_idx), model_version=self.result_version)
+
+    def _build_embedding_result(self, embedding: np.ndarray) -> PredictionResult:
+        """Label of the most similar indexed sprites, with the index's calibrated probabilities"""
+        matches = self.embedding_index.classify(embedding, self.top_k)
+        candidates = [(self._class_name(idx), probability) for idx, probability in matches]
+        pred_idx = matches[0][0]
+        return PredictionResult(candidates[0][0], candidates[0][1], pred_idx, candidates,
+                                source="embedding", pokedex=self.pokedex.get(pred_idx),
+                                model_version=self.result_version)
+
+    def warm_up(self, batch_sizes: Optional[List[int]] = None, runs=PREDICT_WARMUP_RUNS) -> float:
+        """
+        Run the model at the given batch sizes so ONNX Runtime allocates and picks kernels
+        for them now rather than on the first spawns. Returns the time taken in ms.
+        """
+        started = time.perf_counter()
+        if not batch_sizes:
+            batch_sizes = [1]
+            while batch_sizes[-1] * 2 < self.max_batch_size:
+                batch_sizes.append(batch_sizes[-1] * 2)
+            if self.max_batch_size > 1:
+                batch_sizes.append(self.max_batch_size)
+
+        if self.remote is not None:
+            # The server warms its own model; just check it is reachable and compatible
+            try:
+                info = self.remote.info_sync()
+            except Exception as e:
+                print(f"Warning: inference server {self.remote.address} not reachable yet: {e}")
+                return self._elapsed_ms(started)
+            if info.get("classes") != len(self.class_names):
+                # Its outputs would be read as the wrong labels
+                raise RuntimeError(f"Inference server {self.remote.address} has {info.get('classes')} classes, "
+                                   f"labels file has {len(self.class_names)}")
+            server_size = info.get("input_size")
+            if server_size and server_size != self.input_size:
+                print(f"Inference server model takes {server_size}px input; resizing to match")
+                self.input_size = server_size
+                self.preprocessor = ImagePreprocessor(server_size, PREDICT_RESIZE_FILTER)
+            return self._elapsed_ms(started)
+
+        # A spawn-sized blank image exercises decode-free preprocessing once as well
+        image = self.preprocess_image(Image.new("RGB", (475, 475)))
+        for batch_size in batch_sizes:
+            batch = np.repeat(image, batch_size, axis=0)
+            for _ in range(runs):
+                self.run_batch(batch)
+                if self.fast_session is not None:
+                    self.run_fast_batch(batch)
+        self._release_input_buffer(image)
+        return self._elapsed_ms(started)
+
+    def get_stats(self) -> dict:
+        """Collect runtime counters for monitoring"""
+        batcher = self.batcher
+        caches = {"url": self.cache, "content": self.content_cache}
+        if self.pixel_cache is not None:
+            caches["pixel"] = self.pixel_cache
+        cache_stats = {}
+        for tier, cache in caches.items():
+            for key, value in cache.get_stats().items():
+                cache_stats[f"{tier}_{key}"] = value
+
+        stats = {
+            "model": {"version": self.model_version, "classifier": self.classifier, "path": self.onnx_path,
+                      "input_size": self.input_size},
+            "cache": cache_stats,
+        }
+        if batcher is not None:
+            stats["batching"] = {
+                "batches_run": batcher.batches_run,
+                "images_run": batcher.images_run,
+                "avg_batch_size": round(batcher.images_run / batcher.batches_run, 2) if batcher.batches_run else 0.0,
+            }
+        if self.remote is not None:
+            stats["inference_server"] = self.remote.get_stats()
+        if self.backend is not None:
+            stats["backend"] = dict(active=self.backend.describe(), **self.backend_report)
+        stats.update({
+            "threads": {
+                "pool_size": self.thread_pool_size,
+                "intra_op": self.intra_op_threads,
+                "tuned_profile": self.ort_profile is not None,
+                "preoptimized_model": bool(self.ort_profile and self.ort_profile.get("optimized_model_path")),
+            },
+            "download": self.fetcher.get_stats(),
+            "pokedex": self.pokedex.get_stats(),
+            "coalescing": {
+                "in_flight": len(self._inflight),
+                "duplicates_avoided": self.coalesced,
+            },
+            "deadlines": dict(dropped_total=sum(self.deadline_drops.values()), **self.deadline_drops),
+        })
+        failing_hosts = self.fetcher.breaker.get_stats()
+        if failing_hosts:
+            stats["image_hosts"] = failing_hosts
+        if self.fast_session is not None:
+            stats["cascade"] = {
+                "threshold": self.cascade_threshold,
+                "fast_runs": self.fast_runs,
+                "fast_answered": self.fast_answered,
+                "fast_hit_rate": round(self.fast_answered / self.fast_runs, 3) if self.fast_runs else 0.0,
+                "fast_avg_ms": round(self.fast_ms_total / self.fast_runs, 2) if self.fast_runs else 0.0,
+                "full_runs": self.full_runs,
+                "full_avg_ms": round(self.full_ms_total / self.full_runs, 2) if self.full_runs else 0.0,
+            }
+        if self.embedding_index is not None:
+            stats["embedding_index"] = dict(
+                self.embedding_index.get_stats(), labels_beyond_cnn=self.embedding_only_labels
+            )
+        if self.phash_index is not None:
+            stats["phash"] = self.phash_index.get_stats()
+        if self.persistent_cache is not None:
+            stats["persistent_cache"] = self.persistent_cache.get_stats()
+        if self.shadow is not None:
+            stats["shadow"] = self.shadow.get_stats()
+        return stats
+
+    def start_background_tasks(self):
+        """Start loading saved predictions from disk (safe to call repeatedly)"""
+        if self.persistent_cache is not None:
+            self.persistent_cache.start_loading(
+                {"url": self.cache, "content": self.content_cache}, self._decode_saved, self.result_version
+            )
+
+    def _decode_saved(self, payload: dict) -> PredictionResult:
+        return PredictionResult.from_dict(payload, self.pokedex, self.result_version)
+
+    async def _saved_result(self, tier: str, key: str) -> Optional[PredictionResult]:
+        """A prediction the in-memory tier has evicted (or not loaded) but the disk cache still has"""
+        if self.persistent_cache is None:
+            return None
+        payload = await self.persistent_cache.lookup(tier, key, self.result_version)
+        return self._decode_saved(payload) if payload is not None else None
+
+    def _saved_result_sync(self, tier: str, key: str) -> Optional[PredictionResult]:
+        if self.persistent_cache is None:
+            return None
+        payload = self.persistent_cache.lookup_sync(tier, key, self.result_version)
+        return self._decode_saved(payload) if payload is not None else None
+
+    async def predict_image(self, image_data: bytes) -> PredictionResult:
+        """Classify downloaded image bytes, bypassing every cache (used for shadow comparisons)"""
+        timings = {}
+        stage_started = time.perf_counter()
+        result, image = await self._run_cpu(self._prepare_image, image_data)
+        timings["prepare"] = self._elapsed_ms(stage_started)
+        if result is None:
+            logits, source = await self.infer(image, timings)
+            self._release_input_buffer(image)
+            result = self._build_result(logits)
+            result.source = source
+        result.timings = timings
+        return result
+
+    def share_state_from(self, previous: "Prediction") -> int:
+        """
+        Take over another predictor's caches, disk cache and download state for a hot swap,
+        dropping the entries its model made. `previous` is left with empty private caches,
+        so predictions it still has in flight can't put old-model results back.
+        Returns the number of in-memory entries dropped.
+        """
+        old_version = previous.result_version
+        self.cache, previous.cache = previous.cache, PredictionCache()
+        self.content_cache, previous.content_cache = previous.content_cache, PredictionCache()
+        if self.hash_pixels and previous.pixel_cache is not None:
+            self.pixel_cache, previous.pixel_cache = previous.pixel_cache, PredictionCache()
+        if previous.persistent_cache is not None:
+            if self.persistent_cache is not None:
+                self.persistent_cache.close()
+            self.persistent_cache, previous.persistent_cache = previous.persistent_cache, None
+        self.fetcher = previous.fetcher  # Failed-URL cache and host breakers stay valid
+
+        dropped = 0
+        if old_version == self.result_version:
+            return dropped  # Reloaded the same model and index; the entries are still right
+        for cache in (self.cache, self.content_cache, self.pixel_cache):
+            if cache is not None:
+                dropped += cache.remove_where(lambda result: result.model_version == old_version)
+        return dropped
+
+    async def drain(self, timeout: float) -> bool:
+        """Wait (up to `timeout` seconds) for in-flight predictions to finish; False if some are left"""
+        stop_at = time.monotonic() + timeout
+        while self._inflight or (self.batcher is not None and self.batcher._running):
+            if time.monotonic() >= stop_at:
+                return False
+            await asyncio.sleep(0.1)
+        return True
+
+    def close(self):
+        """Flush the disk cache and release the worker threads"""
+        if self.persistent_cache is not None:
+            self.persistent_cache.close()
+        if self.remote is not None:
+            self.remote.close()
+        if self.backend is not None:
+            self.backend.close()
+        if self._sync_session is not None:
+            self._sync_session.close()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def predict(self, url: str, session: aiohttp.ClientSession = None,
+                      deadline: Optional[float] = None) -> Tuple[str, str]:
+        """Async prediction with caching, as a (name, "97.31%") tuple"""
+        result = await self.predict_top_k(url, session, deadline)
+        return result.as_tuple()
+
+    def check_deadline(self, deadline: Optional[float], stage: str):
+        """Raise DeadlineExceeded (and count the drop) if `deadline` has passed"""
+        if deadline is not None and time.time() >= deadline:
+            self._record_drop(stage)
+            raise DeadlineExceeded(stage)
+
+    def _record_drop(self, stage: str):
+        self.deadline_drops[stage] = self.deadline_drops.get(stage, 0) + 1
+
+    async def predict_top_k(self, url: str, session: aiohttp.ClientSession = None,
+                            deadline: Optional[float] = None) -> PredictionResult:
+        """
+        Async prediction with caching, returning the top-k candidates and stage timings.
+        `deadline` is a time.time() timestamp; once it passes, the remaining work is
+        skipped or cancelled and DeadlineExceeded is raised (cache hits still return).
+        """
+        self.start_background_tasks()
+        started = time.perf_counter()
+
         # Check cache first
         cache_key = self._generate_cache_key(url)
         cached_result = self.cache.get(cache_key)
         if cached_result:
-            return cached_result
+            return cached_result.from_cache(self._elapsed_ms(started))
 
         # Get HTTP session from main module if not provided
         if session is None:
@@ -162,76 +1021,549 @@ class Prediction:
             if session is None:
                 raise ValueError("HTTP session not available")
 
-        # Preprocess image
-        image = await self.preprocess_image_from_url(url, session)
+        # Single-flight: concurrent callers for the same URL share one download and inference
+        task = self._inflight.get(cache_key)
+        if task is None:
+            self.check_deadline(deadline, "download")
+            shared = self._inflight_deadlines[cache_key] = SharedDeadline(deadline)
+            task = asyncio.get_running_loop().create_task(
+                self._predict_uncached(url, session, cache_key, started, shared)
+            )
+            self._inflight[cache_key] = task
+            task.add_done_callback(lambda done: self._finish_inflight(cache_key, done))
+            return await self._await_inflight(task, shared, deadline)
+
+        self.coalesced += 1
+        shared = self._inflight_deadlines[cache_key]
+        shared.extend(deadline)
+        result = await self._await_inflight(task, shared, deadline)
+        return result.from_cache(self._elapsed_ms(started), "coalesced")
 
-        # Run inference
-        inputs = {self.ort_session.get_inputs()[0].name: image}
-        outputs = self.ort_session.run(None, inputs)
-        logits = outputs[0][0]
+    async def _await_inflight(self, task: asyncio.Task, shared: SharedDeadline,
+                              deadline: Optional[float]) -> PredictionResult:
+        """Wait for a shared prediction, giving up at this caller's deadline"""
+        # Shielded so one caller giving up doesn't cancel the work for the others
+        if deadline is None:
+            return await asyncio.shield(task)
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), max(0.0, deadline - time.time()))
+        except asyncio.TimeoutError:
+            stage = shared.stage
+            if shared.passed():
+                task.cancel()  # Every caller's deadline has passed; stop the download/inference
+            self._record_drop(stage)
+            raise DeadlineExceeded(stage)
 
-        # Get prediction
-        pred_idx = int(np.argmax(logits))
-        probabilities = self.softmax(logits)
-        prob = float(probabilities[pred_idx])
+    def _enter_stage(self, shared: SharedDeadline, stage: str):
+        """Move an in-flight prediction to its next stage, unless its deadline has passed"""
+        shared.stage = stage
+        if shared.passed():
+            self._record_drop(stage)
+            raise DeadlineExceeded(stage)
 
-        name = self.class_names[pred_idx] if pred_idx < len(self.class_names) else f"unknown_{pred_idx}"
-        confidence = f"{prob * 100:.2f}%"
+    def _finish_inflight(self, cache_key: str, task: asyncio.Task):
+        self._inflight.pop(cache_key, None)
+        self._inflight_deadlines.pop(cache_key, None)
+        # Failures reach every waiting caller and are never cached; mark them retrieved
+        # so a task whose callers all gave up doesn't log an unhandled exception
+        if not task.cancelled():
+            task.exception()
+
+    async def _predict_uncached(self, url: str, session: aiohttp.ClientSession,
+                                cache_key: str, started: float, shared: SharedDeadline) -> PredictionResult:
+        timings = {}
+        # Evicted from memory (or not loaded yet) but saved on disk?
+        saved = await self._saved_result("url", cache_key)
+        if saved:
+            self.cache.set(cache_key, saved)
+            return saved.from_cache(self._elapsed_ms(started))
+        stage_started = time.perf_counter()
+
+        # Same image content seen under another URL?
+        image_data = await self.fetch_image_bytes(url, session)
+        timings["download"] = self._elapsed_ms(stage_started)
+        content_key = self._generate_content_key(image_data)
+        cached_result = self.content_cache.get(content_key)
+        if cached_result is None:
+            cached_result = await self._saved_result("content", content_key)
+            if cached_result:
+                self.content_cache.set(content_key, cached_result)
+        if cached_result:
+            self._cache_result(cached_result, cache_key)
+            return cached_result.from_cache(self._elapsed_ms(started))
+
+        # Decode, then either match a reference sprite or preprocess for the CNN
+        self._enter_stage(shared, "prepare")
+        stage_started = time.perf_counter()
+        phash_result, image = await self._run_cpu(self._prepare_image, image_data)
+        timings["prepare"] = self._elapsed_ms(stage_started)
+        if phash_result:
+            phash_result.timings = dict(timings, total=self._elapsed_ms(started))
+            self._cache_result(phash_result, cache_key, content_key)
+            if self.shadow is not None:
+                self.shadow.offer(image_data, phash_result)
+            return phash_result
+
+        pixel_key = None
+        if self.pixel_cache is not None:
+            pixel_key = await self._run_cpu(self._generate_pixel_key, image)
+            cached_result = self.pixel_cache.get(pixel_key)
+            if cached_result:
+                self._release_input_buffer(image)
+                self._cache_result(cached_result, cache_key, content_key)
+                return cached_result.from_cache(self._elapsed_ms(started))
+
+        # Run inference as part of a batch with any concurrent requests; with a cascade
+        # the small model goes first and only unsure images reach the full CNN
+        self._enter_stage(shared, "inference")
+        logits, source = await self.infer(image, timings)
+        # Not on failure: a timed-out image may still be queued or being copied into a batch
+        self._release_input_buffer(image)
+        result = self._build_result(logits)
+        result.source = source
 
         # Cache result
-        result = (name, confidence)
-        self.cache.set(cache_key, result)
+        result.timings = dict(timings, total=self._elapsed_ms(started))
+        self._cache_result(result, cache_key, content_key, pixel_key)
+        if self.shadow is not None:
+            self.shadow.offer(image_data, result)
 
         return result
 
+    def _elapsed_ms(self, started: float) -> float:
+        return round((time.perf_counter() - started) * 1000, 3)
+
+    def _cache_result(self, result: PredictionResult, cache_key: str,
+                      content_key: Optional[str] = None, pixel_key: Optional[str] = None):
+        """Store a prediction in every cache tier we have a key for"""
+        self.cache.set(cache_key, result)
+        if content_key:
+            self.content_cache.set(content_key, result)
+        if self.persistent_cache is not None:
+            payload = result.to_dict()
+            self.persistent_cache.record("url", cache_key, payload, result.model_version)
+            if content_key:
+                self.persistent_cache.record("content", content_key, payload, result.model_version)
+        if pixel_key and self.pixel_cache is not None:
+            self.pixel_cache.set(pixel_key, result)
+
     def predict_sync(self, url: str) -> Tuple[str, str]:
         """Synchronous prediction for backwards compatibility"""
-        import requests
+        return self.predict_top_k_sync(url).as_tuple()
+
+    def predict_top_k_sync(self, url: str) -> PredictionResult:
+        """Synchronous version of predict_top_k"""
+        started = time.perf_counter()
 
         # Check cache first
         cache_key = self._generate_cache_key(url)
         cached_result = self.cache.get(cache_key)
+        if cached_result is None:
+            cached_result = self._saved_result_sync("url", cache_key)
+            if cached_result:
+                self.cache.set(cache_key, cached_result)
+        if cached_result:
+            return cached_result.from_cache(self._elapsed_ms(started))
+
+        if self._sync_session is None:
+            import requests
+            # Reuse connections across predict_sync calls
+            self._sync_session = requests.Session()
+        image_data = self.fetcher.fetch_sync(url, self._sync_session)
+
+        content_key = self._generate_content_key(image_data)
+        cached_result = self.content_cache.get(content_key)
+        if cached_result is None:
+            cached_result = self._saved_result_sync("content", content_key)
+            if cached_result:
+                self.content_cache.set(content_key, cached_result)
         if cached_result:
-            return cached_result
+            self._cache_result(cached_result, cache_key)
+            return cached_result.from_cache(self._elapsed_ms(started))
+
+        phash_result, image = self._prepare_image(image_data)
+        if phash_result:
+            phash_result.timings = {"total": self._elapsed_ms(started)}
+            self._cache_result(phash_result, cache_key, content_key)
+            return phash_result
+
+        # Run inference, trying the cascade's first stage before the full CNN
+        logits, source = self.infer_sync(image)
+        self._release_input_buffer(image)
+        result = self._build_result(logits)
+        result.source = source
+
+        # Cache result
+        result.timings = {"total": self._elapsed_ms(started)}
+        self._cache_result(result, cache_key, content_key)
+
+        return result
+
+class ShadowEvaluator:
+    """
+    Runs a candidate model on a sample of the serving model's uncached predictions and
+    tracks how often they agree and how their latency compares. Its results are never
+    cached or shown.
+    """
+    def __init__(self, candidate: Prediction, sample_rate=PREDICT_SHADOW_SAMPLE_RATE,
+                 max_pending=PREDICT_SHADOW_MAX_PENDING):
+        self.candidate = candidate
+        self.sample_rate = sample_rate
+        self.max_pending = max_pending
+        self._tasks = set()
+
+        self.samples = 0
+        self.agreed = 0
+        self.in_top_k = 0  # Serving label among the candidate's candidates
+        self.skipped = 0  # Sampled while max_pending comparisons were already running
+        self.errors = 0
+        self.serving_ms_total = 0.0
+        self.candidate_ms_total = 0.0
+        self.disagreements = deque(maxlen=5)  # Most recent (serving, candidate) labels
 
+    @staticmethod
+    def _compute_ms(result: PredictionResult) -> float:
+        """Decode, preprocessing and inference time, without the download"""
+        return sum(ms for stage, ms in result.timings.items() if stage not in ("download", "total"))
+
+    def offer(self, image_data: bytes, result: PredictionResult):
+        """Maybe compare the candidate on an image the serving model just classified"""
+        if random.random() >= self.sample_rate:
+            return
+        if len(self._tasks) >= self.max_pending:
+            self.skipped += 1
+            return
+        task = asyncio.get_running_loop().create_task(self._compare(image_data, result))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _compare(self, image_data: bytes, serving: PredictionResult):
         try:
-            response = requests.get(url, timeout=5)
-            image = Image.open(io.BytesIO(response.content)).convert("RGB")
+            shadow = await self.candidate.predict_image(image_data)
         except Exception as e:
-            raise ValueError(f"Failed to load image from URL: {e}")
+            self.errors += 1
+            print(f"Shadow prediction failed: {e}")
+            return
 
-        # Resize with high quality resampling
-        image = image.resize((224, 224), Image.LANCZOS)
+        self.samples += 1
+        self.serving_ms_total += self._compute_ms(serving)
+        self.candidate_ms_total += self._compute_ms(shadow)
+        # Compared by name: the candidate may have a different label set
+        if shadow.name == serving.name:
+            self.agreed += 1
+        else:
+            self.disagreements.append((serving.name, shadow.name))
+        if any(name == serving.name for name, _ in shadow.candidates):
+            self.in_top_k += 1
 
-        # Convert to numpy array and normalize
-        image = np.array(image, dtype=np.float32) / 255.0
+    def cancel(self):
+        for task in list(self._tasks):
+            task.cancel()
 
-        # ImageNet normalization
-        mean = np.array([0.485, 0.456, 0.406], dtype=np.float32)
-        std = np.array([0.229, 0.224, 0.225], dtype=np.float32)
-        image = (image - mean) / std
+    def get_stats(self) -> dict:
+        samples = self.samples
+        return {
+            "candidate": self.candidate.model_version,
+            "sample_rate": self.sample_rate,
+            "samples": samples,
+            "agreement": round(self.agreed / samples, 3) if samples else None,
+            "serving_in_candidate_top_k": round(self.in_top_k / samples, 3) if samples else None,
+            "serving_avg_ms": round(self.serving_ms_total / samples, 2) if samples else None,
+            "candidate_avg_ms": round(self.candidate_ms_total / samples, 2) if samples else None,
+            "skipped_busy": self.skipped,
+            "errors": self.errors,
+            "recent_disagreements": ", ".join(f"{a} -> {b}" for a, b in self.disagreements) or "none",
+        }
 
-        # Convert to CHW format and add batch dimension
-        image = np.transpose(image, (2, 0, 1))
-        image = np.expand_dims(image, axis=0).astype(np.float32)
+class PredictorLoader:
+    """
+    Builds a Prediction on a worker thread and warms it up before marking it ready,
+    so startup never blocks the event loop. Predictions requested meanwhile wait for
+    the model (up to `ready_timeout` seconds) instead of being dropped.
 
-        # Run inference
-        inputs = {self.ort_session.get_inputs()[0].name: image}
-        outputs = self.ort_session.run(None, inputs)
-        logits = outputs[0][0]
+    With a model registry it loads the active version, and can later load another
+    version the same way and swap it in while the old one keeps serving (swap_to),
+    or run one in shadow mode first (start_shadow).
+    """
+    NOT_STARTED = "not_started"
+    LOADING = "loading"
+    WARMING_UP = "warming_up"
+    READY = "ready"
+    FAILED = "failed"
 
-        pred_idx = int(np.argmax(logits))
-        probabilities = self.softmax(logits)
-        prob = float(probabilities[pred_idx])
+    def __init__(self, factory: Optional[Callable[[], Prediction]] = None,
+                 warmup_batch_sizes=PREDICT_WARMUP_BATCH_SIZES, warmup_runs=PREDICT_WARMUP_RUNS,
+                 ready_timeout=PREDICT_READY_TIMEOUT, registry_path=MODEL_REGISTRY_PATH,
+                 drain_seconds=PREDICT_SWAP_DRAIN_SECONDS):
+        self.registry = ModelRegistry(registry_path) if registry_path else None
+        self.factory = factory or self._load_active_version
+        self.warmup_batch_sizes = warmup_batch_sizes
+        self.warmup_runs = warmup_runs
+        self.ready_timeout = ready_timeout
+        self.state = self.NOT_STARTED
+        self.predictor: Optional[Prediction] = None
+        self.error: Optional[Exception] = None
+        self.load_ms = None
+        self.warmup_ms = None
+        self.waiting = 0
+        self.queued_total = 0
+        self.deadline_drops = 0
+        self._ready: Optional[asyncio.Event] = None
+        self._task = None
+        self._closed = False
 
-        name = self.class_names[pred_idx] if pred_idx < len(self.class_names) else f"unknown_{pred_idx}"
-        confidence = f"{prob * 100:.2f}%"
+        # Hot swap state
+        self.drain_seconds = drain_seconds
+        self.shadow: Optional[ShadowEvaluator] = None
+        self.swaps = 0
+        self.last_swap: Optional[str] = None
+        self._swap_lock = asyncio.Lock()
+        self._retiring = set()  # Swapped-out predictors finishing their in-flight work
 
-        # Cache result
-        result = (name, confidence)
-        self.cache.set(cache_key, result)
+    @property
+    def is_ready(self) -> bool:
+        return self.state == self.READY
 
-        return result
+    def start(self):
+        """Begin loading in the background (needs a running event loop)"""
+        if self._task is None:
+            self._ready = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._load())
+
+    async def _load(self):
+        loop = asyncio.get_running_loop()
+        try:
+            self.state = self.LOADING
+            started = time.perf_counter()
+            predictor = await loop.run_in_executor(None, self.factory)
+            self.load_ms = round((time.perf_counter() - started) * 1000, 1)
+
+            self.state = self.WARMING_UP
+            self.warmup_ms = await loop.run_in_executor(
+                None, predictor.warm_up, self.warmup_batch_sizes, self.warmup_runs
+            )
+            if self._closed:
+                predictor.close()
+                return
+
+            predictor.start_background_tasks()
+            self.predictor = predictor
+            self.state = self.READY
+            print(f"Predictor ready (load {self.load_ms:.0f} ms, warm-up {self.warmup_ms:.0f} ms, "
+                  f"{self.queued_total} predictions queued meanwhile)")
+        except Exception as e:
+            self.error = e
+            self.state = self.FAILED
+            print(f"Failed to initialize predictor: {e}")
+        finally:
+            self._ready.set()
+
+    def _load_active_version(self) -> Prediction:
+        """The registry's active version; the bundled model if there is none or it fails its checksums"""
+        if self.registry is not None:
+            name = self.registry.active()
+            if name != BUNDLED_VERSION:
+                try:
+                    return self._create_version(self.registry.get(name))
+                except RegistryError as e:
+                    print(f"Model version {name} is unusable ({e}); loading the bundled model")
+        return Prediction()
+
+    def _create_version(self, version: ModelVersion, **kwargs) -> Prediction:
+        """Check a version's files against their checksums and build its predictor (worker thread)"""
+        if version.is_bundled:
+            return Prediction(**kwargs)
+        if kwargs.get("classifier", PREDICT_CLASSIFIER) == "embedding":
+            # The feature extractor and sprite index are the bundled model's; a registry
+            # version's results would be tagged with its name but come from them
+            raise RegistryError(f"{version.name}: the embedding classifier only runs the bundled model "
+                                f"(set PREDICT_CLASSIFIER = \"cnn\" to load registry versions)")
+        self.registry.verify(version)
+        # The bundled cascade model was trained on the bundled labels; a version only
+        # gets a first stage if it was registered with its own (--cascade-model)
+        return Prediction(onnx_path=version.model_path, labels_path=version.labels_path,
+                          cascade_model_path=version.cascade_model_path, model_version=version.name, **kwargs)
+
+    async def wait_ready(self, deadline: Optional[float] = None) -> Prediction:
+        """Return the predictor, waiting for load and warm-up to finish if needed"""
+        if self.predictor is not None:
+            return self.predictor
+        if self._ready is None:
+            raise RuntimeError("Predictor loading has not been started")
+
+        self.waiting += 1
+        self.queued_total += 1
+        timeout = self.ready_timeout
+        if deadline is not None:
+            timeout = min(timeout, max(0.0, deadline - time.time()))
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            if deadline is not None and time.time() >= deadline:
+                self.deadline_drops += 1
+                raise DeadlineExceeded("loading")
+            raise RuntimeError("Predictor is still warming up, please try again shortly")
+        finally:
+            self.waiting -= 1
+
+        if self.predictor is None:
+            raise RuntimeError(f"Predictor failed to load: {self.error}")
+        return self.predictor
+
+    async def predict(self, url: str, session: aiohttp.ClientSession = None,
+                      deadline: Optional[float] = None) -> Tuple[str, str]:
+        predictor = await self.wait_ready(deadline)
+        return await predictor.predict(url, session, deadline)
+
+    async def predict_top_k(self, url: str, session: aiohttp.ClientSession = None,
+                            deadline: Optional[float] = None) -> PredictionResult:
+        predictor = await self.wait_ready(deadline)
+        return await predictor.predict_top_k(url, session, deadline)
+
+    # ===== HOT SWAP =====
+    def _swappable(self) -> Prediction:
+        if self.registry is None:
+            raise RuntimeError("No model registry configured (PREDICT_MODEL_REGISTRY_PATH)")
+        if self.predictor is None:
+            raise RuntimeError("Predictor is not ready yet")
+        if self.predictor.remote is not None:
+            raise RuntimeError("The model runs in the inference server; restart it with the new model instead")
+        return self.predictor
+
+    async def _build(self, version: ModelVersion) -> Tuple[Prediction, str]:
+        """Verify, load and warm up a version on worker threads while the current one keeps serving"""
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        # Its caches are replaced by the serving predictor's on swap, so no disk cache of its own
+        predictor = await loop.run_in_executor(
+            None, lambda: self._create_version(version, persistent_cache_path=None)
+        )
+        load_ms = (time.perf_counter() - started) * 1000
+        try:
+            warmup_ms = await loop.run_in_executor(
+                None, predictor.warm_up, self.warmup_batch_sizes, self.warmup_runs
+            )
+        except Exception:
+            predictor.close()
+            raise
+        return predictor, f"load {load_ms:.0f} ms, warm-up {warmup_ms:.0f} ms"
+
+    async def swap_to(self, version_name: str, reload=False) -> str:
+        """
+        Load and warm up a registry version, then swap it in without a restart: caches and
+        download state carry over minus the old model's predictions, and the old model
+        finishes its in-flight work before it is closed. `reload` rebuilds the serving
+        version (e.g. to pick up a rebuilt embedding index). Returns a summary line.
+        """
+        async with self._swap_lock:
+            current = self._swappable()
+            version = self.registry.get(version_name)
+            if version.name == current.model_version and not reload:
+                raise RegistryError(f"{version.name} is already serving")
+
+            if self.shadow is not None and self.shadow.candidate.model_version == version.name:
+                candidate, how = self._detach_shadow(), "warmed up in shadow mode"
+            else:
+                self.stop_shadow()  # Its comparisons were against the outgoing model
+                candidate, how = await self._build(version)
+
+            old = self.predictor
+            dropped = candidate.share_state_from(old)
+            self.predictor = candidate  # Every prediction from here on uses the new model
+            self.swaps += 1
+            self.registry.set_active(candidate.model_version)  # Restarts load it too
+            if candidate.persistent_cache is not None and old.result_version != candidate.result_version:
+                dropped += await candidate.persistent_cache.invalidate_version(old.result_version)
+
+            task = asyncio.get_running_loop().create_task(self._retire(old))
+            self._retiring.add(task)
+            task.add_done_callback(self._retiring.discard)
+
+            self.last_swap = (f"{old.model_version} -> {candidate.model_version} "
+                              f"({how}, {dropped} cached predictions dropped)")
+            print(f"Model swapped: {self.last_swap}")
+            return self.last_swap
+
+    async def _retire(self, old: Prediction):
+        if not await old.drain(self.drain_seconds):
+            print(f"Model {old.model_version} still had predictions in flight after "
+                  f"{self.drain_seconds}s; closing it anyway")
+        old.close()
+
+    async def start_shadow(self, version_name: str, sample_rate=PREDICT_SHADOW_SAMPLE_RATE) -> str:
+        """Load a version next to the serving one and compare them on a sample of traffic"""
+        async with self._swap_lock:
+            current = self._swappable()
+            version = self.registry.get(version_name)
+            if version.name == current.model_version:
+                raise RegistryError(f"{version.name} is already serving")
+            self.stop_shadow()
+            candidate, how = await self._build(version)
+            self.shadow = ShadowEvaluator(candidate, sample_rate)
+            self.predictor.shadow = self.shadow
+            return (f"{version.name} is shadowing {current.model_version} on {sample_rate:.0%} "
+                    f"of uncached predictions ({how})")
+
+    async def reload(self) -> str:
+        """Rebuild the serving version, e.g. after `python embedding_index.py` added Pokemon"""
+        return await self.swap_to(self._swappable().model_version, reload=True)
+
+    async def promote_shadow(self) -> str:
+        if self.shadow is None:
+            raise RuntimeError("No model is running in shadow mode")
+        return await self.swap_to(self.shadow.candidate.model_version)
+
+    def _detach_shadow(self) -> Optional[Prediction]:
+        shadow, self.shadow = self.shadow, None
+        if shadow is None:
+            return None
+        if self.predictor is not None:
+            self.predictor.shadow = None
+        shadow.cancel()
+        return shadow.candidate
+
+    def stop_shadow(self) -> bool:
+        """Stop shadow mode and unload the candidate; False if none was running"""
+        candidate = self._detach_shadow()
+        if candidate is None:
+            return False
+        candidate.close()
+        return True
+
+    def check_deadline(self, deadline: Optional[float], stage: str):
+        if self.predictor is not None:
+            self.predictor.check_deadline(deadline, stage)
+        elif deadline is not None and time.time() >= deadline:
+            self.deadline_drops += 1
+            raise DeadlineExceeded(stage)
+
+    def get_stats(self) -> dict:
+        stats = {
+            "readiness": {
+                "state": self.state,
+                "load_ms": self.load_ms,
+                "warmup_ms": self.warmup_ms,
+                "waiting": self.waiting,
+                "queued_total": self.queued_total,
+                "dropped_past_deadline": self.deadline_drops,
+            }
+        }
+        if self.registry is not None:
+            stats["model_registry"] = {
+                "active": self.registry.active(),
+                "swaps": self.swaps,
+                "last_swap": self.last_swap or "none",
+            }
+        if self.predictor is not None:
+            stats.update(self.predictor.get_stats())
+        return stats
+
+    def close(self):
+        """Close the predictor, or have it closed as soon as a pending load finishes"""
+        self._closed = True
+        self.stop_shadow()
+        if self.predictor is not None:
+            self.predictor.close()
 
 def main():
     """Test function for development"""
@@ -248,8 +1580,11 @@ def main():
                     break
 
                 try:
-                    name, confidence = await predictor.predict(url, session)
-                    print(f"Predicted Pokémon: {name} (confidence: {confidence})")
+                    result = await predictor.predict_top_k(url, session)
+                    print(f"Predicted Pokémon: {result.name} (confidence: {result.confidence_text})")
+                    for name, probability in result.alternatives:
+                        print(f"  also possible: {name} ({probability * 100:.2f}%)")
+                    print(f"  timings (ms): {result.timings}")
                 except Exception as e:
                     print(f"Error: {e}")
 
@@ -0,0 +1,126 @@
+"""
+Per-image preprocessing cost: the original pipeline (full decode, LANCZOS, float
+temporaries) against ImagePreprocessor with each resize filter.
+
+    python preprocess_bench.py                      # bundled sprites
+    python preprocess_bench.py --model model/pokemon_cnn_v2.onnx   # + top-1 agreement/accuracy
+
+With --model, each filter's predictions are compared with the original pipeline's and,
+on the labelled bundled sprites, with their labels; that accuracy is the check to pass
+before changing PREDICT_RESIZE_FILTER from "lanczos" or turning on PREDICT_REDUCED_DECODE
+(the "reduced" rows).
+"""
+import io
+import time
+import argparse
+import numpy as np
+from PIL import Image
+from typing import List
+from dataset import IMAGES_PATH, SOURCE_IMAGE_PATH, IMAGE_EXTENSIONS, is_lfs_pointer
+from preprocessing import DEFAULT_INPUT_SIZE, ImagePreprocessor, model_input_size, reference_preprocess
+
+def load_samples(limit: int) -> List[bytes]:
+    """Read up to `limit` bundled sprites, or synthesize sprite-sized PNGs if they are LFS pointers"""
+    import os
+
+    samples = []
+    for root in (SOURCE_IMAGE_PATH, IMAGES_PATH):
+        for dirpath, _, filenames in os.walk(root):
+            for filename in sorted(filenames):
+                path = os.path.join(dirpath, filename)
+                if filename.lower().endswith(IMAGE_EXTENSIONS) and not is_lfs_pointer(path):
+                    with open(path, "rb") as f:
+                        samples.append(f.read())
+                if len(samples) >= limit:
+                    return samples
+
+    if not samples:
+        print("No sprite files available (LFS pointers?); using synthetic flat-shaded 475x475 RGBA PNGs")
+        samples = synthetic_sprites(limit)
+    return samples
+
+def synthetic_sprites(count: int, size=475) -> List[bytes]:
+    """Flat-coloured shapes with outlines on a transparent background, roughly sprite-like"""
+    from PIL import ImageDraw
+
+    rng = np.random.default_rng(0)
+    samples = []
+    for _ in range(count):
+        image = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(image)
+        for _ in range(8):
+            x0, y0 = rng.integers(0, size * 3 // 4, 2)
+            x1, y1 = x0 + rng.integers(20, size // 2), y0 + rng.integers(20, size // 2)
+            fill = tuple(int(v) for v in rng.integers(0, 256, 3)) + (255,)
+            draw.ellipse((x0, y0, x1, y1), fill=fill, outline=(20, 20, 20, 255), width=4)
+        buffer = io.BytesIO()
+        image.save(buffer, "PNG")
+        samples.append(buffer.getvalue())
+    return samples
+
+def time_per_image(func, samples: List[bytes], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for data in samples:
+            func(data)
+    return (time.perf_counter() - start) / (repeat * len(samples)) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark image preprocessing")
+    parser.add_argument("--images", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--model", help="ONNX model for a top-1 agreement check against the original pipeline")
+    parser.add_argument("--labels", help="labels file of --model (default: model/labels_v2.json)")
+    args = parser.parse_args()
+
+    labels = None
+    samples = []
+    if args.model:
+        from quantize_model import collect_samples
+        from predict import LABELS_PATH, load_class_names
+
+        labelled = collect_samples(load_class_names(args.labels or LABELS_PATH),
+                                   [SOURCE_IMAGE_PATH, IMAGES_PATH], args.images)
+        for path, _ in labelled:
+            with open(path, "rb") as f:
+                samples.append(f.read())
+        labels = np.array([idx for _, idx in labelled]) if labelled else None
+    if not samples:
+        samples = load_samples(args.images)
+
+    session = None
+    size = DEFAULT_INPUT_SIZE
+    if args.model:
+        import onnxruntime as ort
+        session = ort.InferenceSession(args.model, providers=["CPUExecutionProvider"])
+        input_name = session.get_inputs()[0].name
+        size = model_input_size(session)
+    reference = [reference_preprocess(data, size) for data in samples]
+    if session is not None:
+        reference_top1 = np.array([session.run(None, {input_name: x})[0].argmax() for x in reference])
+
+    print(f"{len(samples)} images at {size}px, {args.repeat} passes")
+    print(f"{'pipeline':>18} | {'ms/image':>8} | {'max |diff|':>10} | {'top-1 agree':>11} | {'top-1 acc':>9}")
+    ms = time_per_image(lambda data: reference_preprocess(data, size), samples, args.repeat)
+    accuracy = f"{(reference_top1 == labels).mean() * 100:.1f}%" if labels is not None else "-"
+    print(f"{'original lanczos':>18} | {ms:>8.3f} | {0.0:>10.4f} | {'-':>11} | {accuracy:>9}")
+
+    for name, reduced in [(name, reduced) for name in ("lanczos", "bicubic", "bilinear", "box")
+                          for reduced in (False, True)]:
+        preprocessor = ImagePreprocessor(size, name, reduced_decode=reduced)
+        buffer = preprocessor.new_buffer()
+        ms = time_per_image(lambda data: preprocessor.preprocess_bytes(data, buffer), samples, args.repeat)
+        outputs = [preprocessor.preprocess_bytes(data) for data in samples]
+        max_diff = max(float(np.abs(out - ref).max()) for out, ref in zip(outputs, reference))
+
+        agreement = accuracy = "-"
+        if session is not None:
+            top1 = np.array([session.run(None, {input_name: x})[0].argmax() for x in outputs])
+            agreement = f"{(top1 == reference_top1).mean() * 100:.1f}%"
+            if labels is not None:
+                accuracy = f"{(top1 == labels).mean() * 100:.1f}%"
+        label = f"{name} reduced" if reduced else f"fast {name}"
+        print(f"{label:>18} | {ms:>8.3f} | {max_diff:>10.4f} | {agreement:>11} | {accuracy:>9}")
+
+if __name__ == "__main__":
+    main()
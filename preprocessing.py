@@ -0,0 +1,95 @@
+import io
+import numpy as np
+from PIL import Image
+from typing import Optional
+from config import PREDICT_RESIZE_FILTER, PREDICT_REDUCED_DECODE
+
+# Input size the bundled CNN was trained at; reduced-resolution variants declare their own
+DEFAULT_INPUT_SIZE = 224
+
+# ImageNet normalization used when the model was trained
+MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+RESAMPLE_FILTERS = {
+    "nearest": Image.NEAREST,
+    "box": Image.BOX,
+    "bilinear": Image.BILINEAR,
+    "hamming": Image.HAMMING,
+    "bicubic": Image.BICUBIC,
+    "lanczos": Image.LANCZOS,
+}
+
+class ImagePreprocessor:
+    """
+    Shared image -> model input routine.
+    Resizes with a configurable filter (optionally after decoding at reduced resolution,
+    where the format allows it), and normalises through a per-channel uint8 lookup table written straight into
+    a CHW float32 buffer (no float temporaries, no separate transpose).
+    """
+    def __init__(self, size=DEFAULT_INPUT_SIZE, resample=PREDICT_RESIZE_FILTER, reduced_decode=PREDICT_REDUCED_DECODE):
+        self.size = size
+        self.resample_name = resample
+        self.resample = RESAMPLE_FILTERS[resample]
+        self.reduced_decode = reduced_decode
+        # reducing_gap first shrinks large images with a cheap integer box reduce
+        self.reducing_gap = 2.0 if reduced_decode else None
+
+        # lut[c, v] == (v / 255 - MEAN[c]) / STD[c]
+        values = np.arange(256, dtype=np.float32) / 255.0
+        self.lut = np.ascontiguousarray(((values[None, :] - MEAN[:, None]) / STD[:, None]).astype(np.float32))
+
+    def decode(self, image_data: bytes) -> Image.Image:
+        """Decode raw image bytes into an RGB PIL image"""
+        try:
+            image = Image.open(io.BytesIO(image_data))
+            if self.reduced_decode:
+                # JPEG can decode at 1/2, 1/4 or 1/8 scale directly; other formats ignore this
+                image.draft("RGB", (self.size, self.size))
+            return image.convert("RGB")
+        except Exception as e:
+            raise ValueError(f"Failed to process image: {e}")
+
+    def new_buffer(self, batch_size=1) -> np.ndarray:
+        return np.empty((batch_size, 3, self.size, self.size), dtype=np.float32)
+
+    def resize(self, image: Image.Image) -> Image.Image:
+        if image.size == (self.size, self.size):
+            return image
+        return image.resize((self.size, self.size), self.resample, reducing_gap=self.reducing_gap)
+
+    def normalize(self, image: Image.Image, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Normalise an already resized RGB image into a 1x3xHxW float32 array"""
+        pixels = np.asarray(image, dtype=np.uint8)
+        if out is None:
+            out = self.new_buffer()
+        chw = out.reshape(3, self.size, self.size)
+        for channel in range(3):
+            np.take(self.lut[channel], pixels[:, :, channel], out=chw[channel])
+        return out
+
+    def preprocess(self, image: Image.Image, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Resize and normalise an RGB image into a 1x3xHxW float32 array.
+        Pass `out` (shape 1x3xHxW or 3xHxW) to reuse a buffer instead of allocating one.
+        """
+        return self.normalize(self.resize(image), out)
+
+    def preprocess_bytes(self, image_data: bytes, out: Optional[np.ndarray] = None) -> np.ndarray:
+        return self.preprocess(self.decode(image_data), out)
+
+def model_input_size(session, default: Optional[int] = DEFAULT_INPUT_SIZE) -> Optional[int]:
+    """Square input size declared by an ONNX Runtime session's NCHW input, else `default`"""
+    shape = session.get_inputs()[0].shape
+    if len(shape) == 4 and isinstance(shape[2], int) and shape[2] == shape[3]:
+        return shape[2]
+    return default
+
+def reference_preprocess(image_data: bytes, size=DEFAULT_INPUT_SIZE) -> np.ndarray:
+    """The original full-resolution decode + LANCZOS + float pipeline, kept for comparisons"""
+    image = Image.open(io.BytesIO(image_data)).convert("RGB")
+    image = image.resize((size, size), Image.LANCZOS)
+    image = np.array(image, dtype=np.float32) / 255.0
+    image = (image - MEAN) / STD
+    image = np.transpose(image, (2, 0, 1))
+    return np.expand_dims(image, axis=0).astype(np.float32)
@@ -0,0 +1,170 @@
+"""
+Produce an INT8 copy of the ONNX model and compare it with FP32.
+
+    python quantize_model.py                      # static, calibrated on the bundled sprites
+    python quantize_model.py --mode dynamic       # weights only, no calibration data needed
+
+Needs the `onnx` package in addition to onnxruntime (pip install onnx); the bot itself does not.
+The report (accuracy, size, load time, latency) is printed and saved next to the output model.
+"""
+import os
+import json
+import time
+import random
+import tempfile
+import argparse
+import numpy as np
+import onnxruntime as ort
+from typing import List, Tuple
+from dataset import SOURCE_IMAGE_PATH, IMAGES_PATH, iter_labelled_images, is_lfs_pointer
+from preprocessing import ImagePreprocessor, model_input_size
+from predict import ONNX_PATH, ONNX_INT8_PATH, LABELS_PATH, load_class_names
+
+def collect_samples(class_names: List[str], roots, limit: int, seed=0) -> List[Tuple[str, int]]:
+    """A reproducible random subset of labelled sprite files that are real images"""
+    samples = [
+        (path, idx) for path, idx in iter_labelled_images(class_names, roots)
+        if not is_lfs_pointer(path)
+    ]
+    random.Random(seed).shuffle(samples)
+    return samples[:limit]
+
+def load_inputs(samples: List[Tuple[str, int]], preprocessor: ImagePreprocessor) -> np.ndarray:
+    batch = preprocessor.new_buffer(len(samples))
+    for i, (path, _) in enumerate(samples):
+        with open(path, "rb") as f:
+            preprocessor.preprocess_bytes(f.read(), batch[i:i + 1])
+    return batch
+
+def quantize(model_path: str, output_path: str, mode: str, calibration_inputs: np.ndarray):
+    from onnxruntime.quantization import (
+        CalibrationDataReader, QuantFormat, QuantType, quantize_dynamic, quantize_static
+    )
+
+    if mode == "dynamic":
+        quantize_dynamic(model_path, output_path, weight_type=QuantType.QInt8)
+        return
+
+    class SpriteCalibrationReader(CalibrationDataReader):
+        """Feeds preprocessed sprites to the static quantization calibrator"""
+        def __init__(self, inputs: np.ndarray, input_name: str, batch_size=16):
+            self.batches = iter([
+                {input_name: inputs[i:i + batch_size]} for i in range(0, len(inputs), batch_size)
+            ])
+
+        def get_next(self):
+            return next(self.batches, None)
+
+    input_name = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    reader = SpriteCalibrationReader(calibration_inputs, input_name)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        quantize_static(
+            upgrade_opset(model_path, tmp_dir),
+            output_path,
+            reader,
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=True,
+        )
+
+def upgrade_opset(model_path: str, tmp_dir: str, min_opset=13) -> str:
+    """Per-channel QDQ needs opset 13+; convert.py exports opset 11, so upgrade a temporary copy"""
+    import onnx
+    from onnx import version_converter
+
+    model = onnx.load(model_path)
+    opset = next((o.version for o in model.opset_import if o.domain in ("", "ai.onnx")), min_opset)
+    if opset >= min_opset:
+        return model_path
+
+    upgraded_path = os.path.join(tmp_dir, "upgraded.onnx")
+    onnx.save(version_converter.convert_version(model, min_opset), upgraded_path)
+    return upgraded_path
+
+def measure(model_path: str, inputs: np.ndarray, labels: np.ndarray, repeat: int) -> Tuple[dict, np.ndarray]:
+    """Size, load time, single-image latency and top-1 predictions for one model"""
+    start = time.perf_counter()
+    session = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+    load_ms = (time.perf_counter() - start) * 1000
+    input_name = session.get_inputs()[0].name
+
+    session.run(None, {input_name: inputs[:1]})  # Warm-up
+    latencies = []
+    predictions = []
+    for i in range(len(inputs)):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            logits = session.run(None, {input_name: inputs[i:i + 1]})[0]
+            latencies.append((time.perf_counter() - start) * 1000)
+        predictions.append(int(logits[0].argmax()))
+    predictions = np.array(predictions)
+
+    report = {
+        "path": model_path,
+        "size_mb": round(os.path.getsize(model_path) / 1024 / 1024, 2),
+        "load_ms": round(load_ms, 1),
+        "latency_ms_p50": round(float(np.percentile(latencies, 50)), 3),
+        "latency_ms_p95": round(float(np.percentile(latencies, 95)), 3),
+        "top1_accuracy": round(float((predictions == labels).mean()), 4) if len(labels) else None,
+    }
+    return report, predictions
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantize the Pokemon CNN to INT8 and compare it with FP32")
+    parser.add_argument("--model", default=ONNX_PATH)
+    parser.add_argument("--output", default=ONNX_INT8_PATH)
+    parser.add_argument("--labels", default=LABELS_PATH)
+    parser.add_argument("--mode", choices=["static", "dynamic"], default="static")
+    parser.add_argument("--data-dir", action="append", help="sprite folders (default: the bundled dataset)")
+    parser.add_argument("--calibration-images", type=int, default=256)
+    parser.add_argument("--eval-images", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per evaluation image")
+    args = parser.parse_args()
+
+    class_names = load_class_names(args.labels)
+    # Calibrate and evaluate at the resolution the model was exported at
+    preprocessor = ImagePreprocessor(model_input_size(ort.InferenceSession(args.model, providers=["CPUExecutionProvider"])))
+    roots = args.data_dir or [SOURCE_IMAGE_PATH, IMAGES_PATH]
+
+    samples = collect_samples(class_names, roots, args.calibration_images + args.eval_images)
+    if not samples:
+        print("No readable sprites found (run 'git lfs pull' or pass --data-dir)")
+        if args.mode == "static":
+            return
+    calibration = samples[:args.calibration_images]
+    evaluation = samples[args.calibration_images:] or calibration
+
+    print(f"Quantizing {args.model} ({args.mode}, {len(calibration)} calibration images)...")
+    calibration_inputs = load_inputs(calibration, preprocessor) if calibration else None
+    quantize(args.model, args.output, args.mode, calibration_inputs)
+    print(f"INT8 model saved to {args.output}")
+
+    if not evaluation:
+        return
+
+    eval_inputs = load_inputs(evaluation, preprocessor)
+    eval_labels = np.array([idx for _, idx in evaluation])
+    fp32, fp32_predictions = measure(args.model, eval_inputs, eval_labels, args.repeat)
+    int8, int8_predictions = measure(args.output, eval_inputs, eval_labels, args.repeat)
+
+    report = {
+        "mode": args.mode,
+        "eval_images": len(evaluation),
+        "fp32": fp32,
+        "int8": int8,
+        "top1_agreement": round(float((fp32_predictions == int8_predictions).mean()), 4),
+    }
+
+    print(f"\n{'':>16} | {'FP32':>10} | {'INT8':>10}")
+    for key in ("size_mb", "load_ms", "latency_ms_p50", "latency_ms_p95", "top1_accuracy"):
+        print(f"{key:>16} | {str(fp32[key]):>10} | {str(int8[key]):>10}")
+    print(f"{'top1_agreement':>16} | {report['top1_agreement']:>23}")
+
+    report_path = os.path.splitext(args.output)[0] + ".report.json"
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport saved to {report_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Compare the full CNN exported at different input resolutions: accuracy, agreement with
+the first model, preprocessing and inference cost per image.
+
+    python main_tensor.py --input-size 112          # model/pokemon_cnn_112.pt
+    python convert.py --model model/pokemon_cnn_112.pt --output model/pokemon_cnn_112.onnx
+    python resolution_bench.py --models model/pokemon_cnn_v2.onnx model/pokemon_cnn_112.onnx
+
+Each model is fed images resized to the input size it declares, as Prediction does. A
+cheaper variant can be served under load by registering it with model_registry.py (it
+needs the labels it was trained with) and switching with m!model load <version>.
+"""
+import os
+import time
+import argparse
+import numpy as np
+import onnxruntime as ort
+from typing import List
+from dataset import SOURCE_IMAGE_PATH, IMAGES_PATH
+from preprocessing import ImagePreprocessor, model_input_size
+from preprocess_bench import synthetic_sprites, time_per_image
+from quantize_model import collect_samples, measure
+from predict import ONNX_PATH, LABELS_PATH, load_class_names
+
+def batch_ms_per_image(model_path: str, inputs: np.ndarray, batch_size: int, repeat: int) -> float:
+    """Mean inference time per image when run `batch_size` at a time"""
+    session = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+    input_name = session.get_inputs()[0].name
+    session.run(None, {input_name: inputs[:batch_size]})  # Warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for i in range(0, len(inputs), batch_size):
+            session.run(None, {input_name: inputs[i:i + batch_size]})
+    return (time.perf_counter() - start) / (repeat * len(inputs)) * 1000
+
+def main():
+    from config import PREDICT_RESIZE_FILTER
+
+    parser = argparse.ArgumentParser(description="Compare models exported at different input resolutions")
+    parser.add_argument("--models", nargs="+", default=[ONNX_PATH], help="the first is the agreement reference")
+    parser.add_argument("--labels", default=LABELS_PATH)
+    parser.add_argument("--data-dir", action="append", help="sprite folders (default: the bundled dataset)")
+    parser.add_argument("--images", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=8)
+    args = parser.parse_args()
+
+    class_names = load_class_names(args.labels)
+    samples = collect_samples(class_names, args.data_dir or [SOURCE_IMAGE_PATH, IMAGES_PATH], args.images)
+    if samples:
+        images: List[bytes] = []
+        for path, _ in samples:
+            with open(path, "rb") as f:
+                images.append(f.read())
+        labels = np.array([idx for _, idx in samples])
+    else:
+        print("No readable sprites found; using synthetic sprites (agreement only, no accuracy)")
+        images = synthetic_sprites(args.images)
+        labels = np.array([], dtype=np.int64)
+
+    rows = []
+    reference = None
+    for model_path in args.models:
+        size = model_input_size(ort.InferenceSession(model_path, providers=["CPUExecutionProvider"]))
+        preprocessor = ImagePreprocessor(size, PREDICT_RESIZE_FILTER)
+        buffer = preprocessor.new_buffer()
+        preprocess_ms = time_per_image(lambda data: preprocessor.preprocess_bytes(data, buffer), images, args.repeat)
+        inputs = preprocessor.new_buffer(len(images))
+        for i, data in enumerate(images):
+            preprocessor.preprocess_bytes(data, inputs[i:i + 1])
+
+        report, predictions = measure(model_path, inputs, labels, args.repeat)
+        if reference is None:
+            reference = predictions
+        report.update(
+            size=size,
+            preprocess_ms=preprocess_ms,
+            batch_ms=batch_ms_per_image(model_path, inputs, args.batch_size, args.repeat),
+            agreement=float((predictions == reference).mean()),
+        )
+        rows.append(report)
+
+    print(f"\n{len(images)} images, {args.repeat} passes, single-image latency and batches of {args.batch_size}")
+    print(f"{'model':>28} | {'input':>5} | {'MB':>6} | {'prep ms':>7} | {'p50 ms':>7} | {'p95 ms':>7} | "
+          f"{'batch ms':>8} | {'speedup':>7} | {'agree':>6} | {'top-1':>6}")
+    for row in rows:
+        accuracy = f"{row['top1_accuracy']:.1%}" if row["top1_accuracy"] is not None else "-"
+        speedup = rows[0]["latency_ms_p50"] / row["latency_ms_p50"]
+        print(f"{os.path.basename(row['path']):>28} | {row['size']:>5} | {row['size_mb']:>6.1f} | "
+              f"{row['preprocess_ms']:>7.3f} | {row['latency_ms_p50']:>7.2f} | {row['latency_ms_p95']:>7.2f} | "
+              f"{row['batch_ms']:>8.2f} | {speedup:>6.2f}x | {row['agreement']:>6.1%} | {accuracy:>6}")
+
+if __name__ == "__main__":
+    main()
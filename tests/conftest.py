@@ -0,0 +1,125 @@
+"""Shared fixtures: a tiny generated ONNX colour classifier and a local aiohttp image server (python -m pytest tests)"""
+import io
+import os
+import sys
+import json
+import asyncio
+import numpy as np
+import pytest
+from aiohttp import web
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+# The tiny model below labels an image by its dominant colour channel
+LABELS = ["Charmander", "Bulbasaur", "Squirtle", "Pikachu"]
+COLORS = {"red": (230, 20, 20), "green": (20, 230, 20), "blue": (20, 20, 230)}
+
+def build_model(path: str, size=32, num_classes=len(LABELS)):
+    """Global average pool + one Gemm: logits favour the strongest RGB channel"""
+    onnx = pytest.importorskip("onnx")
+    from onnx import helper, numpy_helper, TensorProto
+
+    weights = np.zeros((num_classes, 3), dtype=np.float32)
+    weights[:3] = 10 * (2 * np.eye(3) - 1)
+    nodes = [
+        helper.make_node("GlobalAveragePool", ["input"], ["pooled"]),
+        helper.make_node("Flatten", ["pooled"], ["flat"], axis=1),
+        helper.make_node("Gemm", ["flat", "weights", "bias"], ["output"], transB=1),
+    ]
+    graph = helper.make_graph(
+        nodes, "tiny",
+        [helper.make_tensor_value_info("input", TensorProto.FLOAT, ["batch_size", 3, size, size])],
+        [helper.make_tensor_value_info("output", TensorProto.FLOAT, ["batch_size", num_classes])],
+        [numpy_helper.from_array(weights, "weights"), numpy_helper.from_array(np.zeros(num_classes, np.float32), "bias")],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 11)])
+    model.ir_version = 7
+    onnx.save(model, path)
+    return path
+
+@pytest.fixture(scope="session")
+def model_files(tmp_path_factory):
+    """(model path, labels path) of the tiny colour classifier"""
+    directory = tmp_path_factory.mktemp("model")
+    labels_path = str(directory / "labels.json")
+    with open(labels_path, "w", encoding="utf-8") as f:
+        json.dump({str(i): name for i, name in enumerate(LABELS)}, f)
+    return build_model(str(directory / "tiny.onnx")), labels_path
+
+def make_predictor(model_files, **kwargs):
+    from predict import Prediction
+
+    model_path, labels_path = model_files
+    # Nothing from model/, a configured disk cache or inference server: a built pHash index
+    # or the cascade model would answer before the tiny model, saved predictions would leak
+    # between tests, an autotune profile would pick threads for another model and the
+    # embedding classifier would use the bundled feature extractor
+    options = dict(
+        onnx_path=model_path, labels_path=labels_path, phash_index_path=None, persistent_cache_path=None,
+        cascade_model_path=None, inference_server=None, ort_profile_path=None, intra_op_threads=1,
+        backend="onnxruntime", classifier="cnn",
+    )
+    options.update(kwargs)
+    return Prediction(**options)
+
+def png_bytes(color, size=64, compress_level=6) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (size, size), COLORS.get(color, color)).save(buffer, "PNG", compress_level=compress_level)
+    return buffer.getvalue()
+
+class ImageServer:
+    """
+    Local aiohttp server: /<color>.png serves a flat image (?level=<n> picks the PNG
+    compression level, for same pixels in different bytes), /slow/<color>.png waits
+    `delay` seconds first, /status/<code> answers with that status. Counts hits per path.
+    """
+    def __init__(self, delay=0.3):
+        self.delay = delay
+        self.hits = {}
+        self.runner = None
+        self.base_url = None
+
+    async def _image(self, request: web.Request):
+        self.hits[request.path] = self.hits.get(request.path, 0) + 1
+        if request.path.startswith("/slow/"):
+            await asyncio.sleep(self.delay)
+        color = request.match_info["color"]
+        if color not in COLORS:
+            return web.Response(status=404)
+        level = int(request.query.get("level", 6))
+        return web.Response(body=png_bytes(color, compress_level=level), content_type="image/png")
+
+    async def _status(self, request: web.Request):
+        self.hits[request.path] = self.hits.get(request.path, 0) + 1
+        return web.Response(status=int(request.match_info["code"]), text="error")
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_get("/{color}.png", self._image)
+        app.router.add_get("/slow/{color}.png", self._image)
+        app.router.add_get("/status/{code}", self._status)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}"
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.runner.cleanup()
+
+    def url(self, path: str) -> str:
+        return self.base_url + path
+
+class FakeClock:
+    """Stand-in for time.monotonic/time.time that only moves when told to"""
+    def __init__(self, start=1000.0):
+        self.now = start
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
@@ -0,0 +1,87 @@
+import asyncio
+import aiohttp
+import numpy as np
+import pytest
+from predict import InferenceBatcher
+from tests.conftest import ImageServer, make_predictor
+
+class RecordingModel:
+    """Returns each image's mean as its single logit and records batch sizes"""
+    def __init__(self, fail=False):
+        self.batch_sizes = []
+        self.fail = fail
+
+    def __call__(self, batch: np.ndarray) -> np.ndarray:
+        self.batch_sizes.append(len(batch))
+        if self.fail:
+            raise RuntimeError("model failed")
+        return batch.reshape(len(batch), -1).mean(axis=1, keepdims=True)
+
+def image(value: float) -> np.ndarray:
+    return np.full((1, 3, 4, 4), value, dtype=np.float32)
+
+def test_concurrent_requests_share_batches():
+    model = RecordingModel()
+
+    async def main():
+        batcher = InferenceBatcher(model, max_batch_size=4, window_ms=50)
+        results = await asyncio.gather(*(batcher.submit(image(i)) for i in range(10)))
+        return batcher, results
+
+    batcher, results = asyncio.run(main())
+    assert sorted(model.batch_sizes, reverse=True) == [4, 4, 2]
+    # Every caller gets its own row back, whatever batch it landed in
+    assert [float(row[0]) for row in results] == [float(i) for i in range(10)]
+    assert batcher.batches_run == 3 and batcher.images_run == 10
+
+def test_lone_request_runs_after_window():
+    model = RecordingModel()
+
+    async def main():
+        batcher = InferenceBatcher(model, max_batch_size=8, window_ms=5)
+        return await asyncio.wait_for(batcher.submit(image(3)), 1)
+
+    assert float(asyncio.run(main())[0]) == 3.0
+    assert model.batch_sizes == [1]
+
+def test_failure_reaches_every_caller():
+    model = RecordingModel(fail=True)
+
+    async def main():
+        batcher = InferenceBatcher(model, max_batch_size=4, window_ms=10)
+        return await asyncio.gather(*(batcher.submit(image(i)) for i in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+def test_cancelled_callers_are_left_out_of_the_batch():
+    model = RecordingModel()
+
+    async def main():
+        batcher = InferenceBatcher(model, max_batch_size=4, window_ms=50)
+        gone = asyncio.ensure_future(batcher.submit(image(1)))
+        kept = asyncio.ensure_future(batcher.submit(image(2)))
+        await asyncio.sleep(0)
+        gone.cancel()
+        return await kept
+
+    assert float(asyncio.run(main())[0]) == 2.0
+    assert model.batch_sizes == [1]
+
+def test_prediction_batches_concurrent_requests(model_files):
+    predictor = make_predictor(model_files, batch_window_ms=50)
+
+    async def main():
+        async with ImageServer() as server, aiohttp.ClientSession() as session:
+            urls = [server.url(f"/{color}.png") for color in ("red", "green", "blue")]
+            return await asyncio.gather(*(predictor.predict(url, session) for url in urls))
+
+    results = asyncio.run(main())
+    assert [name for name, _ in results] == ["Charmander", "Bulbasaur", "Squirtle"]
+    assert predictor.batcher.batches_run == 1 and predictor.batcher.images_run == 3
+
+@pytest.mark.parametrize("size", [1, 5])
+def test_run_batch_shapes(model_files, size):
+    predictor = make_predictor(model_files)
+    batch = np.zeros((size, 3, predictor.input_size, predictor.input_size), dtype=np.float32)
+    assert predictor.run_batch(batch).shape == (size, len(predictor.class_names))
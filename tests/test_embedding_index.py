@@ -0,0 +1,75 @@
+import numpy as np
+from embedding_index import EmbeddingIndex, DEFAULT_TEMPERATURE, fit_temperature, normalize_rows
+
+NAMES = ["Charmander", "Bulbasaur", "Squirtle"]
+
+def clustered_index(per_label=4, noise=0.05, seed=0) -> EmbeddingIndex:
+    """Sprites scattered around one random direction per label"""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(len(NAMES), 16))
+    labels = np.repeat(np.arange(len(NAMES)), per_label)
+    embeddings = centres[labels] + noise * rng.normal(size=(len(labels), 16))
+    # Shuffled, so the index has to group entries by label itself
+    order = rng.permutation(len(labels))
+    return EmbeddingIndex(normalize_rows(embeddings[order]), labels[order], NAMES)
+
+def test_classify_returns_nearest_label_first():
+    index = clustered_index()
+    query = index.embeddings[index.labels == 2].mean(axis=0)
+    top = index.classify(query, k=3)
+
+    assert top[0][0] == 2
+    assert sorted(label for label, _ in top) == [0, 1, 2]
+    probabilities = [p for _, p in top]
+    assert probabilities == sorted(probabilities, reverse=True)
+    assert abs(sum(probabilities) - 1) < 1e-5
+    assert index.lookups == 1
+
+def test_indexed_sprite_matches_itself():
+    index = clustered_index()
+    label, probability = index.classify(index.embeddings[5] * 3)[0]  # Queries needn't be normalised
+    assert label == index.labels[5]
+    assert probability > 0.9
+
+def test_k_is_capped_at_the_number_of_labels():
+    index = clustered_index()
+    assert len(index.classify(index.embeddings[0], k=10)) == len(NAMES)
+
+def test_save_and_load_round_trip(tmp_path):
+    index = clustered_index()
+    index.calibrate(0.02)
+    path = str(tmp_path / "index.npz")
+    index.save(path)
+    loaded = EmbeddingIndex.load(path)
+
+    assert loaded.temperature == 0.02
+    assert loaded.signature == index.signature
+    assert loaded.label_names == NAMES
+    query = index.embeddings[0]
+    assert loaded.classify(query) == index.classify(query)
+
+def test_index_saved_without_temperature_uses_default(tmp_path):
+    index = clustered_index()
+    path = str(tmp_path / "old.npz")
+    np.savez(path, embeddings=index.embeddings, labels=index.labels, label_names=np.array(NAMES),
+             paths=np.array(index.paths), mtimes=index.mtimes, extractor_sha256=np.array(""))
+    assert EmbeddingIndex.load(path).temperature == DEFAULT_TEMPERATURE
+
+def test_calibration_changes_signature_and_confidence():
+    index = clustered_index()
+    query = index.embeddings[0]
+    before_signature, before = index.signature, index.classify(query)[0][1]
+    index.calibrate(index.temperature * 10)
+
+    assert index.signature != before_signature
+    assert index.classify(query)[0][1] < before
+
+def test_fit_temperature_prefers_sharper_softmax_for_tight_clusters():
+    tight = fit_temperature(clustered_index(per_label=8, noise=0.01))
+    loose = fit_temperature(clustered_index(per_label=8, noise=2.0))
+    assert tight is not None and loose is not None
+    assert tight < loose
+
+def test_fit_temperature_needs_two_sprites_of_a_label():
+    index = EmbeddingIndex(normalize_rows(np.eye(3, 8)), np.arange(3), NAMES)
+    assert fit_temperature(index) is None
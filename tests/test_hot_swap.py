@@ -0,0 +1,126 @@
+import json
+import shutil
+import asyncio
+import aiohttp
+import pytest
+from model_registry import ModelRegistry, RegistryError
+from predict import PredictorLoader
+from tests.conftest import ImageServer, make_predictor
+
+# The registered version is the same tiny model trained (in name) on other labels, so
+# which version answered is visible in the prediction
+RELABELLED = ["Vulpix", "Oddish", "Psyduck", "Pikachu"]
+
+@pytest.fixture
+def loader(model_files, tmp_path):
+    registry_path = str(tmp_path / "registry")
+    labels_path = str(tmp_path / "labels_v1.json")
+    with open(labels_path, "w", encoding="utf-8") as f:
+        json.dump({str(i): name for i, name in enumerate(RELABELLED)}, f)
+    ModelRegistry(registry_path).add("v1", model_files[0], labels_path)
+
+    loader = PredictorLoader(lambda: make_predictor(model_files), warmup_batch_sizes=[1], warmup_runs=1,
+                             registry_path=registry_path, drain_seconds=0.1)
+    yield loader
+    loader.close()
+
+def run_loaded(loader, test):
+    """Start the loader, wait for it, then run `test(server, session)`"""
+    async def main():
+        loader.start()
+        await loader.wait_ready()
+        async with ImageServer() as server, aiohttp.ClientSession() as session:
+            return await test(server, session)
+    return asyncio.run(main())
+
+def test_predictions_wait_for_the_model(loader):
+    async def test(server, session):
+        return await loader.predict_top_k(server.url("/red.png"), session)
+
+    assert run_loaded(loader, test).name == "Charmander"
+    assert loader.is_ready and loader.predictor.model_version == "bundled"
+
+def test_swap_serves_the_new_version_and_drops_old_predictions(loader):
+    async def test(server, session):
+        before = await loader.predict_top_k(server.url("/red.png"), session)
+        old = loader.predictor
+        summary = await loader.swap_to("v1")
+        after = await loader.predict_top_k(server.url("/red.png"), session)
+        await asyncio.sleep(0.2)  # Old model drains and closes
+        return before, old, summary, after
+
+    before, old, summary, after = run_loaded(loader, test)
+    assert before.name == "Charmander"
+    assert after.name == "Vulpix" and after.source == "cnn" and after.model_version == "v1"
+    assert "bundled -> v1" in summary
+    assert loader.predictor is not old and loader.swaps == 1
+    assert loader.registry.active() == "v1"
+
+def test_each_version_runs_its_own_cascade_model(loader, model_files, tmp_path):
+    version = loader.registry.get("v1")
+    cascade_path = str(tmp_path / "tiny_fast.onnx")
+    shutil.copyfile(model_files[0], cascade_path)
+    loader.registry.add("v2", model_files[0], version.labels_path, cascade_model_path=cascade_path)
+
+    async def test(server, session):
+        await loader.swap_to("v1")
+        without = loader.predictor.fast_session
+        await loader.swap_to("v2")
+        result = await loader.predict_top_k(server.url("/red.png"), session)
+        return without, result
+
+    without, result = run_loaded(loader, test)
+    assert without is None  # Not the bundled cascade model, which knows other labels
+    assert loader.predictor.fast_session is not None
+    assert result.name == "Vulpix" and result.source == "cascade"
+
+def test_swapping_to_the_serving_version_is_refused(loader):
+    async def test(server, session):
+        with pytest.raises(RegistryError, match="already serving"):
+            await loader.swap_to("bundled")
+        with pytest.raises(RegistryError, match="Unknown"):
+            await loader.swap_to("v9")
+
+    run_loaded(loader, test)
+    assert loader.swaps == 0
+
+def test_tampered_version_is_not_loaded(loader):
+    async def test(server, session):
+        version = loader.registry.get("v1")
+        with open(version.labels_path, "a", encoding="utf-8") as f:
+            f.write(" ")
+        with pytest.raises(RegistryError, match="checksum"):
+            await loader.swap_to("v1")
+
+    run_loaded(loader, test)
+    assert loader.predictor.model_version == "bundled"
+
+def test_shadow_compares_then_promotes(loader):
+    async def test(server, session):
+        message = await loader.start_shadow("v1", sample_rate=1.0)
+        served = await loader.predict_top_k(server.url("/green.png"), session)
+        await asyncio.sleep(0.2)  # Comparison runs in the background
+        stats = loader.shadow.get_stats()
+        summary = await loader.promote_shadow()
+        return message, served, stats, summary
+
+    message, served, stats, summary = run_loaded(loader, test)
+    assert "v1 is shadowing bundled" in message
+    assert served.name == "Bulbasaur"  # Shadow results are never shown
+    assert stats["samples"] == 1 and stats["agreement"] == 0.0
+    assert stats["recent_disagreements"] == "Bulbasaur -> Oddish"
+    assert "warmed up in shadow mode" in summary
+    assert loader.predictor.model_version == "v1" and loader.shadow is None
+
+def test_stop_shadow(loader):
+    async def test(server, session):
+        await loader.start_shadow("v1")
+        return loader.stop_shadow(), loader.stop_shadow()
+
+    assert run_loaded(loader, test) == (True, False)
+    assert loader.predictor.shadow is None
+
+def test_registry_versions_are_refused_in_embedding_mode(loader):
+    # The feature extractor and sprite index belong to the bundled model
+    with pytest.raises(RegistryError, match="embedding"):
+        loader._create_version(loader.registry.get("v1"), classifier="embedding")
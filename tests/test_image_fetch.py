@@ -0,0 +1,128 @@
+import time
+import asyncio
+import aiohttp
+import pytest
+from image_fetch import ImageBuffer, HostCircuitBreaker, FailedUrlCache, ImageFetcher
+from tests.conftest import FakeClock, ImageServer, png_bytes
+
+def test_buffer_accepts_images_sized_from_content_length():
+    data = png_bytes("red")
+    buffer = ImageBuffer(1 << 20, expected_size=len(data))
+    buffer.append(data[:100])
+    buffer.append(data[100:])
+    assert bytes(buffer.getvalue()) == data
+
+@pytest.mark.parametrize("chunk_size", [3, 5])
+def test_signature_split_across_short_chunks(chunk_size):
+    data = png_bytes("red")
+    buffer = ImageBuffer(1 << 20)
+    for start in range(0, len(data), chunk_size):
+        buffer.append(data[start:start + chunk_size])
+    assert bytes(buffer.getvalue()) == data
+
+def test_rejects_non_images_and_oversized_bodies():
+    with pytest.raises(ValueError, match="supported image"):
+        ImageBuffer(1 << 20).append(b"<!DOCTYPE html><html>")
+    short = ImageBuffer(1 << 20)
+    short.append(b"<h")  # Too short to sniff until the body ends
+    with pytest.raises(ValueError, match="supported image"):
+        short.getvalue()
+    with pytest.raises(ValueError, match="larger"):
+        ImageBuffer(16).append(png_bytes("red"))
+    with pytest.raises(ValueError, match="empty"):
+        ImageBuffer(16).getvalue()
+
+def test_fetcher_streams_images_and_refuses_everything_else():
+    async def main():
+        fetcher = ImageFetcher(1 << 20, chunk_size=64)
+        async with ImageServer() as server, aiohttp.ClientSession() as session:
+            assert bytes(await fetcher.fetch(server.url("/red.png"), session)) == png_bytes("red")
+            with pytest.raises(ValueError, match="404"):
+                await fetcher.fetch(server.url("/status/404"), session)
+            with pytest.raises(ValueError, match="not point to an image"):
+                await fetcher.fetch(server.url("/status/200"), session)
+        return fetcher
+
+    fetcher = asyncio.run(main())
+    assert fetcher.downloads == 1
+    assert fetcher.rejected == 1  # The 404 isn't a rejected body
+
+def test_fetcher_stops_at_max_bytes():
+    async def main():
+        fetcher = ImageFetcher(64)
+        async with ImageServer() as server, aiohttp.ClientSession() as session:
+            with pytest.raises(ValueError, match="larger"):
+                await fetcher.fetch(server.url("/red.png"), session)
+
+    asyncio.run(main())
+
+def test_breaker_opens_then_half_opens(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(time, "monotonic", clock)
+    breaker = HostCircuitBreaker(failure_threshold=2, cooldown=30)
+
+    breaker.record_failure("cdn")
+    breaker.check("cdn")  # One failure: still closed
+    breaker.record_failure("cdn")
+    with pytest.raises(ValueError):
+        breaker.check("cdn")
+    assert breaker.hosts["cdn"]["state"] == HostCircuitBreaker.OPEN
+
+    clock.advance(31)
+    breaker.check("cdn")  # The trial request goes through...
+    assert breaker.hosts["cdn"]["state"] == HostCircuitBreaker.HALF_OPEN
+    with pytest.raises(ValueError):
+        breaker.check("cdn")  # ...while others keep failing fast
+
+    breaker.record_failure("cdn")  # A failed trial opens it again straight away
+    assert breaker.hosts["cdn"]["state"] == HostCircuitBreaker.OPEN
+    clock.advance(31)
+    breaker.check("cdn")
+    breaker.record_success("cdn")
+    assert "cdn" not in breaker.hosts
+    assert breaker.opened == 2 and breaker.fast_failed == 2
+
+def test_late_success_does_not_close_an_open_breaker(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(time, "monotonic", clock)
+    breaker = HostCircuitBreaker(failure_threshold=1, cooldown=30)
+    breaker.record_failure("cdn")
+    breaker.record_success("cdn")  # e.g. a 404 for a download started before it opened
+    assert breaker.hosts["cdn"]["state"] == HostCircuitBreaker.OPEN
+
+    clock.advance(31)
+    breaker.check("cdn")
+    breaker.record_success("cdn")  # The trial download
+    assert "cdn" not in breaker.hosts
+
+def test_failed_url_cache_expires(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(time, "monotonic", clock)
+    cache = FailedUrlCache(ttl_seconds=60)
+    cache.add("http://x/a.png", "HTTP 404 error")
+    assert cache.get("http://x/a.png") == "HTTP 404 error"
+    clock.advance(61)
+    assert cache.get("http://x/a.png") is None
+
+def test_fetcher_remembers_failures_and_trips_breaker():
+    async def main():
+        fetcher = ImageFetcher(1 << 20, failed_url_ttl=60, host_failure_threshold=2, host_cooldown=30)
+        async with ImageServer() as server, aiohttp.ClientSession() as session:
+            assert bytes(await fetcher.fetch(server.url("/red.png"), session)) == png_bytes("red")
+
+            # A 404 is the URL's fault: remembered, but the host stays usable
+            for _ in range(2):
+                with pytest.raises(ValueError, match="404"):
+                    await fetcher.fetch(server.url("/status/404"), session)
+            assert server.hits["/status/404"] == 1
+            assert fetcher.breaker.get_stats() == {}
+
+            # 5xx responses count against the host
+            for path in ("/status/500", "/status/503"):
+                with pytest.raises(ValueError):
+                    await fetcher.fetch(server.url(path), session)
+            with pytest.raises(ValueError, match="failing"):
+                await fetcher.fetch(server.url("/green.png"), session)
+            assert "/green.png" not in server.hits
+
+    asyncio.run(main())
@@ -0,0 +1,69 @@
+import asyncio
+import numpy as np
+import pytest
+from inference_server import InferenceServer, RemoteInferenceClient, check_listen_address
+
+class SlowPredictor:
+    """Answers infer() after a short sleep and records how many ran at once"""
+    class_names = ["Charmander", "Bulbasaur"]
+    onnx_path = "tiny.onnx"
+    input_size = 2
+    fast_session = None
+
+    def __init__(self):
+        self.running = self.most_running = 0
+
+    async def infer(self, image):
+        self.running += 1
+        self.most_running = max(self.most_running, self.running)
+        await asyncio.sleep(0.02)
+        self.running -= 1
+        return np.array([[float(image.sum()), 0.0]], dtype=np.float32), "cnn"
+
+def run_server(test, **kwargs):
+    """Start a server on a free loopback port and run `test(server, address)`"""
+    async def main():
+        server = InferenceServer(SlowPredictor(), "127.0.0.1:0", **kwargs)
+        await server.start()
+        port = server._server.sockets[0].getsockname()[1]
+        try:
+            return await test(server, f"127.0.0.1:{port}")
+        finally:
+            server._server.close()
+    return asyncio.run(main())
+
+@pytest.mark.parametrize("address", ["127.0.0.1:8790", "localhost:8790", "[::1]:8790", "unix:/tmp/x.sock"])
+def test_local_addresses_need_no_token(address):
+    check_listen_address(address, None)
+
+def test_other_tcp_addresses_need_a_token():
+    with pytest.raises(ValueError, match="PREDICT_INFERENCE_TOKEN"):
+        check_listen_address("0.0.0.0:8790", None)
+    with pytest.raises(ValueError):
+        check_listen_address("bots.example.com:8790", "")
+    check_listen_address("0.0.0.0:8790", "secret")
+
+def test_requests_must_carry_the_token():
+    async def test(server, address):
+        image = np.ones((1, 3, 2, 2), dtype=np.float32)
+        logits, _ = await RemoteInferenceClient(address, token="secret").infer(image)
+        with pytest.raises(RuntimeError, match="invalid token"):
+            await RemoteInferenceClient(address, token="wrong").infer(image)
+        with pytest.raises(RuntimeError, match="invalid token"):
+            await RemoteInferenceClient(address).infer(image)
+        return logits, server.refused
+
+    logits, refused = run_server(test, token="secret")
+    assert logits[0, 0] == 12 and refused == 2
+
+def test_requests_per_connection_are_bounded():
+    async def test(server, address):
+        client = RemoteInferenceClient(address)
+        images = [np.full((1, 3, 2, 2), i, dtype=np.float32) for i in range(6)]
+        results = await asyncio.gather(*(client.infer(image) for image in images))
+        client.close()
+        return [logits[0, 0] for logits, _ in results], server.predictor.most_running
+
+    sums, most_running = run_server(test, max_in_flight=2)
+    assert sums == [12 * i for i in range(6)]
+    assert most_running == 2
@@ -0,0 +1,62 @@
+import os
+import shutil
+import pytest
+from model_registry import ModelRegistry, RegistryError, BUNDLED_VERSION, file_sha256
+
+@pytest.fixture
+def registry(tmp_path):
+    return ModelRegistry(str(tmp_path / "registry"))
+
+def test_add_copies_files_with_checksums(registry, model_files):
+    model_path, labels_path = model_files
+    version = registry.add("v1", model_path, labels_path, notes="tiny")
+
+    assert os.path.exists(version.model_path) and os.path.exists(version.labels_path)
+    assert version.files[os.path.basename(model_path)] == file_sha256(model_path)
+    assert version.cascade_model_path is None
+    registry.verify(registry.get("v1"))
+    assert [v.name for v in registry.versions()] == [BUNDLED_VERSION, "v1"]
+
+def test_verify_detects_tampering_and_missing_files(registry, model_files):
+    model_path, labels_path = model_files
+    version = registry.add("v1", model_path, labels_path)
+
+    with open(version.labels_path, "a", encoding="utf-8") as f:
+        f.write(" ")
+    with pytest.raises(RegistryError, match="checksum"):
+        registry.verify(version)
+
+    os.remove(version.model_path)
+    with pytest.raises(RegistryError, match="missing"):
+        registry.verify(version)
+
+def test_cascade_model_is_part_of_the_version(registry, model_files, tmp_path):
+    model_path, labels_path = model_files
+    cascade_path = str(tmp_path / "tiny_fast.onnx")
+    shutil.copyfile(model_path, cascade_path)
+    version = registry.add("v1", model_path, labels_path, cascade_model_path=cascade_path)
+
+    assert os.path.basename(version.cascade_model_path) == "tiny_fast.onnx"
+    assert registry.get("v1").cascade_model_path == version.cascade_model_path
+    assert "tiny_fast.onnx" in version.files
+
+    with pytest.raises(RegistryError, match="different file names"):
+        registry.add("v2", model_path, labels_path, cascade_model_path=model_path)
+
+def test_rejects_bad_or_duplicate_names(registry, model_files):
+    model_path, labels_path = model_files
+    for name in ("", "../escape", ".hidden", BUNDLED_VERSION):
+        with pytest.raises(RegistryError, match="Invalid"):
+            registry.add(name, model_path, labels_path)
+    registry.add("v1", model_path, labels_path)
+    with pytest.raises(RegistryError, match="already exists"):
+        registry.add("v1", model_path, labels_path)
+    with pytest.raises(RegistryError, match="Unknown"):
+        registry.get("v9")
+
+def test_active_version(registry, model_files):
+    assert registry.active() == BUNDLED_VERSION
+    registry.add("v1", *model_files)
+    registry.set_active("v1")
+    assert registry.active() == "v1"
+    assert ModelRegistry(registry.path).active() == "v1"
@@ -0,0 +1,158 @@
+import time
+import asyncio
+import sqlite3
+import aiohttp
+import pytest
+from persistent_cache import PersistentPredictionCache
+from predict import PredictionCache, PredictionResult
+from tests.conftest import FakeClock, ImageServer, make_predictor
+
+def payload(name: str) -> dict:
+    return PredictionResult(name, 0.9, 0, [(name, 0.9)]).to_dict()
+
+def saved_rows(path: str):
+    with sqlite3.connect(path) as conn:
+        return sorted(conn.execute("SELECT tier, key, model_version FROM prediction_results").fetchall())
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "cache" / "predictions.db")
+
+def test_record_without_event_loop_writes_immediately(db_path):
+    cache = PersistentPredictionCache(db_path)
+    cache.record("url", "a", payload("Pikachu"), "v1")
+    assert saved_rows(db_path) == [("url", "a", "v1")]
+    assert cache.get_stats()["written"] == 1 and cache.get_stats()["pending"] == 0
+    cache.close()
+
+def test_background_writer_flushes_queued_rows(db_path):
+    async def main():
+        cache = PersistentPredictionCache(db_path, flush_interval=0.05)
+        cache.record("url", "a", payload("Pikachu"), "v1")
+        cache.record("content", "b", payload("Pikachu"), "v1")
+        assert cache.get_stats()["pending"] == 2  # Nothing on disk yet
+        await asyncio.sleep(0.3)
+        rows = saved_rows(db_path)
+        cache.close()
+        return rows
+
+    assert asyncio.run(main()) == [("content", "b", "v1"), ("url", "a", "v1")]
+
+def test_close_flushes_pending_rows(db_path):
+    async def main():
+        cache = PersistentPredictionCache(db_path, flush_interval=60)
+        cache.record("url", "a", payload("Pikachu"), "v1")
+        cache.close()
+
+    asyncio.run(main())
+    assert saved_rows(db_path) == [("url", "a", "v1")]
+
+def test_load_into_only_restores_the_serving_version(db_path):
+    cache = PersistentPredictionCache(db_path)
+    cache.record("url", "old", payload("Bulbasaur"), "v1")
+    cache.record("url", "new", payload("Pikachu"), "v2")
+    cache.record("content", "c", payload("Pikachu"), "v2")
+
+    memory = {"url": PredictionCache(), "content": PredictionCache()}
+    decode = lambda data: PredictionResult.from_dict(data, model_version="v2")
+    asyncio.run(cache.load_into(memory, decode, "v2"))
+    cache.close()
+
+    assert "old" not in memory["url"]
+    assert memory["url"].get("new").name == "Pikachu"
+    assert memory["url"].get("new").model_version == "v2"
+    assert "c" in memory["content"]
+    assert cache.loaded == 2
+
+def test_oldest_rows_are_evicted_past_max_entries(db_path, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(time, "time", clock)
+    cache = PersistentPredictionCache(db_path, max_entries=10)
+    for i in range(11):
+        cache.record("url", f"k{i:02}", payload("Pikachu"), "v1")
+        clock.advance(1)
+    cache.close()
+
+    # Trimmed below the bound so the next flushes don't have to evict again
+    assert [key for _, key, _ in saved_rows(db_path)] == [f"k{i:02}" for i in range(2, 11)]
+    assert cache.evicted == 2
+
+def test_row_count_is_tracked_between_evictions(db_path):
+    cache = PersistentPredictionCache(db_path, max_entries=10)
+    for key in ("a", "b", "a"):  # Rewriting a key is counted as a new row until the next eviction
+        cache.record("url", key, payload("Pikachu"), "v1")
+    assert cache._row_count == 3
+    asyncio.run(cache.invalidate_version("v1"))
+    assert cache._row_count == 1
+    cache.close()
+
+def test_lookup_reads_one_row_of_the_serving_version(db_path):
+    cache = PersistentPredictionCache(db_path)
+    cache.record("url", "a", payload("Pikachu"), "v1")
+
+    async def main():
+        return [await cache.lookup("url", "a", "v1"), await cache.lookup("url", "a", "v2"),
+                await cache.lookup("content", "a", "v1")]
+
+    found, other_version, other_tier = asyncio.run(main())
+    assert found["name"] == "Pikachu" and other_version is None and other_tier is None
+    assert cache.lookup_sync("url", "a", "v1")["name"] == "Pikachu"
+    stats = cache.get_stats()
+    assert stats["lookups"] == 4 and stats["lookup_hits"] == 2
+    cache.close()
+
+def test_invalidate_version_drops_saved_and_queued_rows(db_path):
+    async def main():
+        cache = PersistentPredictionCache(db_path, flush_interval=60)
+        cache.record("url", "a", payload("Pikachu"), "v1")
+        cache.flush_sync()
+        cache.record("url", "b", payload("Pikachu"), "v1")  # Still queued
+        cache.record("url", "c", payload("Pikachu"), "v2")
+        deleted = await cache.invalidate_version("v1")
+        cache.close()
+        return deleted
+
+    assert asyncio.run(main()) == 2
+    assert saved_rows(db_path) == [("url", "c", "v2")]
+
+def test_predictions_survive_a_restart(model_files, db_path):
+    async def predict_once(url: str, session):
+        predictor = make_predictor(model_files, persistent_cache_path=db_path)
+        try:
+            predictor.start_background_tasks()
+            await predictor.persistent_cache._load_task
+            return await predictor.predict(url, session), predictor.batcher.images_run
+        finally:
+            predictor.close()
+
+    async def main():
+        async with ImageServer() as server, aiohttp.ClientSession() as session:
+            first = await predict_once(server.url("/red.png"), session)
+            second = await predict_once(server.url("/red.png"), session)
+            return first, second, server.hits["/red.png"]
+
+    (first, first_runs), (second, second_runs), hits = asyncio.run(main())
+    assert first == second and first[0] == "Charmander"
+    assert (first_runs, second_runs, hits) == (1, 0, 1)
+
+def test_predictions_evicted_from_memory_are_read_back_from_disk(model_files, db_path):
+    predictor = make_predictor(model_files, persistent_cache_path=db_path)
+    try:
+        async def main():
+            async with ImageServer() as server, aiohttp.ClientSession() as session:
+                first = await predictor.predict_top_k(server.url("/red.png"), session)
+                predictor.persistent_cache.flush_sync()
+                for cache in (predictor.cache, predictor.content_cache):
+                    cache.remove_where(lambda result: True)
+
+                again = await predictor.predict_top_k(server.url("/red.png"), session)
+                # Another URL for the same image: downloaded, then found by content
+                moved = await predictor.predict_top_k(server.url("/red.png?level=6"), session)
+                return first, again, moved, server.hits["/red.png"]
+
+        first, again, moved, hits = asyncio.run(main())
+        assert first.source == "cnn" and again.source == "cache" and moved.source == "cache"
+        assert again.name == moved.name == "Charmander"
+        assert hits == 2 and predictor.batcher.images_run == 1
+    finally:
+        predictor.close()
@@ -0,0 +1,181 @@
+import time
+import asyncio
+import aiohttp
+import numpy as np
+import pytest
+from predict import DeadlineExceeded
+from tests.conftest import ImageServer, build_model, make_predictor
+
+@pytest.fixture
+def predictor(model_files):
+    predictor = make_predictor(model_files)
+    yield predictor
+    predictor.close()
+
+def run_with_server(test, delay=0.3):
+    """Run `test(server, session)` against a fresh local image server"""
+    async def main():
+        async with ImageServer(delay) as server, aiohttp.ClientSession() as session:
+            return await test(server, session)
+    return asyncio.run(main())
+
+def test_predicts_and_caches_by_url(predictor):
+    async def test(server, session):
+        first = await predictor.predict_top_k(server.url("/red.png"), session)
+        second = await predictor.predict_top_k(server.url("/red.png"), session)
+        return server, first, second
+
+    server, first, second = run_with_server(test)
+    assert first.name == "Charmander" and first.source == "cnn"
+    assert first.candidates[0][0] == "Charmander" and first.confidence > 0.9
+    assert second.name == "Charmander" and second.source == "cache"
+    assert server.hits["/red.png"] == 1
+    assert predictor.cache.get_stats()["hits"] == 1
+
+def test_predict_keeps_the_name_and_percentage_form(predictor):
+    async def test(server, session):
+        return await predictor.predict(server.url("/red.png"), session)
+
+    name, confidence = run_with_server(test)
+    assert name == "Charmander" and confidence.endswith("%")
+
+def test_same_content_under_another_url_skips_inference(predictor):
+    async def test(server, session):
+        await predictor.predict(server.url("/blue.png"), session)
+        return await predictor.predict(server.url("/blue.png?size=large"), session)
+
+    assert run_with_server(test)[0] == "Squirtle"
+    assert predictor.batcher.images_run == 1
+
+def test_model_inputs_are_reused_once_inferred(predictor):
+    async def test(server, session):
+        names = []
+        for path in ("/red.png", "/green.png", "/blue.png"):
+            names.append((await predictor.predict_top_k(server.url(path), session)).name)
+        return names
+
+    assert run_with_server(test) == ["Charmander", "Bulbasaur", "Squirtle"]
+    assert len(predictor._spare_inputs) == 1
+
+def test_pixel_tier_matches_re_encoded_images(model_files):
+    predictor = make_predictor(model_files, hash_pixels=True)
+    try:
+        async def test(server, session):
+            # Same pixels, different PNG bytes: misses the content tier, hits the pixel tier
+            first = await predictor.predict(server.url("/green.png?level=1"), session)
+            second = await predictor.predict(server.url("/green.png?level=9"), session)
+            return first, second
+
+        first, second = run_with_server(test)
+        assert first == second and first[0] == "Bulbasaur"
+        assert predictor.batcher.images_run == 1
+        assert predictor.pixel_cache.get_stats()["hits"] == 1
+    finally:
+        predictor.close()
+
+def test_non_image_response_is_not_cached(predictor):
+    async def test(server, session):
+        for path in ("/status/404", "/status/200"):
+            with pytest.raises(ValueError):
+                await predictor.predict_top_k(server.url(path), session)
+
+    run_with_server(test)
+    assert len(predictor.cache) == 0
+
+def test_concurrent_requests_for_one_url_are_coalesced(predictor):
+    async def test(server, session):
+        url = server.url("/slow/green.png")
+        results = await asyncio.gather(*(predictor.predict_top_k(url, session) for _ in range(5)))
+        return server, results
+
+    server, results = run_with_server(test)
+    assert server.hits["/slow/green.png"] == 1
+    assert predictor.coalesced == 4
+    assert {r.name for r in results} == {"Bulbasaur"}
+    assert sorted(r.source for r in results) == ["cnn"] + ["coalesced"] * 4
+    assert not predictor._inflight
+
+def test_shared_failure_reaches_every_caller(predictor):
+    async def test(server, session):
+        url = server.url("/slow/purple.png")  # 404 after the delay
+        results = await asyncio.gather(*(predictor.predict_top_k(url, session) for _ in range(3)),
+                                       return_exceptions=True)
+        return server, results
+
+    server, results = run_with_server(test)
+    assert server.hits["/slow/purple.png"] == 1
+    assert all(isinstance(r, ValueError) for r in results)
+    assert len(predictor.cache) == 0 and not predictor._inflight
+
+def test_cancelled_caller_does_not_cancel_the_shared_prediction(predictor):
+    async def test(server, session):
+        url = server.url("/slow/red.png")
+        leaving = asyncio.ensure_future(predictor.predict_top_k(url, session))
+        staying = asyncio.ensure_future(predictor.predict_top_k(url, session))
+        await asyncio.sleep(0.05)
+        leaving.cancel()
+        return await staying
+
+    assert run_with_server(test).name == "Charmander"
+
+def test_passed_deadline_skips_the_download(predictor):
+    async def test(server, session):
+        with pytest.raises(DeadlineExceeded) as error:
+            await predictor.predict_top_k(server.url("/red.png"), session, deadline=time.time() - 1)
+        return server, error.value
+
+    server, error = run_with_server(test)
+    assert error.stage == "download"
+    assert "/red.png" not in server.hits
+    assert predictor.deadline_drops == {"download": 1}
+
+def test_deadline_cancels_a_slow_download(predictor):
+    async def test(server, session):
+        started = time.perf_counter()
+        with pytest.raises(DeadlineExceeded) as error:
+            await predictor.predict_top_k(server.url("/slow/red.png"), session, deadline=time.time() + 0.05)
+        elapsed = time.perf_counter() - started
+        await asyncio.sleep(0)  # Let the cancelled task run its done callback
+        return error.value, elapsed
+
+    error, elapsed = run_with_server(test, delay=1.0)
+    assert error.stage == "download"
+    assert elapsed < 0.5
+    assert not predictor._inflight
+    assert predictor.batcher.images_run == 0
+
+def test_short_deadline_does_not_cancel_a_shared_prediction(predictor):
+    async def test(server, session):
+        url = server.url("/slow/blue.png")
+        impatient = asyncio.ensure_future(predictor.predict_top_k(url, session, deadline=time.time() + 0.05))
+        patient = asyncio.ensure_future(predictor.predict_top_k(url, session, deadline=time.time() + 5))
+        return await asyncio.gather(impatient, patient, return_exceptions=True)
+
+    impatient, patient = run_with_server(test)
+    assert isinstance(impatient, DeadlineExceeded)
+    assert patient.name == "Squirtle"
+
+def test_check_deadline_counts_drops(predictor):
+    predictor.check_deadline(None, "reply")
+    predictor.check_deadline(time.time() + 60, "reply")
+    with pytest.raises(DeadlineExceeded):
+        predictor.check_deadline(time.time() - 1, "reply")
+    assert predictor.deadline_drops == {"reply": 1}
+
+@pytest.mark.parametrize("size", [32, 112])
+def test_images_are_resized_to_the_model_input(model_files, tmp_path, size):
+    model_path = build_model(str(tmp_path / f"tiny_{size}.onnx"), size)
+    predictor = make_predictor((model_path, model_files[1]))
+    try:
+        async def test(server, session):
+            return await predictor.predict_top_k(server.url("/blue.png"), session)
+
+        assert predictor.input_size == size
+        assert run_with_server(test).name == "Squirtle"
+    finally:
+        predictor.close()
+
+def test_inference_server_outputs_must_match_the_labels(predictor):
+    assert predictor._remote_logits(np.zeros((1, 4), dtype=np.float32)).shape == (4,)
+    with pytest.raises(ValueError, match="512 outputs for 4 labels"):
+        predictor._remote_logits(np.zeros((1, 512), dtype=np.float32))  # e.g. an embedding server
@@ -0,0 +1,50 @@
+import time
+from predict import PredictionCache, PredictionResult
+from tests.conftest import FakeClock
+
+def test_evicts_least_recently_used():
+    cache = PredictionCache(max_size=2)
+    cache.set("a", ("A", "90.00%"))
+    cache.set("b", ("B", "90.00%"))
+    assert cache.get("a")[0] == "A"  # "b" is now the least recently used
+    cache.set("c", ("C", "90.00%"))
+
+    assert cache.get("b") is None
+    assert cache.get("a")[0] == "A"
+    assert cache.get("c")[0] == "C"
+    assert cache.get_stats()["evictions"] == 1
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(time, "monotonic", clock)
+    cache = PredictionCache(ttl_seconds=10, sweep_interval=60)
+    cache.set("a", ("A", "90.00%"))
+
+    clock.advance(9)
+    assert cache.get("a") is not None
+    clock.advance(2)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+    stats = cache.get_stats()
+    assert stats["expirations"] == 1 and stats["hits"] == 1 and stats["misses"] == 1
+
+def test_sweep_drops_expired_entries_on_set(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(time, "monotonic", clock)
+    cache = PredictionCache(ttl_seconds=10, sweep_interval=5)
+    cache.set("old", ("Old", "90.00%"))
+    clock.advance(11)
+    cache.set("new", ("New", "90.00%"))
+
+    assert len(cache) == 1
+    assert cache.get_stats()["expirations"] == 1
+
+def test_remove_where():
+    cache = PredictionCache()
+    first, second = PredictionResult("A", 0.9, 0), PredictionResult("B", 0.9, 1)
+    first.model_version, second.model_version = "v1", "v2"
+    cache.set("a", first)
+    cache.set("b", second)
+
+    assert cache.remove_where(lambda value: value.model_version == "v1") == 1
+    assert cache.get("a") is None and cache.get("b").name == "B"
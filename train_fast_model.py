@@ -0,0 +1,184 @@
+# train_fast_model.py
+"""
+Train the small first-stage model for the prediction cascade and export it to ONNX.
+
+    python train_fast_model.py                          # distil from model/pokemon_cnn_v2.onnx
+    python train_fast_model.py --no-teacher --epochs 30  # plain labels only
+
+The model takes the same input size as the full CNN it distils from (so both share one
+preprocessing pass; --input-size without a teacher) and is exported to
+model/pokemon_cnn_fast.onnx, which Prediction picks up automatically. Pick the confidence threshold with `python cascade_bench.py` afterwards.
+"""
+import os
+import random
+import argparse
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from PIL import Image
+from dataset import SOURCE_IMAGE_PATH, IMAGES_PATH, iter_labelled_images, is_lfs_pointer
+from preprocessing import DEFAULT_INPUT_SIZE, ImagePreprocessor, model_input_size
+from predict import ONNX_PATH, LABELS_PATH, CASCADE_MODEL_PATH, load_class_names
+
+def conv_bn(in_channels, out_channels, stride=1):
+    return nn.Sequential(
+        nn.Conv2d(in_channels, out_channels, kernel_size=3, stride=stride, padding=1, bias=False),
+        nn.BatchNorm2d(out_channels),
+        nn.ReLU(inplace=True),
+    )
+
+class FastCNN(nn.Module):
+    """About 1/17th of the full CNN's multiply-adds: pooled to 112px, strided convs, global pooling"""
+    def __init__(self, num_classes, width=32):
+        super(FastCNN, self).__init__()
+        self.features = nn.Sequential(
+            nn.AvgPool2d(kernel_size=2),  # Half the input size, e.g. 224 -> 112
+            conv_bn(3, width, stride=2),
+            conv_bn(width, width * 2, stride=2),
+            conv_bn(width * 2, width * 4, stride=2),
+            conv_bn(width * 4, width * 8, stride=2),
+            nn.AdaptiveAvgPool2d(1),
+        )
+        self.classifier = nn.Sequential(
+            nn.Dropout(0.2),
+            nn.Linear(width * 8, num_classes)
+        )
+
+    def forward(self, x):
+        x = self.features(x)
+        x = torch.flatten(x, 1)
+        return self.classifier(x)
+
+def augment(image: Image.Image, rng: random.Random) -> Image.Image:
+    """Spawn-like variation: random background, scale, position and mirroring"""
+    sprite = image.convert("RGBA")
+    if rng.random() < 0.5:
+        sprite = sprite.transpose(Image.FLIP_LEFT_RIGHT)
+
+    canvas_size = max(sprite.size)
+    scale = rng.uniform(0.7, 1.0)
+    sprite = sprite.resize((max(1, int(sprite.width * scale)), max(1, int(sprite.height * scale))), Image.BILINEAR)
+
+    background = tuple(rng.randrange(256) for _ in range(3)) + (255,)
+    canvas = Image.new("RGBA", (canvas_size, canvas_size), background)
+    x = rng.randint(0, canvas_size - sprite.width)
+    y = rng.randint(0, canvas_size - sprite.height)
+    canvas.alpha_composite(sprite, (x, y))
+    return canvas.convert("RGB")
+
+def load_dataset(class_names, roots):
+    samples = []
+    for path, idx in iter_labelled_images(class_names, roots):
+        if is_lfs_pointer(path):
+            continue
+        with Image.open(path) as image:
+            samples.append((image.convert("RGBA"), idx))
+    return samples
+
+def train(args):
+    class_names = load_class_names(args.labels)
+    samples = load_dataset(class_names, args.data_dir or [SOURCE_IMAGE_PATH, IMAGES_PATH])
+    if not samples:
+        print("No readable sprites found (run 'git lfs pull' or pass --data-dir)")
+        return None
+    print(f"Training on {len(samples)} sprites across {len(set(idx for _, idx in samples))} classes")
+
+    teacher = None
+    if args.teacher and os.path.exists(args.teacher):
+        import onnxruntime as ort
+        teacher = ort.InferenceSession(args.teacher, providers=["CPUExecutionProvider"])
+        teacher_input = teacher.get_inputs()[0].name
+        args.input_size = model_input_size(teacher)
+        print(f"Distilling from {args.teacher} ({args.input_size}px input)")
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model = FastCNN(len(class_names), args.width).to(device)
+    opt = torch.optim.AdamW(model.parameters(), lr=args.lr, weight_decay=1e-4)
+    steps_per_epoch = (len(samples) + args.batch_size - 1) // args.batch_size
+    scheduler = torch.optim.lr_scheduler.OneCycleLR(opt, args.lr, total_steps=args.epochs * steps_per_epoch)
+
+    preprocessor = ImagePreprocessor(args.input_size)
+    buffer = preprocessor.new_buffer(args.batch_size)
+    rng = random.Random(0)
+
+    for epoch in range(args.epochs):
+        model.train()
+        rng.shuffle(samples)
+        total_loss = 0.0
+        correct = 0
+        for start in range(0, len(samples), args.batch_size):
+            chunk = samples[start:start + args.batch_size]
+            batch = buffer[:len(chunk)]
+            for i, (image, _) in enumerate(chunk):
+                preprocessor.preprocess(augment(image, rng), batch[i:i + 1])
+            x = torch.from_numpy(batch).to(device)
+            y = torch.tensor([idx for _, idx in chunk], device=device)
+
+            logits = model(x)
+            loss = F.cross_entropy(logits, y)
+            if teacher is not None:
+                # Match the full CNN's softened outputs so the two stages agree on easy sprites
+                teacher_logits = torch.from_numpy(teacher.run(None, {teacher_input: batch})[0]).to(device)
+                soft_loss = F.kl_div(
+                    F.log_softmax(logits / args.temperature, dim=1),
+                    F.softmax(teacher_logits / args.temperature, dim=1),
+                    reduction="batchmean"
+                ) * args.temperature ** 2
+                loss = args.alpha * loss + (1 - args.alpha) * soft_loss
+
+            opt.zero_grad()
+            loss.backward()
+            opt.step()
+            scheduler.step()
+
+            total_loss += loss.item()
+            correct += (logits.argmax(1) == y).sum().item()
+
+        print(f"Epoch {epoch + 1}/{args.epochs} - Loss: {total_loss / steps_per_epoch:.4f} "
+              f"- Accuracy: {100 * correct / len(samples):.2f}%")
+
+    model = model.cpu().eval()
+    model.input_size = args.input_size
+    return model
+
+def export(model, output_path):
+    dummy_input = torch.randn(1, 3, model.input_size, model.input_size)
+    torch.onnx.export(
+        model,
+        dummy_input,
+        output_path,
+        export_params=True,
+        opset_version=13,
+        do_constant_folding=True,
+        input_names=['input'],
+        output_names=['output'],
+        dynamic_axes={'input': {0: 'batch_size'}, 'output': {0: 'batch_size'}}
+    )
+    print(f"Fast model saved to {output_path}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the first-stage cascade model")
+    parser.add_argument("--labels", default=LABELS_PATH)
+    parser.add_argument("--output", default=CASCADE_MODEL_PATH)
+    parser.add_argument("--data-dir", action="append", help="sprite folders (default: the bundled dataset)")
+    parser.add_argument("--teacher", default=ONNX_PATH, help="full CNN to distil from")
+    parser.add_argument("--no-teacher", dest="teacher", action="store_const", const=None)
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--lr", type=float, default=3e-3)
+    parser.add_argument("--width", type=int, default=32)
+    parser.add_argument("--alpha", type=float, default=0.5, help="weight of the hard-label loss")
+    parser.add_argument("--temperature", type=float, default=4.0)
+    parser.add_argument("--input-size", type=int, default=DEFAULT_INPUT_SIZE,
+                        help="input resolution when training without a teacher (otherwise the teacher's)")
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    np.random.seed(0)
+    model = train(args)
+    if model is not None:
+        export(model, args.output)
+
+if __name__ == "__main__":
+    main()
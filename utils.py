@@ -1,7 +1,15 @@
 import json
+import time
+import asyncio
 import unicodedata
 import re
 
+DISCORD_EPOCH_MS = 1420070400000
+
+def snowflake_time(snowflake):
+    """Unix timestamp (seconds) at which a Discord ID, e.g. a message ID, was created"""
+    return ((int(snowflake) >> 22) + DISCORD_EPOCH_MS) / 1000
+
 def load_pokemon_data():
     """Load Pokemon data from pokemondata.json"""
     try:
@@ -122,6 +130,17 @@ def format_pokemon_prediction(name, confidence):
         # Return normal format for Pokemon without gender variants
         return f"{name}: {confidence}"
 
+def format_prediction_alternatives(alternatives, limit=3, min_probability=0.01):
+    """Format runner-up (name, probability) candidates, skipping negligible ones"""
+    shown = [
+        f"{name} ({probability * 100:.2f}%)"
+        for name, probability in alternatives[:limit]
+        if probability >= min_probability
+    ]
+    if not shown:
+        return ""
+    return f"Alternatives: {', '.join(shown)}"
+
 def is_rare_pokemon(pokemon):
     """Check if a Pokemon should trigger rare ping (Legendary, Mythical, or Ultra Beast)"""
     if not pokemon:
@@ -150,3 +169,49 @@ async def get_image_url_from_message(message):
         elif embed.thumbnail and embed.thumbnail.url:
             image_url = embed.thumbnail.url
     return image_url
+
+class EventLoopLagMonitor:
+    """Measure how long the event loop is blocked by sleeping and timing the overshoot"""
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.samples = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+        self.last_lag = 0.0
+        self._task = None
+
+    def start(self):
+        """Start sampling on the running event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - started - self.interval)
+            self.samples += 1
+            self.total_lag += lag
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+
+    def get_stats(self):
+        """Lag figures in milliseconds"""
+        return {
+            "samples": self.samples,
+            "avg_lag_ms": round(self.total_lag / self.samples * 1000, 2) if self.samples else 0.0,
+            "max_lag_ms": round(self.max_lag * 1000, 2),
+            "last_lag_ms": round(self.last_lag * 1000, 2),
+        }
+
+    def reset(self):
+        """Clear the counters, e.g. before comparing two configurations"""
+        self.samples = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+        self.last_lag = 0.0